@@ -0,0 +1,114 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque
+import asyncio
+import math
+import os
+import time
+
+# Pipelines each worker runs at once, how many more may wait for a slot, and
+# for how long, before new requests are turned away
+MAX_CONCURRENT_PIPELINES = int(os.getenv("MAX_CONCURRENT_PIPELINES", "8"))
+MAX_QUEUED_PIPELINES = int(os.getenv("MAX_QUEUED_PIPELINES", "16"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "5"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot start a pipeline in time."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Per-worker admission control: a semaphore plus a short bounded wait queue.
+
+    Requests beyond max_concurrency wait for at most max_wait seconds, and only
+    while fewer than max_queue requests are already waiting; the rest are
+    rejected at once with a Retry-After estimate, so overload sheds load instead
+    of pushing every pipeline towards its timeout.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_PIPELINES,
+                 max_queue: int = MAX_QUEUED_PIPELINES, max_wait: float = ADMISSION_MAX_WAIT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self._recent_waits: Deque[float] = deque(maxlen=1000)
+        # Moving average of how long an admitted pipeline holds its slot
+        self._service_time = 30.0
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new request."""
+        queued_rounds = (self.waiting + 1) / max(self.max_concurrency, 1)
+        return min(max(math.ceil(self._service_time * queued_rounds), 1), 120)
+
+    @property
+    def queue_full(self) -> bool:
+        return self.waiting >= self.max_queue
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a pipeline slot for the duration of the block, or raise AdmissionRejected."""
+        # waiting is counted before the first await, so a burst cannot overshoot the queue
+        if self.in_flight + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("Server is at capacity", self.retry_after())
+
+        start = time.monotonic()
+        self.waiting += 1
+        # Not wait_for: it can swallow a cancellation that arrives just as the
+        # slot is granted, and the cancelled request would then run anyway
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            await asyncio.wait({acquire}, timeout=self.max_wait)
+        except BaseException:
+            if acquire.done() and not acquire.cancelled():
+                self._semaphore.release()
+            acquire.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+        if not acquire.done():
+            acquire.cancel()
+            self.rejected += 1
+            raise AdmissionRejected("Timed out waiting for a free pipeline slot", self.retry_after())
+
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self._recent_waits.append(waited)
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        """Current queue depth and wait time statistics."""
+        waits = sorted(self._recent_waits)
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "wait_seconds_p50": round(waits[len(waits) // 2], 3) if waits else 0.0,
+            "wait_seconds_p95": round(waits[int(len(waits) * 0.95)], 3) if waits else 0.0,
+        }
+
+
+# Admission controller for /chat pipelines in this worker
+pipeline_admission = AdmissionController()
@@ -1,28 +1,62 @@
 import asyncio
 from datetime import datetime, timedelta
-from typing import cast, Dict, List, Optional
+from typing import cast, Dict, List, Literal, Optional
 import os
 import logging
 from uuid import uuid4
 import json
 import time
+import hmac
 
-from concert_scout_agent.agent import root_agent
+from concert_scout_agent.history import prompt_token_stats, HISTORY_MAX_TURNS
+from concert_scout_agent.llm_cache import llm_cache, llm_cache_stats
+from concert_scout_agent.cache import close_cache_redis
+from concert_scout_agent.dataloader import loaders
+from concert_scout_agent.http_client import get_http_client, close_http_client
+from concert_scout_agent.resilience import upstream_stats
+from concert_scout_agent.quota import tm_quota
+from concert_scout_agent.ticketmaster import search_concerts, search_stats, search_cache, attraction_cache, events_cache
+from concert_scout_agent.warmer import run_cache_warmer, cache_warmer
+from concert_scout_agent.event_store import event_store
+from concert_scout_agent.telemetry import metrics_registry, run_stats_sync, setup_telemetry, shutdown_telemetry
+from concert_scout_agent.usage import run_usage_flusher, flush_usage, get_usage
+from concert_scout_agent.cassette import close_cassette
+import session_store
+from session_store import (
+    get_redis_client, store_session, update_session, get_session,
+    delete_session, count_active_sessions, redis_pool_usage, run_fallback_reconciler, DEFAULT_USER_ID
+)
+from pipeline import (
+    app_name, runner, run_prompt, get_or_create_session, extract_text_response, extract_recommendations,
+    ConcertRecommendations, PIPELINE_TIMEOUT
+)
+from rate_limit import RateLimit
+from admission import pipeline_admission, AdmissionRejected
+from jobs import enqueue_job, get_job, TERMINAL_STATUSES
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from google.adk.runners import InMemoryRunner
-from google.adk.sessions import Session
-from google.genai import types
-import httpx
-import redis.asyncio as aioredis
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from asyncio_throttle import Throttler
 from contextlib import asynccontextmanager
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+try:
+    from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+except ImportError:
+    generate_latest = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,94 +66,19 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 env_path = os.path.join(current_dir, '.env')
 load_dotenv(env_path)
 
-# Rate limiting setup
-limiter = Limiter(key_func=get_remote_address)
-
-# Global variables - these will be initialized per worker
-redis_client: Optional[aioredis.Redis] = None
-http_client: Optional[httpx.AsyncClient] = None
-
 # Throttler for external API calls
 spotify_throttler = Throttler(rate_limit=10, period=1)  # 10 requests per second
 ticketmaster_throttler = Throttler(rate_limit=5, period=1)  # 5 requests per second
 
-# Session storage with Redis
-async def get_redis_client() -> aioredis.Redis:
-    """Get Redis client with connection pooling."""
-    global redis_client
-    if redis_client is None:
-        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        redis_client = aioredis.from_url(
-            redis_url,
-            encoding="utf-8",
-            max_connections=20  # Connection pool size
-        )
-    return redis_client
-
-async def get_http_client() -> httpx.AsyncClient:
-    """Get HTTP client with connection pooling."""
-    global http_client
-    if http_client is None:
-        http_client = httpx.AsyncClient(
-            timeout=30.0,
-            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
-        )
-    return http_client
-
-# Fallback in-memory storage for when Redis is not available
-in_memory_sessions: Dict[str, dict] = {}
-use_redis = True
-
-async def store_session(session_id: str, session_data: dict):
-    """Store session data in Redis with expiration (as JSON)."""
-    global in_memory_sessions
-    
-    if use_redis:
-        try:
-            redis = await get_redis_client()
-            session_json = json.dumps(session_data)
-            await redis.setex(f"session:{session_id}", 3600, session_json)
-        except Exception as e:
-            logger.warning(f"Redis storage failed, falling back to in-memory: {e}")
-            in_memory_sessions[session_id] = session_data
-    else:
-        in_memory_sessions[session_id] = session_data
-
-async def get_session(session_id: str) -> Optional[dict]:
-    """Retrieve session data from Redis (as JSON)."""
-    global in_memory_sessions
-    
-    if use_redis:
-        try:
-            redis = await get_redis_client()
-            session_json = await redis.get(f"session:{session_id}")
-            if session_json:
-                return json.loads(session_json)
-        except Exception as e:
-            logger.warning(f"Redis retrieval failed, falling back to in-memory: {e}")
-            return in_memory_sessions.get(session_id)
-    return in_memory_sessions.get(session_id)
-
-async def delete_session(session_id: str):
-    """Delete session data from Redis."""
-    global in_memory_sessions
-    
-    if use_redis:
-        try:
-            redis = await get_redis_client()
-            await redis.delete(f"session:{session_id}")
-        except Exception as e:
-            logger.warning(f"Redis deletion failed, falling back to in-memory: {e}")
-            in_memory_sessions.pop(session_id, None)
-    else:
-        in_memory_sessions.pop(session_id, None)
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     # Startup
     logger.info("Concert Scout AI API starting up...")
     
+    # Stage metrics for /metrics, and trace export when OTEL_EXPORTER_OTLP_ENDPOINT is set
+    setup_telemetry()
+    
     # Check required environment variables
     required_vars = ["SPOTIFY_CLIENT", "SPOTIFY_SECRET", "TM_KEY", "GOOGLE_API_KEY"]
     missing_vars = [var for var in required_vars if not os.getenv(var)]
@@ -130,33 +89,53 @@ async def lifespan(app: FastAPI):
         logger.info("All required environment variables are set")
     
     # Initialize Redis connection
-    global use_redis
     try:
         await get_redis_client()
         logger.info("Redis connection established")
     except Exception as e:
         logger.warning(f"Redis connection failed: {e}. Using in-memory storage as fallback.")
-        use_redis = False
+        session_store.use_redis = False
     
-    # Initialize HTTP client
-    await get_http_client()
+    # Initialize the HTTP client shared by the agent tools
+    get_http_client()
     logger.info("HTTP client initialized")
     
+    # Write sessions stored in memory during Redis outages back to Redis
+    reconciler = asyncio.create_task(run_fallback_reconciler())
+    
+    # Add token usage counted by this worker to the shared totals
+    usage_flusher = asyncio.create_task(run_usage_flusher(get_redis_client))
+    
+    # Share what users search for and, off-peak, warm the Ticketmaster caches with it
+    cache_warmer_task = asyncio.create_task(run_cache_warmer())
+    
+    # Under gunicorn, share this worker's cache and upstream counters with /metrics scrapes
+    stats_sync = asyncio.create_task(run_stats_sync())
+    
     logger.info("Concert Scout AI API startup complete")
     
     yield
     
     # Shutdown
-    global http_client, redis_client
+    reconciler.cancel()
+    usage_flusher.cancel()
+    cache_warmer_task.cancel()
+    stats_sync.cancel()
+    await asyncio.gather(reconciler, usage_flusher, cache_warmer_task, stats_sync, return_exceptions=True)
     
-    if http_client:
-        await http_client.aclose()
-        logger.info("HTTP client closed")
+    await close_http_client()
+    logger.info("HTTP client closed")
     
-    if redis_client:
-        await redis_client.close()
+    close_cassette()
+    
+    if session_store.redis_client:
+        await session_store.close_redis_client()
         logger.info("Redis connection closed")
     
+    await close_cache_redis()
+    
+    shutdown_telemetry()
+    
     logger.info("Concert Scout AI API shutdown complete")
 
 # Initialize FastAPI app
@@ -164,12 +143,15 @@ app = FastAPI(
     title="Concert Scout AI API",
     description="API for the Concert Scout AI agent",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse if orjson else JSONResponse
 )
 
-# Add rate limiting
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Compress larger responses: brotli for clients that accept it, else gzip (GZipMiddleware without brotli-asgi)
+if BrotliMiddleware:
+    app.add_middleware(BrotliMiddleware, minimum_size=1000)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # Add CORS middleware
 app.add_middleware(
@@ -192,23 +174,35 @@ app.add_middleware(
 )
 
 # Global variables
-app_name = 'Concert Scout'
-runner = InMemoryRunner(
-    app_name=app_name,
-    agent=root_agent,
-)
+# Bearer token for the /admin endpoints; they are disabled when it is not set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Write the final updated_at of a /chat session after the response is sent
+DEFER_SESSION_WRITES = os.getenv("DEFER_SESSION_WRITES", "false").lower() == "true"
 
 # Pydantic models for request/response
 class ChatRequest(BaseModel):
     message: str
-    user_id: Optional[str] = "default_user"
+    user_id: Optional[str] = DEFAULT_USER_ID
     session_id: Optional[str] = None
+    # "structured" returns the concerts as typed objects in `recommendations`
+    response_format: Literal["text", "structured"] = "text"
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
     user_id: str
     events: List[Dict]
+    recommendations: Optional[ConcertRecommendations] = None
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    session_id: Optional[str] = None
+    user_id: str
+    created_at: str
+    updated_at: str
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
 
 class SessionResponse(BaseModel):
     session_id: str
@@ -219,104 +213,82 @@ class ErrorResponse(BaseModel):
     error: str
     detail: str
 
-async def run_prompt(session: Session, new_message: str, user_id: str) -> tuple[Session, List[Dict]]:
-    """Run a prompt through the agent and return the session and events."""
-    content = types.Content(
-        role='user', parts=[types.Part.from_text(text=new_message)]
-    )
-    
-    events = []
-    async for event in runner.run_async(user_id=user_id, session_id=session.id, new_message=content):
-        if not event.content or not event.content.parts:
-            continue
-        
-        event_data = {
-            "author": event.author,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        if event.content.parts[0].text:
-            if event.is_final_response():
-                event_data["type"] = "text"
-                event_data["content"] = event.content.parts[0].text
-                if event.author == "final_recommender_agent" or event.author == "concert_scout_agent":
-                    events.append(event_data)
-
-    updated_session = cast(
-        Session,
-        await runner.session_service.get_session(
-            app_name=app_name, user_id=user_id, session_id=session.id
-        ),
-    )
-    
-    return updated_session, events
+class ConcertSearchRequest(BaseModel):
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    artists: List[str] = Field(default_factory=list, max_length=20)
+    related_artists: List[str] = Field(default_factory=list, max_length=20)
+    genre: Optional[str] = None  # Ticketmaster genre, e.g. "Rock"
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+class Concert(BaseModel):
+    name: str
+    venue_name: str
+    city_name: str
+    date: str
+    time: str
+    url: str
+    image_url: Optional[str] = None
+    genre: Optional[str] = None
+
+class ConcertSearchResponse(BaseModel):
+    concerts_artists: List[Concert]
+    concerts_genre: List[Concert]
+    concerts_related: List[Concert]
 
-@app.post("/chat", response_model=ChatResponse)
-@limiter.limit("10/minute")  # Rate limit: 10 requests per minute per IP
-async def chat(request: Request, chat_request: ChatRequest):
+# Rate limits shared by all workers through Redis, per IP and per user_id
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(RateLimit("chat", "10/minute", user_limit="10/minute"))])
+async def chat(request: Request, chat_request: ChatRequest, background_tasks: BackgroundTasks):
     """Send a message to the Concert Scout AI agent."""
     start_time = time.time()
     try:
         logger.info(f"Received chat request from user: {chat_request.user_id}")
-        user_id = chat_request.user_id
+        # user_id may be sent as null
+        user_id = chat_request.user_id or DEFAULT_USER_ID
         
-        # Get or create session
-        session = None
-        if chat_request.session_id:
-            session_data = await get_session(chat_request.session_id)
-            if session_data:
-                # Recreate session from stored data
-                session = Session(
-                    id=session_data["id"],
-                    user_id=session_data["user_id"],
-                    app_name=session_data["app_name"]
-                )
-                logger.info(f"Using existing session: {chat_request.session_id}")
-        
-        if session is None:
-            session = await runner.session_service.create_session(
-                app_name=app_name,
-                user_id=user_id,
-            )
-            logger.info(f"Created new session: {session.id}")
-        
-        # Store session data
-        session_data = {
-            "id": session.id,
-            "user_id": session.user_id,
-            "app_name": session.app_name,
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
-        await store_session(session.id, session_data)
+        # Get or create session (reading an existing session also refreshes its TTL)
+        session = await get_or_create_session(chat_request.session_id, user_id)
         
         # Log processing start
         logger.info(f"Starting AI processing for session: {session.id}")
         
-        # Run the prompt with timeout
-        try:
-            updated_session, events = await asyncio.wait_for(
-                run_prompt(session, chat_request.message, user_id),
-                timeout=180.0  # 3 minute timeout for AI processing
-            )
-        except asyncio.TimeoutError:
-            processing_time = time.time() - start_time
-            logger.error(f"Request timeout after {processing_time:.2f}s for session: {session.id}")
-            raise HTTPException(status_code=408, detail="Request timeout - AI processing took too long. Please try with a simpler query.")
+        # Run the prompt with timeout, once a pipeline slot is free in this worker
+        async with pipeline_admission.admit():
+            try:
+                updated_session, events = await asyncio.wait_for(
+                    run_prompt(session, chat_request.message, user_id),
+                    timeout=PIPELINE_TIMEOUT  # 3 minute timeout for AI processing
+                )
+            except asyncio.TimeoutError:
+                processing_time = time.time() - start_time
+                logger.error(f"Request timeout after {processing_time:.2f}s for session: {session.id}")
+                raise HTTPException(status_code=408, detail="Request timeout - AI processing took too long. Please try with a simpler query.")
         
-        # Update stored session
-        session_data["updated_at"] = datetime.now().isoformat()
-        await store_session(updated_session.id, session_data)
+        # Update stored session, optionally after the response has been sent
+        updated_at = datetime.now().isoformat()
+        if DEFER_SESSION_WRITES:
+            background_tasks.add_task(update_session, updated_session.id, updated_at=updated_at)
+        else:
+            await update_session(updated_session.id, updated_at=updated_at)
         
         # Extract the text response from events
-        text_response = ""
-        for event in events:
-            if event.get("type") == "text" and event.get("author") != "user":
-                text_response += event.get("content", "")
+        text_response = extract_text_response(events)
         
         processing_time = time.time() - start_time
         logger.info(f"Chat request completed in {processing_time:.2f}s for session: {session.id}")
         
+        if chat_request.response_format == "structured":
+            # The concerts are sent once, as objects; text is only kept when the agent replied in prose
+            recommendations = extract_recommendations(events)
+            return ChatResponse(
+                response="" if recommendations else text_response,
+                session_id=session.id,
+                user_id=user_id,
+                events=[],
+                recommendations=recommendations
+            )
+        
         return ChatResponse(
             response=text_response,
             session_id=session.id,
@@ -326,14 +298,107 @@ async def chat(request: Request, chat_request: ChatRequest):
     
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        logger.warning(f"Chat request rejected by admission control: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"{str(e)} - please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         processing_time = time.time() - start_time
         logger.error(f"Error processing chat request after {processing_time:.2f}s: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
-@app.post("/sessions", response_model=SessionResponse)
-@limiter.limit("20/minute")
-async def create_session_endpoint(request: Request, user_id: str = "default_user"):
+@app.post("/jobs", status_code=202, dependencies=[Depends(RateLimit("chat", "10/minute", user_limit="10/minute"))])
+async def create_job(request: Request, chat_request: ChatRequest):
+    """Queue a message for the pipeline workers and return its job id right away."""
+    if not session_store.use_redis:
+        raise HTTPException(status_code=503, detail="Job queue unavailable - Redis is not configured")
+    try:
+        user_id = chat_request.user_id or DEFAULT_USER_ID
+        job_id = await enqueue_job(chat_request.message, user_id, chat_request.session_id, chat_request.response_format)
+        logger.info(f"Queued job {job_id} for user: {user_id}")
+        return {
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+            "events_url": f"/jobs/{job_id}/events"
+        }
+    except Exception as e:
+        logger.error(f"Error queueing job: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Error queueing job: {str(e)}")
+
+@app.get("/jobs/{job_id}", response_model=JobResponse, dependencies=[Depends(RateLimit("get_job", "120/minute"))])
+async def get_job_endpoint(request: Request, job_id: str):
+    """Poll the status of a job, including its result once it has finished."""
+    try:
+        job = await get_job(job_id)
+    except Exception as e:
+        logger.error(f"Error retrieving job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error retrieving job: {str(e)}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events", dependencies=[Depends(RateLimit("get_job", "120/minute"))])
+async def job_events_endpoint(request: Request, job_id: str):
+    """Stream status changes of a job as server-sent events until it finishes."""
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        last_status = None
+        current = job
+        polls = 0
+        while True:
+            if current is None:
+                yield "event: error\ndata: {\"detail\": \"Job not found\"}\n\n"
+                return
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield f"event: status\ndata: {JobResponse(**current).model_dump_json()}\n\n"
+            elif polls % 15 == 0:
+                yield ": keep-alive\n\n"
+            polls += 1
+            if last_status in TERMINAL_STATUSES or await request.is_disconnected():
+                return
+            await asyncio.sleep(1.0)
+            current = await get_job(job_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/concerts/search", response_model=ConcertSearchResponse, dependencies=[Depends(RateLimit("concert_search", "60/minute"))])
+async def concert_search(search: ConcertSearchRequest):
+    """Search Ticketmaster directly, without the agents, for callers that already know the artists, location and dates."""
+    if not (search.artists or search.related_artists or search.genre):
+        raise HTTPException(status_code=400, detail="Provide at least one of artists, related_artists or genre")
+    if (search.start_date is None) != (search.end_date is None):
+        raise HTTPException(status_code=400, detail="start_date and end_date must be given together")
+
+    date = None
+    if search.start_date:
+        date = [search.start_date.strftime("%Y-%m-%dT%H:%M:%S"), search.end_date.strftime("%Y-%m-%dT%H:%M:%S")]
+    try:
+        results = await search_concerts(
+            search.artists,
+            [str(search.latitude), str(search.longitude)],
+            search.related_artists,
+            search.genre,
+            date
+        )
+    except Exception as e:
+        logger.error(f"Concert search failed: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Error searching concerts: {str(e)}")
+    return results
+
+@app.post("/sessions", response_model=SessionResponse, dependencies=[Depends(RateLimit("sessions", "20/minute", user_limit="20/minute"))])
+async def create_session_endpoint(request: Request, user_id: str = DEFAULT_USER_ID):
     """Create a new chat session."""
     try:
         session = await runner.session_service.create_session(
@@ -361,8 +426,7 @@ async def create_session_endpoint(request: Request, user_id: str = "default_user
         logger.error(f"Error creating session: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating session: {str(e)}")
 
-@app.get("/sessions/{session_id}")
-@limiter.limit("30/minute")
+@app.get("/sessions/{session_id}", dependencies=[Depends(RateLimit("get_session", "30/minute"))])
 async def get_session_endpoint(request: Request, session_id: str):
     """Get session information."""
     try:
@@ -382,8 +446,7 @@ async def get_session_endpoint(request: Request, session_id: str):
         logger.error(f"Error retrieving session: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving session: {str(e)}")
 
-@app.delete("/sessions/{session_id}")
-@limiter.limit("20/minute")
+@app.delete("/sessions/{session_id}", dependencies=[Depends(RateLimit("delete_session", "20/minute"))])
 async def delete_session_endpoint(request: Request, session_id: str):
     """Delete a session."""
     try:
@@ -398,7 +461,7 @@ async def health_check():
     """Health check endpoint."""
     try:
         # Check Redis connection
-        if use_redis:
+        if session_store.use_redis:
             try:
                 redis = await get_redis_client()
                 await redis.ping()
@@ -409,16 +472,7 @@ async def health_check():
             redis_status = "disabled (using in-memory storage)"
         
         # Count active sessions
-        if use_redis:
-            try:
-                redis = await get_redis_client()
-                # Count session keys
-                session_keys = await redis.keys("session:*")
-                active_sessions = len(session_keys)
-            except Exception:
-                active_sessions = len(in_memory_sessions)
-        else:
-            active_sessions = len(in_memory_sessions)
+        active_sessions = await count_active_sessions()
         
         return {
             "status": "healthy",
@@ -434,6 +488,117 @@ async def health_check():
             "timestamp": datetime.now().isoformat()
         }
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the worker is up and serving requests. Does no I/O."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: Redis is reachable and its connection pool is not saturated."""
+    ready = True
+    redis_status = "disabled (using in-memory storage)"
+    if session_store.use_redis:
+        try:
+            redis = await get_redis_client()
+            await redis.ping()
+            redis_status = "healthy"
+        except Exception as e:
+            redis_status = f"unhealthy: {str(e)}"
+            ready = False
+
+    redis_pool = redis_pool_usage()
+    if redis_pool and redis_pool["saturation"] >= 1.0:
+        ready = False
+    
+    # Stop routing new requests here while the pipeline wait queue is full
+    if pipeline_admission.queue_full:
+        ready = False
+
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not ready",
+            "timestamp": datetime.now().isoformat(),
+            "redis": redis_status,
+            "redis_pool": redis_pool,
+            "pipelines": pipeline_admission.snapshot()
+        }
+    )
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Allow only requests carrying the admin bearer token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not authorization or not hmac.compare_digest(authorization, f"Bearer {ADMIN_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/admin/usage", dependencies=[Depends(require_admin)])
+async def token_usage(
+    scope: Literal["agent", "session", "user"] = "agent",
+    id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Prompt and completion tokens, model calls and estimated cost per agent, session or user, across all workers."""
+    if not session_store.use_redis:
+        raise HTTPException(status_code=503, detail="Token usage is aggregated in Redis, which is unavailable")
+    try:
+        redis = await get_redis_client()
+        # Include what this worker counted since its last flush
+        await flush_usage(redis)
+        return {"scope": scope, "usage": await get_usage(redis, scope, id, limit)}
+    except Exception as e:
+        logger.error(f"Error reading token usage: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Error reading token usage: {str(e)}")
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics summed over all workers: stage latency histograms, token counts, cache and upstream counters."""
+    if generate_latest is None:
+        raise HTTPException(status_code=503, detail="prometheus_client is not installed")
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Pipeline concurrency, queue depth and admission wait times for this worker."""
+    return pipeline_admission.snapshot()
+
+@app.get("/metrics/upstream")
+async def upstream_metrics():
+    """Latency, hedging and circuit breaker state of each upstream endpoint, and the Ticketmaster quota controller, for this worker."""
+    return {
+        "endpoints": upstream_stats(),
+        "ticketmaster_quota": tm_quota.stats()
+    }
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Hit rates of the LLM response cache, overall and per agent, request batching counters,
+    and the Ticketmaster caches with the share of searches served warm."""
+    return {
+        "llm": {
+            **llm_cache.stats(),
+            "agents": dict(llm_cache_stats)
+        },
+        "batching": {name: loader.stats() for name, loader in loaders.items()},
+        "ticketmaster": {
+            "search": search_cache.stats(),
+            "attractions": attraction_cache.stats(),
+            "events": events_cache.stats(),
+            "event_store": event_store.stats() if event_store is not None else None,
+            "requests": search_stats.stats(),
+            "warmer": cache_warmer.stats()
+        }
+    }
+
+@app.get("/metrics/history")
+async def history_metrics():
+    """Prompt tokens per conversation turn, for benchmarking the history window."""
+    return {
+        "history_max_turns": HISTORY_MAX_TURNS,
+        "turns": prompt_token_stats.snapshot()
+    }
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
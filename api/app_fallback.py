@@ -9,18 +9,18 @@ import threading
 
 from concert_scout_agent.agent import root_agent
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from google.adk.runners import InMemoryRunner
 from google.adk.sessions import Session
 from google.genai import types
 import httpx
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 from asyncio_throttle import Throttler
 
+from rate_limit import RateLimit
+import session_store
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,10 +37,8 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Rate limiting setup
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Rate limiting runs without Redis here, so each worker keeps its own windows
+session_store.use_redis = False
 
 # Add CORS middleware
 app.add_middleware(
@@ -189,8 +187,7 @@ async def run_prompt(session: Session, new_message: str, user_id: str) -> tuple[
     
     return updated_session, events
 
-@app.post("/chat", response_model=ChatResponse)
-@limiter.limit("10/minute")  # Rate limit: 10 requests per minute per IP
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(RateLimit("chat", "10/minute"))])
 async def chat(request: Request, chat_request: ChatRequest):
     """Send a message to the Concert Scout AI agent."""
     try:
@@ -246,8 +243,7 @@ async def chat(request: Request, chat_request: ChatRequest):
         logger.error(f"Error processing chat request: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
-@app.post("/sessions", response_model=SessionResponse)
-@limiter.limit("20/minute")
+@app.post("/sessions", response_model=SessionResponse, dependencies=[Depends(RateLimit("sessions", "20/minute"))])
 async def create_session(request: Request, user_id: str = "default_user"):
     """Create a new chat session."""
     try:
@@ -268,8 +264,7 @@ async def create_session(request: Request, user_id: str = "default_user"):
         logger.error(f"Error creating session: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating session: {str(e)}")
 
-@app.get("/sessions/{session_id}")
-@limiter.limit("30/minute")
+@app.get("/sessions/{session_id}", dependencies=[Depends(RateLimit("get_session", "30/minute"))])
 async def get_session_endpoint(request: Request, session_id: str):
     """Get session information."""
     try:
@@ -289,8 +284,7 @@ async def get_session_endpoint(request: Request, session_id: str):
         logger.error(f"Error retrieving session: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving session: {str(e)}")
 
-@app.delete("/sessions/{session_id}")
-@limiter.limit("20/minute")
+@app.delete("/sessions/{session_id}", dependencies=[Depends(RateLimit("delete_session", "20/minute"))])
 async def delete_session_endpoint(request: Request, session_id: str):
     """Delete a session."""
     try:
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+CPU time and peak allocation per Ticketmaster event page for each way of
+decoding it, from the bytes off the wire to the concerts the tools return.
+
+    python benchmarks/event_decoding.py
+    python benchmarks/event_decoding.py --events 50 --repeat 20
+    python benchmarks/event_decoding.py --page response.json
+
+"full" is the path every page took before projection, and the one other
+Ticketmaster calls still take: json.loads of the whole page, json.dumps of it
+for the upstream fallback cache, then _extract_event_info. "fast" (orjson
+when installed) and "stream" (ijson, when installed) decode only the
+projected fields, and the fallback cache keeps those. Every decoder runs on
+the event loop, so its CPU time is how long the worker stops serving other
+requests. Exits with status 1 if the decoders disagree on the concerts.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Concerts a search keeps from one page (TM_MAX_CACHED_EVENTS)
+EXTRACTED_EVENTS = 30
+IMAGE_SIZES = [("3_2", 640), ("4_3", 305), ("16_9", 640), ("16_9", 1136), ("16_9", 2048),
+               ("3_2", 1024), ("16_9", 205), ("4_3", 1024), ("3_2", 305), ("16_9", 100)]
+
+
+def make_event(i: int) -> dict:
+    """An event with every part the Discovery API embeds: sales, notes, prices, products, and full venue and attraction objects."""
+    images = [{"ratio": ratio, "url": f"https://s1.ticketm.net/dam/a/{i:03d}/{i:08x}-{ratio}_{width}_RETINA_PORTRAIT.jpg",
+               "width": width, "height": width * 9 // 16, "fallback": False} for ratio, width in IMAGE_SIZES]
+    classifications = [{
+        "primary": True, "family": False,
+        "segment": {"id": "KZFzniwnSyZfZ7v7nJ", "name": "Music"},
+        "genre": {"id": "KnvZfZ7vAeA", "name": "Rock"},
+        "subGenre": {"id": "KZazBEonSMnZfZ7v6F1", "name": "Pop"},
+        "type": {"id": "KZAyXgnZfZ7v7nI", "name": "Undefined"},
+        "subType": {"id": "KZFzBErXgnZfZ7v7lJ", "name": "Undefined"},
+    }]
+    venue = {
+        "name": f"Venue {i % 40}", "type": "venue", "id": f"KovZpZA{i % 40:05d}", "test": False, "locale": "en-us",
+        "url": f"https://www.ticketmaster.com/venue-{i % 40}", "images": images[:1], "postalCode": "90012",
+        "timezone": "America/Los_Angeles", "city": {"name": "Los Angeles"}, "state": {"name": "California", "stateCode": "CA"},
+        "country": {"name": "United States Of America", "countryCode": "US"}, "address": {"line1": f"{1000 + i} S Figueroa St"},
+        "location": {"longitude": "-118.2673", "latitude": "34.0430"}, "markets": [{"name": "Los Angeles", "id": "27"}],
+        "dmas": [{"id": 223}, {"id": 324}, {"id": 354}],
+        "boxOfficeInfo": {"phoneNumberDetail": "Box office: (213) 555-0100. " * 4, "openHoursDetail": "Open two hours before shows. " * 8,
+                          "acceptedPaymentDetail": "Visa, MasterCard, American Express. " * 4, "willCallDetail": "Bring photo ID. " * 12},
+        "parkingDetail": "Parking structures on every side of the venue. " * 8, "accessibleSeatingDetail": "Accessible seating on all levels. " * 8,
+        "generalInfo": {"generalRule": "No outside food, drink or professional cameras. " * 10, "childRule": "Children 2 and up need a ticket. " * 5},
+        "upcomingEvents": {"_total": 30, "ticketmaster": 30}, "_links": {"self": {"href": f"/discovery/v2/venues/KovZpZA{i % 40:05d}?locale=en-us"}},
+    }
+
+    def attraction(name: str, attraction_id: str) -> dict:
+        return {
+            "name": name, "type": "attraction", "id": attraction_id, "test": False, "locale": "en-us",
+            "url": f"https://www.ticketmaster.com/{attraction_id}", "aliases": [name.lower()], "images": images,
+            "externalLinks": {site: [{"url": f"https://www.{site}.com/{attraction_id}"}]
+                              for site in ("youtube", "twitter", "itunes", "lastfm", "facebook", "spotify", "musicbrainz", "instagram", "homepage")},
+            "classifications": classifications, "upcomingEvents": {"_total": 12, "ticketmaster": 12},
+            "_links": {"self": {"href": f"/discovery/v2/attractions/{attraction_id}?locale=en-us"}},
+        }
+
+    return {
+        "name": f"Event {i}", "type": "event", "id": f"vvG1zZ{i:010d}", "test": False, "locale": "en-us",
+        "url": f"https://www.ticketmaster.com/event/{i:016X}", "images": images,
+        "sales": {"public": {"startDateTime": "2025-01-01T18:00:00Z", "startTBD": False, "startTBA": False, "endDateTime": "2025-07-02T03:00:00Z"},
+                  "presales": [{"startDateTime": "2024-12-01T15:00:00Z", "endDateTime": "2024-12-02T05:00:00Z", "name": f"Presale {n}"} for n in range(4)]},
+        "dates": {"start": {"localDate": f"2025-07-{1 + i % 28:02d}", "localTime": "20:00:00", "dateTime": f"2025-07-{2 + i % 27:02d}T03:00:00Z",
+                            "dateTBD": False, "dateTBA": False, "timeTBA": False, "noSpecificTime": False},
+                  "timezone": "America/Los_Angeles", "status": {"code": "onsale"}, "spanMultipleDays": False},
+        "classifications": classifications,
+        "promoter": {"id": "494", "name": "PROMOTED BY VENUE", "description": "PROMOTED BY VENUE / NTL / USA"},
+        "promoters": [{"id": "494", "name": "PROMOTED BY VENUE", "description": "PROMOTED BY VENUE / NTL / USA"}],
+        "info": "All ages. Doors open one hour before the show. " * 6, "pleaseNote": "Mobile tickets only. No re-entry. " * 12,
+        "priceRanges": [{"type": "standard", "currency": "USD", "min": 49.5, "max": 250.0}],
+        "products": [{"name": "Parking", "id": f"parking{i}", "url": f"https://www.ticketmaster.com/parking/{i}", "type": "Upsell", "classifications": classifications}],
+        "seatmap": {"staticUrl": f"https://maps.ticketmaster.com/maps/geometry/3/event/{i:016X}/staticImage"},
+        "accessibility": {"ticketLimit": 2, "info": "Accessible seats can be bought online. " * 5},
+        "ticketLimit": {"info": "There is an 8 ticket limit for this event. " * 2}, "ageRestrictions": {"legalAgeEnforced": False},
+        "ticketing": {"safeTix": {"enabled": True}, "allInclusivePricing": {"enabled": False}},
+        "_links": {"self": {"href": f"/discovery/v2/events/vvG1zZ{i:010d}"}, "attractions": [{"href": "/discovery/v2/attractions"}], "venues": [{"href": "/discovery/v2/venues"}]},
+        "_embedded": {"venues": [venue], "attractions": [attraction(f"Artist {i % 50}", f"K8vZ9{i % 50:06d}"), attraction(f"Opener {i % 30}", f"K8vZ8{i % 30:06d}")]},
+    }
+
+
+def make_page(events: int) -> bytes:
+    page = {
+        "_embedded": {"events": [make_event(i) for i in range(events)]},
+        "_links": {"self": {"href": "/discovery/v2/events?size=200"}},
+        "page": {"size": 200, "totalElements": events, "totalPages": 1, "number": 0},
+    }
+    return json.dumps(page).encode("utf-8")
+
+
+def decoders() -> Dict[str, Callable[[bytes], List[dict]]]:
+    from concert_scout_agent import event_page
+    from concert_scout_agent.ticketmaster import _extract_event_info
+
+    def full(body: bytes) -> List[dict]:
+        page = json.loads(body)
+        json.dumps(page)
+        return [_extract_event_info(event) for event in page.get("_embedded", {}).get("events", [])[:EXTRACTED_EVENTS]]
+
+    def projected(mode: str) -> Callable[[bytes], List[dict]]:
+        def decode(body: bytes) -> List[dict]:
+            event_page.TM_EVENT_DECODER = mode
+            page = event_page.decode_event_page(body)
+            json.dumps(page)
+            return [_extract_event_info(event) for event in page.get("_embedded", {}).get("events", [])[:EXTRACTED_EVENTS]]
+        return decode
+
+    found = {"full": full, f"fast ({'orjson' if event_page.orjson else 'json'})": projected("fast")}
+    if event_page.ijson is not None:
+        found[f"stream (ijson {event_page.ijson.backend})"] = projected("stream")
+    return found
+
+
+def measure(decode: Callable[[bytes], List[dict]], body: bytes, repeat: int) -> dict:
+    decode(body)
+    rounds = []
+    for _ in range(repeat):
+        start = time.process_time()
+        decode(body)
+        rounds.append(time.process_time() - start)
+    tracemalloc.start()
+    decode(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "cpu_ms": round(statistics.median(rounds) * 1000, 2),
+        "min_cpu_ms": round(min(rounds) * 1000, 2),
+        "peak_alloc_mb": round(peak / 1e6, 2),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CPU time and peak allocation of decoding a Ticketmaster event page")
+    parser.add_argument("--events", type=int, default=200, help="Events on the synthetic page")
+    parser.add_argument("--page", help="Decode this saved Discovery API events response instead")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed decodes per decoder")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, "rb") as f:
+            body = f.read()
+    else:
+        body = make_page(args.events)
+    events = len(json.loads(body).get("_embedded", {}).get("events", []))
+    print(f"Page: {len(body) / 1e6:.2f} MB, {events} events\n")
+
+    results, outputs = {}, {}
+    for name, decode in decoders().items():
+        results[name] = measure(decode, body, args.repeat)
+        outputs[name] = decode(body)
+    print(f"{'decoder':<24}{'cpu ms/page':>14}{'min ms':>10}{'peak MB':>10}")
+    for name, result in results.items():
+        print(f"{name:<24}{result['cpu_ms']:>14,.2f}{result['min_cpu_ms']:>10,.2f}{result['peak_alloc_mb']:>10,.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"page_bytes": len(body), "results": results}, f, indent=2)
+
+    reference = outputs["full"]
+    mismatched = [name for name, output in outputs.items() if output != reference]
+    if mismatched:
+        print(f"\nConcerts differ from the full decode: {', '.join(mismatched)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the pure-Python code the agent tools run on every
+request, over synthetic payloads as large as real ones: 10k-track playlists,
+200-event Ticketmaster pages and 50-artist searches.
+
+    python benchmarks/hot_paths.py
+    python benchmarks/hot_paths.py --filter extract_event_info --repeat 10
+    python benchmarks/hot_paths.py --max-regression 0.15
+
+Each benchmark reports min/median/mean per call over --repeat rounds (each
+round sized by timeit's autorange). Results are appended to a JSONL history
+(benchmarks/hot_paths_history.jsonl) with the commit they were measured at,
+and compared with the latest earlier run from the same machine and Python.
+With --max-regression, exits with status 1 when a median slowed by more.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+DEFAULT_HISTORY = os.path.join(BENCH_DIR, "hot_paths_history.jsonl")
+
+PLAYLIST_TRACKS = 10_000
+PLAYLIST_ARTISTS = 2_000
+EVENTS_PER_PAGE = 200
+SEARCH_ARTISTS = 50
+LATLONG = ["34.0522", "-118.2437"]
+
+
+# Fixtures, shaped like the Spotify and Ticketmaster payloads
+
+def make_playlist(rng: random.Random, tracks: int = PLAYLIST_TRACKS, artists: int = PLAYLIST_ARTISTS) -> List[dict]:
+    """Playlist items with one to three artists each, skewed towards a few favourites, and a few removed tracks."""
+    pool = [{"id": f"{i:022d}", "name": f"Artist {i}", "type": "artist", "uri": f"spotify:artist:{i:022d}"} for i in range(artists)]
+    weights = [1 / (i + 1) for i in range(artists)]
+    items = []
+    for i in range(tracks):
+        if i % 200 == 0:
+            # Tracks removed from Spotify come back as null
+            items.append({"added_at": "2024-01-01T00:00:00Z", "track": None})
+            continue
+        items.append({
+            "added_at": "2024-01-01T00:00:00Z",
+            "track": {
+                "id": f"track{i}", "name": f"Track {i}", "duration_ms": 200_000, "popularity": rng.randint(0, 100),
+                "artists": rng.choices(pool, weights=weights, k=rng.choice((1, 1, 1, 2, 3))),
+            },
+        })
+    return items
+
+
+def make_event(rng: random.Random, i: int) -> dict:
+    images = [
+        {"ratio": ratio, "width": width, "height": width * 9 // 16, "url": f"https://s1.ticketm.net/dam/a/{i}/{ratio}_{width}.jpg"}
+        for ratio, width in rng.sample([("3_2", 640), ("4_3", 305), ("16_9", 640), ("16_9", 1136), ("16_9", 2048), ("3_2", 1024),
+                                        ("16_9", 205), ("4_3", 1024), ("3_2", 305), ("16_9", 100)], 10)
+    ]
+    start = {"localDate": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+    if i % 10:
+        start["localTime"] = "20:00:00"
+    return {
+        "name": f"Event {i}", "type": "event", "id": f"vv{i:016d}", "url": f"https://www.ticketmaster.com/event/{i:016X}",
+        "locale": "en-us", "images": images,
+        "dates": {"start": start, "timezone": "America/Los_Angeles", "status": {"code": "onsale"}},
+        "classifications": [{"primary": True, "segment": {"name": "Music"}, "genre": {"name": "Rock"}}],
+        "_embedded": {
+            "venues": [{"name": f"Venue {i % 40}", "city": {"name": "Los Angeles"}, "state": {"stateCode": "CA"},
+                        "location": {"latitude": "34.05", "longitude": "-118.24"}}],
+            "attractions": [{"name": f"Artist {i % 50}", "id": f"K8vZ9{i % 50:06d}"}],
+        },
+    }
+
+
+def make_concerts(rng: random.Random, count: int, url_pool: int) -> List[dict]:
+    """Extracted concerts whose URLs come from a shared pool, so lists overlap like real searches do."""
+    return [
+        {"name": f"Event {n}", "venue_name": "Venue", "city_name": "Los Angeles", "date": "2025-07-01", "time": "20:00:00",
+         "url": f"https://www.ticketmaster.com/event/{n:016X}", "image_url": None, "genre": "Rock"}
+        for n in (rng.randrange(url_pool) for _ in range(count))
+    ]
+
+
+# Benchmarks: each builds its fixtures and returns the call to time
+
+def bench_get_top_artists(rng: random.Random) -> Callable[[], object]:
+    from concert_scout_agent.sub_agents.sequential_agent.sub_agents.spotify_agent.agent import _get_top_artists
+
+    tracks = make_playlist(rng)
+    return lambda: _get_top_artists(tracks)
+
+
+def bench_extract_event_info(rng: random.Random) -> Callable[[], object]:
+    from concert_scout_agent.ticketmaster import _extract_event_info
+
+    events = [make_event(rng, i) for i in range(EVENTS_PER_PAGE)]
+    return lambda: [{**_extract_event_info(event), "genre": "Rock"} for event in events]
+
+
+def bench_build_query_string(rng: random.Random) -> Callable[[], object]:
+    from concert_scout_agent.ticketmaster import _build_date_params, _build_query_string
+
+    artists = [f"Artist {i}" for i in range(SEARCH_ARTISTS)]
+    date = ["2025-07-01T00:00:00", "2025-07-31T23:59:59"]
+    return lambda: [_build_query_string(LATLONG, keyword=artist, **_build_date_params(date)) for artist in artists]
+
+
+def bench_build_artist_query_string(rng: random.Random) -> Callable[[], object]:
+    from concert_scout_agent.ticketmaster import _build_artist_query_string
+
+    artist_ids = [f"K8vZ9{i:06d}" for i in range(SEARCH_ARTISTS)]
+    return lambda: [_build_artist_query_string(LATLONG, artist_id) for artist_id in artist_ids]
+
+
+def bench_exclude_concerts(rng: random.Random) -> Callable[[], object]:
+    from concert_scout_agent.ticketmaster import _exclude_concerts
+
+    # search_concerts for 50 artists and 50 related artists: 15 and 30 concerts each, plus 20 for the genre
+    concerts_artists = make_concerts(rng, SEARCH_ARTISTS * 15, 2000)
+    genre_concerts = make_concerts(rng, 20, 2000)
+    related_results = [make_concerts(rng, 30, 2000) for _ in range(SEARCH_ARTISTS)]
+
+    def run():
+        top_artist_urls = {concert["url"] for concert in concerts_artists}
+        return _exclude_concerts([genre_concerts], top_artist_urls, limit=6), _exclude_concerts(related_results, top_artist_urls, limit=15)
+
+    return run
+
+
+def bench_update_bounded_state(rng: random.Random) -> Callable[[], object]:
+    from concert_scout_agent.state import STATE_LIMITS, update_bounded_state
+
+    # What ticketmaster_api saves after a 50-artist search, into a session that already holds a full list
+    earlier = make_concerts(rng, STATE_LIMITS["ticketmaster_concerts"], 2000)
+    new = make_concerts(rng, SEARCH_ARTISTS * 15 + 6 + 15, 2000)
+
+    def run():
+        state = {"ticketmaster_concerts": list(earlier)}
+        return update_bounded_state(state, "ticketmaster_concerts", new)
+
+    return run
+
+
+BENCHMARKS: Dict[str, Callable[[random.Random], Callable[[], object]]] = {
+    "get_top_artists[10k tracks]": bench_get_top_artists,
+    "extract_event_info[200 events]": bench_extract_event_info,
+    "build_query_string[50 artists]": bench_build_query_string,
+    "build_artist_query_string[50 artists]": bench_build_artist_query_string,
+    "exclude_concerts[50+50 artists]": bench_exclude_concerts,
+    "update_bounded_state[771 concerts]": bench_update_bounded_state,
+}
+
+
+def measure(call: Callable[[], object], repeat: int) -> dict:
+    """Seconds per call, pytest-benchmark style: each round runs as many calls as fit in ~0.2s."""
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    rounds = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "min_us": round(min(rounds) * 1e6, 2),
+        "median_us": round(statistics.median(rounds) * 1e6, 2),
+        "mean_us": round(statistics.mean(rounds) * 1e6, 2),
+        "stddev_us": round(statistics.stdev(rounds) * 1e6, 2) if len(rounds) > 1 else 0.0,
+        "rounds": repeat,
+        "calls_per_round": number,
+    }
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=BENCH_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        "machine": platform.node(),
+        "cpu": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+    }
+
+
+def previous_run(path: str, env: dict) -> Optional[dict]:
+    """The latest run in the history measured on the same machine and Python."""
+    if not os.path.exists(path):
+        return None
+    latest = None
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                run = json.loads(line)
+                if run.get("environment") == env:
+                    latest = run
+    return latest
+
+
+def print_results(results: Dict[str, dict], previous: Optional[dict]):
+    print(f"{'benchmark':<40}{'min us':>12}{'median us':>12}{'stddev':>10}{'rounds':>8}   vs previous")
+    for name, result in results.items():
+        change = ""
+        before = (previous or {}).get("results", {}).get(name)
+        if before:
+            change = f"{(result['median_us'] / before['median_us'] - 1):+.1%}"
+        print(f"{name:<40}{result['min_us']:>12,.1f}{result['median_us']:>12,.1f}{result['stddev_us']:>10,.1f}{result['rounds']:>8}   {change}")
+    if previous:
+        print(f"\nCompared with {previous['commit'] or 'an unknown commit'} measured {previous['timestamp']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the agent tools' pure-Python hot paths")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7, help="Rounds per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSONL file the results are appended to")
+    parser.add_argument("--no-save", action="store_true", help="Compare with the history without appending to it")
+    parser.add_argument("--max-regression", type=float, help="Exit with status 1 when a median is slower than the previous run by more (fraction)")
+    args = parser.parse_args()
+
+    selected = {name: bench for name, bench in BENCHMARKS.items() if args.filter in name}
+    if not selected:
+        parser.error(f"no benchmark matches {args.filter!r}; available: {', '.join(BENCHMARKS)}")
+
+    results = {}
+    for name, bench in selected.items():
+        call = bench(random.Random(args.seed))
+        results[name] = measure(call, args.repeat)
+        print(f"  {name}: {results[name]['median_us']:,.1f} us", file=sys.stderr)
+
+    env = environment()
+    previous = previous_run(args.history, env)
+    print_results(results, previous)
+
+    if not args.no_save:
+        commit = _git("rev-parse", "--short", "HEAD")
+        if commit and _git("status", "--porcelain", "--untracked-files=no"):
+            commit += "-dirty"
+        with open(args.history, "a") as f:
+            f.write(json.dumps({
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "commit": commit,
+                "environment": env,
+                "results": results,
+            }) + "\n")
+
+    if args.max_regression is not None and previous:
+        regressions = [
+            f"{name}: median {result['median_us']:,.1f} us vs {previous['results'][name]['median_us']:,.1f} us"
+            for name, result in results.items()
+            if name in previous["results"] and result["median_us"] > previous["results"][name]["median_us"] * (1 + args.max_regression)
+        ]
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Per-call latency of a new connection per request (requests.get) versus the
+shared pooled client the agent tools use.
+
+    python benchmarks/http_latency.py --requests 50
+    python benchmarks/http_latency.py --url https://app.ticketmaster.com/discovery/v2/events.json
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import requests
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+
+from concert_scout_agent.http_client import get_http_client, close_http_client, TM_BASE_URL, HTTP2_AVAILABLE
+
+
+def _summary(name: str, latencies: list) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return (f"{name:<16} mean {statistics.mean(latencies) * 1000:7.1f} ms   "
+            f"p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms")
+
+
+def bench_requests(url: str, n: int) -> list:
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        requests.get(url, timeout=10)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def bench_shared_client(url: str, n: int) -> list:
+    client = get_http_client()
+    latencies = []
+    try:
+        for _ in range(n):
+            start = time.perf_counter()
+            await client.get(url)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await close_http_client()
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-call HTTP latency with and without connection reuse")
+    parser.add_argument(
+        "--url",
+        default=f"{TM_BASE_URL}/discovery/v2/attractions?apikey={os.getenv('TM_KEY')}&keyword=coldplay",
+        help="URL to call (defaults to a Ticketmaster attraction search)"
+    )
+    parser.add_argument("--requests", type=int, default=30, help="Sequential calls per client")
+    args = parser.parse_args()
+
+    before = bench_requests(args.url, args.requests)
+    after = asyncio.run(bench_shared_client(args.url, args.requests))
+    print(_summary("requests.get", before))
+    print(_summary(f"shared (h2={HTTP2_AVAILABLE})", after))
+    print(f"mean saved per call: {(statistics.mean(before) - statistics.mean(after)) * 1000:.1f} ms")
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Open-loop load test of the /chat API: how many concurrent conversations one
+gunicorn box (gunicorn.conf.py) sustains before tail latency blows up.
+
+Conversations arrive as a Poisson process at the rate of each stage of the
+profile, whether or not earlier ones have finished, and play the turns of a
+conversation picked from the workload. Each conversation keeps its session id
+and its own keep-alive connection, so its turns reach the same worker while
+the connection lasts. Per stage it reports latency percentiles, goodput,
+error, shed and timeout rates and conversations in flight, then the knee: the
+first stage where p95 or errors blow past the first stage's, or throughput
+stops rising with the offered load.
+
+Without --url it starts gunicorn with gunicorn.conf.py against the stubs in
+benchmarks/stubs.py (or, with --replay, answering from recorded cassettes):
+
+    python benchmarks/loadgen.py --profile "ramp:0.2-3/8@30"
+    python benchmarks/loadgen.py --profile "steps:0.5,1,2,4@60" --env TM_MAX_RPS=20 --workers 4
+    python benchmarks/loadgen.py --replay "cassettes/*.jsonl.gz" --profile "constant:1@120"
+    python benchmarks/loadgen.py --url http://127.0.0.1:8000 --workload my_workload.jsonl
+
+Profiles, in new conversations per second:
+    constant:RATE@SECONDS
+    steps:RATE,RATE,...@SECONDS_PER_STEP
+    ramp:FROM-TO/STEPS@SECONDS_PER_STEP
+
+Workload lines are conversations: {"name": ..., "weight": ..., "turns":
+[{"prompt": ..., "think_time": ...}, ...]}. A cassette glob (*.jsonl.gz)
+plays the conversations recorded in it instead.
+"""
+
+import argparse
+import asyncio
+import bisect
+import ipaddress
+import json
+import logging
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, API_DIR)
+
+from pipeline_latency import _latency_arg, _free_port, configure_environment, start_stubs, wait_for_stubs
+
+DEFAULT_WORKLOAD = os.path.join(BENCH_DIR, "workload.jsonl")
+OUTCOMES = ("ok", "throttled", "shed", "timeout", "error")
+SAMPLE_INTERVAL = 0.5
+
+# (new conversations per second, seconds)
+Stage = Tuple[float, float]
+
+
+def parse_profile(spec: str) -> List[Stage]:
+    kind, _, rest = spec.partition(":")
+    rates, _, seconds = rest.partition("@")
+    if not seconds:
+        raise ValueError(f"Profile {spec!r} needs @SECONDS")
+    duration = float(seconds)
+    if kind == "constant":
+        return [(float(rates), duration)]
+    if kind == "steps":
+        return [(float(rate), duration) for rate in rates.split(",")]
+    if kind == "ramp":
+        bounds, _, steps = rates.partition("/")
+        low, _, high = bounds.partition("-")
+        count = int(steps or 5)
+        low, high = float(low), float(high)
+        if count < 2:
+            return [(high, duration)]
+        return [(low + (high - low) * i / (count - 1), duration) for i in range(count)]
+    raise ValueError(f"Unknown profile {kind!r}; use constant, steps or ramp")
+
+
+def load_workload(path: str) -> List[dict]:
+    """Conversations to play, from a JSONL workload or the turns recorded in cassettes."""
+    if path.endswith(".gz"):
+        from concert_scout_agent.cassette import Cassette
+
+        conversations: Dict[str, List[dict]] = {}
+        previous: Dict[str, float] = {}
+        for entry, message in Cassette(path, "replay").entries("turn"):
+            # Think for as long as the user did between the end of one turn and the next message
+            turns = conversations.setdefault(entry["key"], [])
+            think_time = max(entry["at"] - previous[entry["key"]], 0) if entry["key"] in previous else 0
+            turns.append({"prompt": message, "think_time": think_time})
+            previous[entry["key"]] = entry["at"] + entry["duration"]
+        workload = [{"name": f"recorded-{i}", "weight": 1, "turns": turns} for i, turns in enumerate(conversations.values())]
+    else:
+        with open(path) as f:
+            workload = [json.loads(line) for line in f if line.strip()]
+    for i, conversation in enumerate(workload):
+        conversation.setdefault("name", f"conversation-{i}")
+        conversation["turns"] = [{"prompt": turn} if isinstance(turn, str) else turn for turn in conversation["turns"]]
+    if not workload:
+        raise SystemExit(f"No conversations in {path}")
+    return workload
+
+
+def _outcome(status: Optional[int]) -> str:
+    if status == 200:
+        return "ok"
+    if status == 429:
+        return "throttled"
+    if status == 503:
+        return "shed"
+    if status in (408, 504) or status is None:
+        return "timeout"
+    return "error"
+
+
+def _percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000, 1)
+
+
+class LoadTest:
+    """Plays the workload against the API at the profile's arrival rates and collects every turn's outcome."""
+
+    def __init__(self, args, workload: List[dict], stages: List[Stage]):
+        self.args = args
+        self.workload = workload
+        self.weights = [conversation.get("weight", 1) for conversation in workload]
+        self.stages = stages
+        # Stage i covers [boundaries[i], boundaries[i + 1]) seconds into the run
+        self.boundaries = [0.0]
+        for _, duration in stages:
+            self.boundaries.append(self.boundaries[-1] + duration)
+        self.rng = random.Random(args.seed)
+        self.run_id = uuid4().hex[:8]
+        self.turns: List[dict] = []
+        self.samples: List[Tuple[float, int, int]] = []
+        self.active_sessions = 0
+        self.active_requests = 0
+        self.arrived = [0] * len(stages)
+        self.dropped = [0] * len(stages)
+        self.abandoned = [0] * len(stages)
+        self.session_resets = [0] * len(stages)
+        self.spread_ips = args.spread_ips and self._loopback(args.url)
+        self.start = 0.0
+
+    @staticmethod
+    def _loopback(url: str) -> bool:
+        try:
+            return ipaddress.ip_address(urlsplit(url).hostname).is_loopback
+        except ValueError:
+            return False
+
+    def _now(self) -> float:
+        return time.monotonic() - self.start
+
+    def _stage(self, at: float) -> int:
+        return min(bisect.bisect_right(self.boundaries, at) - 1, len(self.stages) - 1)
+
+    def _client(self, index: int) -> httpx.AsyncClient:
+        # One connection per conversation: gunicorn keeps a keep-alive connection on the
+        # worker that accepted it, and the conversation history lives in that worker
+        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        transport = None
+        if self.spread_ips:
+            # Each conversation from its own loopback address, as separate clients
+            # would be, so the per-IP rate limit applies to it alone
+            address = ipaddress.ip_address("127.1.0.0") + 1 + index % (2 ** 20)
+            transport = httpx.AsyncHTTPTransport(local_address=str(address), limits=limits)
+        return httpx.AsyncClient(base_url=self.args.url, timeout=self.args.timeout, limits=limits, transport=transport)
+
+    async def conversation(self, index: int, stage: int):
+        conversation = self.rng.choices(self.workload, weights=self.weights)[0]
+        user_id = f"load-{self.run_id}-{index}"
+        session_id = None
+        self.active_sessions += 1
+        try:
+            async with self._client(index) as client:
+                for number, turn in enumerate(conversation["turns"]):
+                    if number:
+                        think_time = turn.get("think_time", self.rng.expovariate(1 / self.args.think_time) if self.args.think_time else 0)
+                        await asyncio.sleep(think_time)
+                    sent_at = self._now()
+                    status = None
+                    self.active_requests += 1
+                    try:
+                        response = await client.post("/chat", json={
+                            "message": turn["prompt"], "user_id": user_id, "session_id": session_id, "response_format": "structured"
+                        })
+                        status = response.status_code
+                    except httpx.TimeoutException:
+                        pass
+                    except httpx.HTTPError as e:
+                        status = -1
+                        logging.debug(f"Turn failed: {e!r}")
+                    finally:
+                        self.active_requests -= 1
+                    done_at = self._now()
+                    outcome = _outcome(status) if status != -1 else "error"
+                    self.turns.append({
+                        "stage": self._stage(sent_at), "sent_at": sent_at, "done_at": done_at,
+                        "latency": done_at - sent_at, "outcome": outcome, "conversation": conversation["name"],
+                    })
+                    if outcome != "ok":
+                        # A user whose message failed gives up on the conversation
+                        if number + 1 < len(conversation["turns"]):
+                            self.abandoned[stage] += 1
+                        return
+                    returned = response.json()["session_id"]
+                    if session_id is not None and returned != session_id:
+                        # The turn reached a worker without the session (only visible without Redis,
+                        # which otherwise keeps the id while the history is still lost)
+                        self.session_resets[self._stage(sent_at)] += 1
+                    session_id = returned
+        finally:
+            self.active_sessions -= 1
+
+    async def sample(self):
+        while True:
+            self.samples.append((self._now(), self.active_sessions, self.active_requests))
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    async def run(self):
+        tasks = set()
+        self.start = time.monotonic()
+        sampler = asyncio.create_task(self.sample())
+        index = 0
+        try:
+            for stage, (rate, duration) in enumerate(self.stages):
+                print(f"  stage {stage + 1}/{len(self.stages)}: {rate:g} conversations/s for {duration:g}s", file=sys.stderr)
+                stage_end = self.boundaries[stage + 1]
+                at = self.boundaries[stage]
+                while rate > 0:
+                    # Arrivals are memoryless, so each stage can start its own sequence
+                    at += self.rng.expovariate(rate)
+                    if at >= stage_end:
+                        break
+                    await asyncio.sleep(max(at - self._now(), 0))
+                    self.arrived[stage] += 1
+                    if self.active_sessions >= self.args.max_in_flight:
+                        self.dropped[stage] += 1
+                        continue
+                    task = asyncio.create_task(self.conversation(index, stage))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    index += 1
+                await asyncio.sleep(max(stage_end - self._now(), 0))
+            if tasks:
+                print(f"  draining {len(tasks)} conversations", file=sys.stderr)
+                _, pending = await asyncio.wait(set(tasks), timeout=self.args.drain)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            sampler.cancel()
+
+    def summarize(self) -> List[dict]:
+        summaries = []
+        for stage, (rate, duration) in enumerate(self.stages):
+            start, end = self.boundaries[stage], self.boundaries[stage + 1]
+            turns = [turn for turn in self.turns if turn["stage"] == stage]
+            outcomes = {outcome: sum(1 for turn in turns if turn["outcome"] == outcome) for outcome in OUTCOMES}
+            latencies = sorted(turn["latency"] for turn in turns if turn["outcome"] == "ok")
+            # Successful turns sent in the stage, and those that finished in it (which lag behind by the latency)
+            goodput = outcomes["ok"] / duration
+            completed = sum(1 for turn in self.turns if turn["outcome"] == "ok" and start <= turn["done_at"] < end)
+            samples = [(sessions, requests) for at, sessions, requests in self.samples if start <= at < end] or [(0, 0)]
+            summaries.append({
+                "offered_conversations_per_s": round(rate, 3),
+                "arrived": self.arrived[stage],
+                "dropped": self.dropped[stage],
+                "turns": len(turns),
+                "offered_turns_per_s": round(len(turns) / duration, 3),
+                "goodput_turns_per_s": round(goodput, 3),
+                "throughput_turns_per_s": round(completed / duration, 3),
+                "p50_ms": _percentile(latencies, 0.50),
+                "p95_ms": _percentile(latencies, 0.95),
+                "p99_ms": _percentile(latencies, 0.99),
+                "outcomes": outcomes,
+                "error_rate": round((len(turns) - outcomes["ok"]) / len(turns), 4) if turns else 0.0,
+                "timeout_rate": round(outcomes["timeout"] / len(turns), 4) if turns else 0.0,
+                "abandoned_conversations": self.abandoned[stage],
+                "session_resets": self.session_resets[stage],
+                "conversations_in_flight": {"mean": round(sum(s for s, _ in samples) / len(samples), 1), "max": max(s for s, _ in samples)},
+                "requests_in_flight": {"mean": round(sum(r for _, r in samples) / len(samples), 1), "max": max(r for _, r in samples)},
+            })
+        return summaries
+
+
+def find_knee(summaries: List[dict], args) -> Optional[dict]:
+    """The first stage past the knee and why, judged against the first stage with successful turns."""
+    base = next((summary for summary in summaries if summary["p95_ms"] is not None), None)
+    if base is None:
+        return {"stage": 0, "last_healthy_stage": None, "reasons": ["no turn succeeded"]}
+    for stage, summary in enumerate(summaries):
+        reasons = []
+        if summary["p95_ms"] is None or summary["p95_ms"] > base["p95_ms"] * args.knee_latency_factor:
+            reasons.append(f"p95 {summary['p95_ms']} ms is over {args.knee_latency_factor:g}x the first stage's {base['p95_ms']} ms")
+        if summary["error_rate"] > args.knee_error_rate:
+            reasons.append(f"error rate {summary['error_rate']:.1%} is over {args.knee_error_rate:.1%}")
+        if stage:
+            # Where the throughput curve flattens: extra load no longer buys proportionally more completed turns
+            previous = summaries[stage - 1]
+            offered = summary["offered_turns_per_s"] - previous["offered_turns_per_s"]
+            gained = summary["throughput_turns_per_s"] - previous["throughput_turns_per_s"]
+            if offered > 0 and gained < offered * args.knee_efficiency:
+                reasons.append(f"throughput rose {gained:.2f} turns/s for {offered:.2f} turns/s more offered")
+        if reasons:
+            return {"stage": stage, "last_healthy_stage": stage - 1 if stage else None, "reasons": reasons}
+    return None
+
+
+def print_results(summaries: List[dict], knee: Optional[dict]):
+    print(f"{'stage':>5}{'conv/s':>8}{'turns':>7}{'offered/s':>11}{'goodput/s':>11}{'done/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'errors':>8}{'timeouts':>10}{'shed':>6}{'429':>5}{'in flight':>11}{'resets':>8}")
+    for stage, summary in enumerate(summaries):
+        latencies = "".join(f"{summary[metric]:>9.0f}" if summary[metric] is not None else f"{'-':>9}" for metric in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"{stage + 1:>5}{summary['offered_conversations_per_s']:>8g}{summary['turns']:>7}{summary['offered_turns_per_s']:>11.2f}"
+              f"{summary['goodput_turns_per_s']:>11.2f}{summary['throughput_turns_per_s']:>8.2f}{latencies}{summary['error_rate']:>8.1%}{summary['timeout_rate']:>10.1%}"
+              f"{summary['outcomes']['shed']:>6}{summary['outcomes']['throttled']:>5}"
+              f"{summary['conversations_in_flight']['mean']:>7.1f}/{summary['conversations_in_flight']['max']:<3}{summary['session_resets']:>8}")
+    if knee is None:
+        print("\nNo knee: every stage held its latency, errors and throughput; raise the profile's rates to find it")
+        return
+    print(f"\nKnee at stage {knee['stage'] + 1}: {'; '.join(knee['reasons'])}")
+    if knee["last_healthy_stage"] is not None:
+        healthy = summaries[knee["last_healthy_stage"]]
+        print(f"Sustained: {healthy['offered_conversations_per_s']:g} conversations/s, {healthy['throughput_turns_per_s']:g} turns/s, "
+              f"{healthy['conversations_in_flight']['mean']:g} conversations in flight (max {healthy['conversations_in_flight']['max']}), "
+              f"p95 {healthy['p95_ms']:.0f} ms")
+
+
+def start_box(args, log) -> Tuple[subprocess.Popen, str]:
+    """Start gunicorn with gunicorn.conf.py on a free local port, with the environment already pointed at the backends."""
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port))
+    for assignment in args.env:
+        name, _, value = assignment.partition("=")
+        env[name] = value
+    command = [sys.executable, "-m", "gunicorn", "app:app", "-c", "gunicorn.conf.py"]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    process = subprocess.Popen(command, cwd=API_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_for_box(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+            try:
+                if (await client.get("/health/live")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"gunicorn did not answer on {url} within {timeout:g}s")
+            await asyncio.sleep(0.25)
+
+
+def stop_box(process: subprocess.Popen):
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=35)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Open-loop load test of the /chat API")
+    parser.add_argument("--url", help="API to load; by default gunicorn is started locally against stubbed backends")
+    parser.add_argument("--workload", help=f"JSONL conversations or a cassette glob (default {os.path.relpath(DEFAULT_WORKLOAD)}, "
+                                           "or the recorded turns with --replay)")
+    parser.add_argument("--profile", default="ramp:0.2-2/6@30", help="Arrival profile (see above)")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Mean seconds between a reply and the next message, "
+                                                                      "when the workload does not give one")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds before a turn counts as timed out")
+    parser.add_argument("--drain", type=float, default=60.0, help="Seconds to let conversations finish after the last stage")
+    parser.add_argument("--max-in-flight", type=int, default=2000, help="Conversations beyond this are dropped by the client")
+    parser.add_argument("--no-spread-ips", dest="spread_ips", action="store_false",
+                        help="Send every conversation from one address (to a loopback URL they each get their own)")
+    parser.add_argument("--knee-latency-factor", type=float, default=2.0, help="p95 over this multiple of the first stage's is past the knee")
+    parser.add_argument("--knee-error-rate", type=float, default=0.01, help="Non-200 turns over this fraction are past the knee")
+    parser.add_argument("--knee-efficiency", type=float, default=0.85, help="Throughput gaining under this fraction of the extra offered turns is past the knee")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    box = parser.add_argument_group("local box (without --url)")
+    box.add_argument("--workers", type=int, help="Override the worker count from gunicorn.conf.py")
+    box.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="Extra environment for the box, e.g. TM_MAX_RPS=20")
+    box.add_argument("--replay", metavar="CASSETTE_GLOB", help="Answer from recorded cassettes instead of the stubs")
+    box.add_argument("--time-scale", type=float, default=1.0, help="With --replay, multiply recorded durations")
+    box.add_argument("--caches", action="store_true", help="Keep the LLM and concert search caches on")
+    box.add_argument("--gemini-latency", type=_latency_arg, default=(600, 0.4), metavar="MEDIAN_MS,SIGMA")
+    box.add_argument("--spotify-latency", type=_latency_arg, default=(60, 0.3), metavar="MEDIAN_MS,SIGMA")
+    box.add_argument("--ticketmaster-latency", type=_latency_arg, default=(120, 0.5), metavar="MEDIAN_MS,SIGMA")
+    box.add_argument("--latency-scale", type=float, default=1.0, help="Multiply every stub latency")
+    box.add_argument("--events-per-search", type=int, default=12, help="Events the Ticketmaster stub returns per search")
+    box.add_argument("--server-log", help="Write gunicorn's output here (default: a temporary file)")
+    args = parser.parse_args()
+    try:
+        stages = parse_profile(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+    workload = load_workload(args.workload or args.replay or DEFAULT_WORKLOAD)
+    logging.basicConfig(level=logging.WARNING)
+
+    stubs = process = log = None
+    try:
+        if not args.url:
+            if args.replay:
+                os.environ.update({
+                    "CASSETTE_MODE": "replay",
+                    "CASSETTE_PATH": args.replay,
+                    "CASSETTE_TIME_SCALE": str(args.time_scale),
+                    "REDIS_URL": "",
+                })
+                for name in ("GOOGLE_API_KEY", "SPOTIFY_CLIENT", "SPOTIFY_SECRET", "TM_KEY"):
+                    os.environ.setdefault(name, "replay")
+            else:
+                stubs, urls = start_stubs(args)
+                configure_environment(urls, args.caches)
+                asyncio.run(wait_for_stubs(urls))
+            log = open(args.server_log, "w") if args.server_log else tempfile.NamedTemporaryFile("w", prefix="loadgen-gunicorn-", suffix=".log", delete=False)
+            process, args.url = start_box(args, log)
+            print(f"  gunicorn on {args.url}, log in {log.name}", file=sys.stderr)
+            asyncio.run(wait_for_box(args.url, process, timeout=120))
+
+        test = LoadTest(args, workload, stages)
+        asyncio.run(test.run())
+    finally:
+        if process is not None:
+            stop_box(process)
+        if stubs is not None:
+            stubs.kill()
+            stubs.join()
+        if log is not None:
+            log.close()
+
+    summaries = test.summarize()
+    knee = find_knee(summaries, args)
+    print_results(summaries, knee)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": args.url, "profile": args.profile, "stages": summaries, "knee": knee}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency of the agent pipeline against local stand-ins for Gemini,
+Spotify and Ticketmaster (benchmarks/stubs.py), so it runs without API keys,
+network access or Redis.
+
+Every scenario in stubs.SCENARIOS is run through root_agent with the
+InMemoryRunner (as the job worker does) and through the FastAPI /chat route,
+reporting p50/p95/p99 latency per turn, throughput and outbound calls per turn.
+
+    python benchmarks/pipeline_latency.py
+    python benchmarks/pipeline_latency.py --mode runner --scenarios artist,multi_turn --latency-scale 0.2
+    python benchmarks/pipeline_latency.py --save-baseline
+
+With a baseline saved, exits with status 1 when any scenario regresses past
+the tolerances.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from stubs import SCENARIOS, serve
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "pipeline_baseline.json")
+SERVICES = ("gemini", "spotify", "ticketmaster")
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def _latency_arg(value: str) -> Tuple[float, float]:
+    median, _, sigma = value.partition(",")
+    return float(median), float(sigma or 0)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stubs(args) -> Tuple[multiprocessing.Process, Dict[str, str]]:
+    """Start the stubs in their own process so they don't compete with the pipeline for the event loop."""
+    ports = {service: _free_port() for service in SERVICES}
+    latencies = {"gemini": args.gemini_latency, "spotify": args.spotify_latency, "ticketmaster": args.ticketmaster_latency}
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(ports, latencies, args.latency_scale, args.seed, args.events_per_search), daemon=True
+    )
+    process.start()
+    return process, {service: f"http://127.0.0.1:{port}" for service, port in ports.items()}
+
+
+def configure_environment(urls: Dict[str, str], caches: bool):
+    """Point every client at the stubs. Must run before the agent modules are imported."""
+    os.environ.update({
+        "GOOGLE_GEMINI_BASE_URL": urls["gemini"],
+        "GOOGLE_GENAI_USE_VERTEXAI": "FALSE",
+        "GOOGLE_API_KEY": "benchmark",
+        "SPOTIFY_CLIENT": "benchmark",
+        "SPOTIFY_SECRET": "benchmark",
+        "SPOTIFY_API_URL": f"{urls['spotify']}/v1/",
+        "SPOTIFY_TOKEN_URL": f"{urls['spotify']}/api/token",
+        "TM_BASE_URL": urls["ticketmaster"],
+        "TM_KEY": "benchmark",
+        # Empty rather than unset, so a REDIS_URL in .env is not picked up
+        "REDIS_URL": "",
+    })
+    if not caches:
+        # Every turn should exercise the full path
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+        os.environ["TM_SEARCH_CACHE_TTL"] = "0"
+        os.environ["TM_ATTRACTION_CACHE_TTL"] = "0"
+        os.environ["TM_EVENTS_CACHE_TTL"] = "0"
+
+
+async def wait_for_stubs(urls: Dict[str, str], timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        for url in urls.values():
+            while True:
+                try:
+                    (await client.get(f"{url}/_stats")).raise_for_status()
+                    break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Stub at {url} did not start")
+                    await asyncio.sleep(0.1)
+
+
+async def stub_calls(url: str) -> Dict[str, int]:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{url}/_stats")).json()
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def _expected(turn: dict, text: str, has_recommendations: bool) -> bool:
+    """A question back from the root agent, or concerts from the final recommender."""
+    return bool(text) and not has_recommendations if "reply" in turn else has_recommendations
+
+
+# A conversation runner plays a scenario in a fresh session and returns (seconds, as expected) per turn
+Conversation = Callable[[str, List[dict]], Awaitable[List[Tuple[float, bool]]]]
+
+
+async def runner_conversation(user_id: str, turns: List[dict]) -> List[Tuple[float, bool]]:
+    from pipeline import get_or_create_session, run_prompt, extract_recommendations, extract_text_response
+
+    session = await get_or_create_session(None, user_id)
+    results = []
+    for turn in turns:
+        start = time.perf_counter()
+        session, events = await run_prompt(session, turn["prompt"], user_id)
+        seconds = time.perf_counter() - start
+        results.append((seconds, _expected(turn, extract_text_response(events), extract_recommendations(events) is not None)))
+    return results
+
+
+def chat_conversation(client: httpx.AsyncClient) -> Conversation:
+    async def conversation(user_id: str, turns: List[dict]) -> List[Tuple[float, bool]]:
+        session_id = None
+        results = []
+        for turn in turns:
+            start = time.perf_counter()
+            response = await client.post("/chat", json={
+                "message": turn["prompt"], "user_id": user_id, "session_id": session_id, "response_format": "structured"
+            })
+            seconds = time.perf_counter() - start
+            if response.status_code != 200:
+                results.append((seconds, False))
+                continue
+            body = response.json()
+            session_id = body["session_id"]
+            results.append((seconds, _expected(turn, body["response"], body.get("recommendations") is not None)))
+        return results
+
+    return conversation
+
+
+async def bench_scenario(name: str, conversation: Conversation, stats_url: str, iterations: int, concurrency: int) -> dict:
+    """Play the scenario `iterations` times, `concurrency` conversations at a time."""
+    turns = SCENARIOS[name]
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(iterations):
+        queue.put_nowait(i)
+    results: List[Tuple[float, bool]] = []
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results.extend(await conversation(f"bench-{name}-{i}", turns))
+
+    before = await stub_calls(stats_url)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    after = await stub_calls(stats_url)
+
+    latencies = sorted(seconds for seconds, _ in results)
+    outbound = {service: 0 for service in SERVICES}
+    for key, count in after.items():
+        outbound[key.split(":")[0]] += count - before.get(key, 0)
+    return {
+        "turns": len(results),
+        "errors": sum(1 for _, ok in results if not ok),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+        "throughput_rps": round(len(results) / wall, 3),
+        "calls_per_turn": {service: round(count / len(results), 2) for service, count in outbound.items()},
+    }
+
+
+def find_regressions(results: Dict[str, dict], baseline: Dict[str, dict], args) -> List[str]:
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in LATENCY_METRICS:
+            if current[metric] > base[metric] * (1 + args.latency_tolerance):
+                regressions.append(f"{key}: {metric} {current[metric]} > baseline {base[metric]}")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - args.throughput_tolerance):
+            regressions.append(f"{key}: throughput {current['throughput_rps']}/s < baseline {base['throughput_rps']}/s")
+        for service, count in current["calls_per_turn"].items():
+            limit = base["calls_per_turn"].get(service, 0) * (1 + args.calls_tolerance)
+            if count > limit + 1e-9:
+                regressions.append(f"{key}: {service} calls per turn {count} > baseline {base['calls_per_turn'].get(service, 0)}")
+    return regressions
+
+
+def print_results(results: Dict[str, dict]):
+    print(f"{'mode/scenario':<22}{'turns':>6}{'errors':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'turns/s':>9}   calls per turn")
+    for key, result in results.items():
+        calls = "  ".join(f"{service} {count:g}" for service, count in result["calls_per_turn"].items())
+        print(f"{key:<22}{result['turns']:>6}{result['errors']:>7}{result['p50_ms']:>9.0f}{result['p95_ms']:>9.0f}"
+              f"{result['p99_ms']:>9.0f}{result['throughput_rps']:>9.2f}   {calls}")
+
+
+async def run(args, urls: Dict[str, str]) -> Dict[str, dict]:
+    await wait_for_stubs(urls)
+
+    import session_store
+    import rate_limit
+    from app import app
+
+    # Hermetic: sessions and rate limits stay in memory, and the benchmark is not throttled by the per-IP quota
+    session_store.use_redis = False
+
+    async def unlimited(checks):
+        return True, 1, 0
+
+    rate_limit.limiter.hit = unlimited
+    # INFO logs for every request would dominate the output, as would the
+    # per-call warning about function-call parts and the failed usage flushes
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("google_genai.types").setLevel(logging.ERROR)
+    logging.getLogger("concert_scout_agent.usage").setLevel(logging.ERROR)
+
+    results = {}
+    stats_url = urls["gemini"]
+    conversations: List[Tuple[str, Conversation]] = []
+    if args.mode in ("runner", "both"):
+        conversations.append(("runner", runner_conversation))
+
+    async with app.router.lifespan_context(app):
+        session_store.use_redis = False
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=300) as client:
+            if args.mode in ("chat", "both"):
+                conversations.append(("chat", chat_conversation(client)))
+            for mode, conversation in conversations:
+                for name in args.scenarios:
+                    if args.warmup:
+                        await bench_scenario(name, conversation, stats_url, args.warmup, 1)
+                    results[f"{mode}/{name}"] = await bench_scenario(name, conversation, stats_url, args.iterations, args.concurrency)
+                    print(f"  {mode}/{name}: p95 {results[f'{mode}/{name}']['p95_ms']:.0f} ms", file=sys.stderr)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Hermetic end-to-end benchmark of the agent pipeline")
+    parser.add_argument("--mode", choices=["runner", "chat", "both"], default="both",
+                        help="Drive root_agent through the InMemoryRunner, the /chat route, or both")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=8, help="Conversations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations in flight at once")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured conversations per scenario first")
+    parser.add_argument("--gemini-latency", type=_latency_arg, default=(600, 0.4), metavar="MEDIAN_MS,SIGMA")
+    parser.add_argument("--spotify-latency", type=_latency_arg, default=(60, 0.3), metavar="MEDIAN_MS,SIGMA")
+    parser.add_argument("--ticketmaster-latency", type=_latency_arg, default=(120, 0.5), metavar="MEDIAN_MS,SIGMA")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply every stub latency (e.g. 0.1 for a quick run)")
+    parser.add_argument("--events-per-search", type=int, default=12, help="Events the Ticketmaster stub returns per artist or search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--caches", action="store_true", help="Keep the LLM and concert search caches on")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--latency-tolerance", type=float, default=0.2, help="Allowed p50/p95/p99 increase (fraction)")
+    parser.add_argument("--throughput-tolerance", type=float, default=0.2, help="Allowed throughput decrease (fraction)")
+    parser.add_argument("--calls-tolerance", type=float, default=0.1, help="Allowed increase in outbound calls per turn (fraction)")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    process, urls = start_stubs(args)
+    try:
+        configure_environment(urls, args.caches)
+        results = asyncio.run(run(args, urls))
+    finally:
+        process.kill()
+        process.join()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    errors = sum(result["errors"] for result in results.values())
+    if errors:
+        print(f"\n{errors} turns did not return the expected response")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 1 if errors else 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 1 if errors else 0
+
+    with open(args.baseline) as f:
+        regressions = find_regressions(results, json.load(f), args)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against the baseline")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Replay recorded conversations offline from cassettes and compare the
+pipeline's latency with the recording.
+
+Record with CASSETTE_MODE=record (the API, job worker or pipeline_latency.py),
+then:
+
+    python benchmarks/replay_cassette.py "cassettes/*.jsonl.gz"
+    python benchmarks/replay_cassette.py "cassettes/*.jsonl.gz" --time-scale 0 --concurrency 16
+    python benchmarks/replay_cassette.py "cassettes/*.jsonl.gz" --pace
+
+Every Gemini, Spotify and Ticketmaster exchange is answered from the cassette
+after its recorded duration times --time-scale. Exits with status 1 when an
+exchange is missing from the cassette (the pipeline asked for something it
+did not ask for when recording), or, at --time-scale 1, when the replayed
+p95 exceeds the recorded p95 by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {
+        f"p{int(q * 100)}_ms": round(ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000, 1)
+        for q in (0.50, 0.95, 0.99)
+    }
+
+
+async def replay(args) -> Tuple[List[float], List[float], int, dict]:
+    import session_store
+    from concert_scout_agent import cassette
+    from concert_scout_agent.http_client import close_http_client
+    from pipeline import get_or_create_session, run_prompt
+
+    session_store.use_redis = False
+    conversations: Dict[str, List[Tuple[dict, str]]] = defaultdict(list)
+    for entry, message in cassette.cassette.entries("turn"):
+        conversations[entry["key"]].append((entry, message))
+    if not conversations:
+        raise SystemExit(f"No recorded turns in {args.cassette}")
+    first_turn = min(turns[0][0]["at"] for turns in conversations.values())
+
+    recorded: List[float] = []
+    replayed: List[float] = []
+    failures = 0
+    slots = asyncio.Semaphore(args.concurrency)
+    started = time.monotonic()
+
+    async def play(turns: List[Tuple[dict, str]]):
+        nonlocal failures
+        if args.pace:
+            # Start the conversation as long after the first as it was recorded (scaled)
+            await asyncio.sleep(max((turns[0][0]["at"] - first_turn) * args.time_scale - (time.monotonic() - started), 0))
+        async with slots:
+            user_id = turns[0][0].get("user_id", "replay")
+            session = await get_or_create_session(None, user_id)
+            for entry, message in turns:
+                start = time.perf_counter()
+                try:
+                    session, _ = await run_prompt(session, message, user_id)
+                except Exception as e:
+                    failures += 1
+                    logging.warning(f"Replaying turn {message[:60]!r} failed: {e!r}")
+                    return
+                replayed.append(time.perf_counter() - start)
+                recorded.append(entry["duration"])
+
+    try:
+        await asyncio.gather(*(play(turns) for turns in conversations.values()))
+    finally:
+        await close_http_client()
+    return recorded, replayed, failures, cassette.cassette.stats()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded conversations from cassettes")
+    parser.add_argument("cassette", help="Cassette file or glob (quote it)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiply recorded durations; 0 replays as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=8, help="Conversations replayed at once")
+    parser.add_argument("--pace", action="store_true", help="Start conversations at their recorded (scaled) offsets")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 increase over the recording at --time-scale 1")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Read at import by the agent modules
+    os.environ.update({
+        "CASSETTE_MODE": "replay",
+        "CASSETTE_PATH": args.cassette,
+        "CASSETTE_TIME_SCALE": str(args.time_scale),
+        # Nothing leaves the process: sessions, caches and rate limits stay in memory
+        "REDIS_URL": "",
+    })
+    # The clients are built but never called
+    for name in ("GOOGLE_API_KEY", "SPOTIFY_CLIENT", "SPOTIFY_SECRET", "TM_KEY"):
+        os.environ.setdefault(name, "replay")
+    logging.basicConfig(level=logging.WARNING)
+
+    recorded, replayed, failures, stats = asyncio.run(replay(args))
+    results = {
+        "turns": len(replayed),
+        "failed_turns": failures,
+        "cassette": stats,
+        "recorded": _percentiles(recorded),
+        "replayed": _percentiles(replayed),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if stats["misses"] or failures:
+        print(f"\n{stats['misses']} exchanges were not in the cassette, {failures} turns failed")
+        return 1
+    if args.time_scale == 1.0 and replayed:
+        limit = results["recorded"]["p95_ms"] * (1 + args.tolerance)
+        if results["replayed"]["p95_ms"] > limit:
+            print(f"\nReplayed p95 {results['replayed']['p95_ms']} ms is above the recorded {results['recorded']['p95_ms']} ms")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
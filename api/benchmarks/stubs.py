@@ -0,0 +1,357 @@
+"""
+Local stand-ins for the Gemini, Spotify and Ticketmaster APIs used by
+pipeline_latency.py.
+
+Each stub answers after a log-normal delay with canned payloads shaped like
+the real APIs. The Gemini stub plays every agent's part for the scripted
+SCENARIOS: it finds the agent from its system instruction and the turn from
+the latest user message it recognises, then returns the tool call or text
+that agent would produce.
+"""
+
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+CITIES = {
+    "Los Angeles": ["34.0522", "-118.2437"],
+    "New York": ["40.7128", "-74.0060"],
+    "Chicago": ["41.8781", "-87.6298"],
+    "Seattle": ["47.6062", "-122.3321"],
+    "Austin": ["30.2672", "-97.7431"],
+}
+
+PLAYLIST_ARTISTS = [
+    ("Phoebe Bridgers", ["indie folk", "indie pop"]),
+    ("boygenius", ["indie rock"]),
+    ("Big Thief", ["indie folk", "art pop"]),
+    ("Mitski", ["art pop", "indie rock"]),
+    ("Japanese Breakfast", ["indie pop"]),
+    ("Snail Mail", ["indie rock"]),
+    ("Soccer Mommy", ["bedroom pop"]),
+    ("Lucy Dacus", ["indie folk"]),
+]
+
+RELATED_ARTISTS = ["Olivia Rodrigo", "Sabrina Carpenter", "Gracie Abrams", "Conan Gray", "Maggie Rogers"]
+
+# Conversations the benchmark runs. Every turn carries what the agents would
+# extract from the conversation so far; a turn with a `reply` is answered by the
+# root agent without running the pipeline.
+SCENARIOS: Dict[str, List[dict]] = {
+    "artist": [
+        {"prompt": "Find Taylor Swift concerts in Los Angeles", "location": "Los Angeles",
+         "artists": ["Taylor Swift"], "ticketmaster_genre": "Pop"},
+    ],
+    "genre": [
+        {"prompt": "Any jazz concerts in New York?", "location": "New York",
+         "genre": "jazz", "ticketmaster_genre": "Jazz"},
+    ],
+    "playlist": [
+        {"prompt": "Concerts near Chicago for https://open.spotify.com/playlist/37i9dQZF1DX9wCBDkixAu6",
+         "location": "Chicago", "playlist_id": "37i9dQZF1DX9wCBDkixAu6", "ticketmaster_genre": "Alternative"},
+    ],
+    "date": [
+        {"prompt": "Rock concerts in Seattle in July", "location": "Seattle", "genre": "rock",
+         "ticketmaster_genre": "Rock", "date": "July",
+         "date_range": ["2025-07-01T00:00:00", "2025-07-31T23:59:59"]},
+    ],
+    "multi_turn": [
+        {"prompt": "I want to see Billie Eilish",
+         "reply": "Billie Eilish concerts sound great! Could you please provide the city or area where you'd like to find her concerts?"},
+        {"prompt": "Austin please", "location": "Austin", "artists": ["Billie Eilish"], "ticketmaster_genre": "Alternative"},
+    ],
+}
+
+TURNS = {turn["prompt"]: turn for turns in SCENARIOS.values() for turn in turns}
+
+AGENT_NAME = re.compile(r'Your internal name is "([^"]+)"')
+
+calls: Counter = Counter()
+
+
+class Latency:
+    """Log-normal delay with the given median (ms) and spread; sigma 0 gives a constant delay."""
+
+    def __init__(self, median_ms: float, sigma: float, rng: random.Random, scale: float = 1.0):
+        self.median = median_ms / 1000 * scale
+        self.sigma = sigma
+        self.rng = rng
+
+    def sample(self) -> float:
+        return self.median * math.exp(self.sigma * self.rng.gauss(0, 1))
+
+
+def _id(*parts: str) -> str:
+    return hashlib.sha1("|".join(parts).lower().encode("utf-8")).hexdigest()[:12]
+
+
+# Gemini
+
+def _find_turn(contents: List[dict]) -> Optional[dict]:
+    for content in reversed(contents):
+        if content.get("role") != "user":
+            continue
+        for part in content.get("parts", []):
+            turn = TURNS.get((part.get("text") or "").strip())
+            if turn:
+                return turn
+    return None
+
+
+def _concert(category: str, i: int) -> dict:
+    return {
+        "name": f"{category.title()} Night {i + 1}",
+        "venue_name": f"Venue {i + 1}",
+        "city_name": "Benchmark City",
+        "date": f"2025-07-{10 + i:02d}",
+        "time": "20:00:00",
+        "url": f"https://www.ticketmaster.com/event/{_id(category, str(i))}",
+        "image_url": f"https://s1.ticketm.net/dam/a/{_id(category, str(i), 'image')}/RETINA_LANDSCAPE_16_9.jpg",
+        "genre": "Pop",
+        "description": "A high-energy set from an artist whose songwriting and live arrangements line up closely with what you "
+                       "already listen to, in a room that suits the sound.",
+    }
+
+
+@lru_cache(maxsize=1)
+def _recommendations() -> str:
+    return json.dumps({
+        "concerts_for_top_artists": [_concert("artist", i) for i in range(5)],
+        "concerts_for_top_genre": [_concert("genre", i) for i in range(5)],
+        "concerts_for_related_artists": [_concert("related", i) for i in range(5)],
+    })
+
+
+def _agent_part(agent: str, turn: Optional[dict], after_tool: bool) -> dict:
+    """The part the agent would answer with for this turn."""
+    if turn is None:
+        return {"text": "The benchmark stub only knows the scripted scenarios."}
+    if agent == "concert_scout_agent":
+        if "reply" in turn:
+            return {"text": turn["reply"]}
+        return {"functionCall": {"name": "transfer_to_agent", "args": {"agent_name": "ConcertScoutPipeline"}}}
+    if agent == "spotify_agent":
+        if after_tool:
+            return {"text": json.dumps({"status": "success", "location": turn["location"]})}
+        args = {"location": turn["location"]}
+        for key in ("artists", "genre", "playlist_id", "date"):
+            if key in turn:
+                args[key] = turn[key]
+        return {"functionCall": {"name": "data_retrieval_tool", "args": args}}
+    if agent == "related_artists_agent":
+        return {"text": json.dumps(RELATED_ARTISTS)}
+    if agent == "ticketmaster_agent":
+        if after_tool:
+            return {"text": json.dumps({"status": "success", "error_message": ""})}
+        artists = turn.get("artists") or [name for name, _ in PLAYLIST_ARTISTS[:5]]
+        args = {
+            "artists": artists,
+            "latlong": CITIES[turn["location"]],
+            "related_artists": RELATED_ARTISTS,
+            "ticketmaster_genre": turn["ticketmaster_genre"],
+        }
+        if "date_range" in turn:
+            args["date"] = turn["date_range"]
+        return {"functionCall": {"name": "ticketmaster_api", "args": args}}
+    if agent == "final_recommender_agent":
+        return {"text": _recommendations()}
+    return {"text": "OK"}
+
+
+def gemini_app(latency: Latency) -> Starlette:
+    async def generate_content(request: Request):
+        raw = await request.body()
+        body = json.loads(raw)
+        instruction = " ".join(part.get("text", "") for part in (body.get("systemInstruction") or {}).get("parts", []))
+        match = AGENT_NAME.search(instruction)
+        agent = match.group(1) if match else "unknown"
+        contents = body.get("contents", [])
+        after_tool = bool(contents) and any("functionResponse" in part for part in contents[-1].get("parts", []))
+        part = _agent_part(agent, _find_turn(contents), after_tool)
+        calls[f"gemini:{agent}"] += 1
+
+        await asyncio.sleep(latency.sample())
+        prompt_tokens = len(raw) // 4
+        completion_tokens = len(json.dumps(part)) // 4
+        return JSONResponse({
+            "candidates": [{"content": {"role": "model", "parts": [part]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": completion_tokens,
+                "totalTokenCount": prompt_tokens + completion_tokens,
+            },
+            "modelVersion": request.path_params["model"],
+        })
+
+    return Starlette(routes=[
+        Route("/{version}/models/{model}:generateContent", generate_content, methods=["POST"]),
+        Route("/_stats", stats),
+    ])
+
+
+# Spotify
+
+def spotify_app(latency: Latency) -> Starlette:
+    async def token(request: Request):
+        calls["spotify:token"] += 1
+        await asyncio.sleep(latency.sample())
+        return JSONResponse({"access_token": "benchmark", "token_type": "Bearer", "expires_in": 3600})
+
+    async def playlist_tracks(request: Request):
+        calls["spotify:playlist_tracks"] += 1
+        await asyncio.sleep(latency.sample())
+        items = []
+        for i in range(60):
+            # Earlier artists appear on more tracks
+            name, _ = PLAYLIST_ARTISTS[min(int(i ** 0.5), len(PLAYLIST_ARTISTS) - 1)]
+            items.append({"track": {
+                "id": _id("track", str(i)),
+                "name": f"Track {i + 1}",
+                "artists": [{"id": _id("artist", name), "name": name}],
+                "duration_ms": 200000 + i * 1000,
+            }})
+        return JSONResponse({"items": items, "next": None, "total": len(items)})
+
+    async def artists(request: Request):
+        calls["spotify:artists"] += 1
+        await asyncio.sleep(latency.sample())
+        by_id = {_id("artist", name): (name, genres) for name, genres in PLAYLIST_ARTISTS}
+        ids = request.query_params.get("ids", "").split(",")
+        return JSONResponse({"artists": [
+            {"id": artist_id, "name": by_id[artist_id][0], "genres": by_id[artist_id][1]} if artist_id in by_id else None
+            for artist_id in ids
+        ]})
+
+    return Starlette(routes=[
+        Route("/api/token", token, methods=["POST"]),
+        Route("/v1/playlists/{playlist_id}/tracks", playlist_tracks),
+        Route("/v1/artists", artists),
+        Route("/_stats", stats),
+    ])
+
+
+# Ticketmaster
+
+def _event(key: str, i: int, attraction_id: Optional[str] = None) -> dict:
+    event_id = _id(key, str(i))
+    attraction_id = attraction_id or _id("attraction", key, str(i))
+    return {
+        "name": f"Live {key.title()} {i + 1}",
+        "type": "event",
+        "id": event_id,
+        "url": f"https://www.ticketmaster.com/event/{event_id}",
+        "locale": "en-us",
+        "images": [
+            {"ratio": ratio, "url": f"https://s1.ticketm.net/dam/a/{event_id}/{ratio}_{width}.jpg", "width": width, "height": width * 9 // 16, "fallback": False}
+            for ratio, width in (("3_2", 640), ("4_3", 305), ("16_9", 640), ("16_9", 1024), ("16_9", 2048), ("3_2", 1024))
+        ],
+        "dates": {
+            "start": {"localDate": f"2025-07-{1 + i % 28:02d}", "localTime": "19:30:00", "dateTime": f"2025-07-{1 + i % 28:02d}T02:30:00Z"},
+            "timezone": "America/Los_Angeles",
+            "status": {"code": "onsale"},
+        },
+        "classifications": [{"primary": True, "segment": {"name": "Music"}, "genre": {"name": "Pop"}, "subGenre": {"name": "Pop"}}],
+        "pleaseNote": "Mobile tickets only. Doors open one hour before the show. " * 3,
+        "priceRanges": [{"type": "standard", "currency": "USD", "min": 49.5, "max": 250.0}],
+        "_embedded": {
+            "venues": [{
+                "name": f"Venue {i % 7 + 1}",
+                "id": _id("venue", str(i % 7)),
+                "city": {"name": "Benchmark City"},
+                "state": {"name": "California", "stateCode": "CA"},
+                "address": {"line1": f"{100 + i} Main St"},
+                "location": {"longitude": "-118.2437", "latitude": "34.0522"},
+            }],
+            "attractions": [{"name": key.title(), "id": attraction_id, "type": "attraction"}],
+        },
+    }
+
+
+@lru_cache(maxsize=4096)
+def _events(key: str, count: int, attraction_id: Optional[str] = None) -> tuple:
+    return tuple(_event(key, i, attraction_id) for i in range(count))
+
+
+def ticketmaster_app(latency: Latency, events_per_search: int) -> Starlette:
+    def rate_limit_headers() -> dict:
+        return {
+            "Rate-Limit": "5000",
+            "Rate-Limit-Available": "4999",
+            "Rate-Limit-Reset": str(int((time.time() + 86400) * 1000)),
+        }
+
+    async def attractions(request: Request):
+        calls["ticketmaster:attractions"] += 1
+        await asyncio.sleep(latency.sample())
+        keyword = request.query_params.get("keyword", "")
+        attraction = {
+            "name": keyword,
+            "id": _id("attraction", keyword),
+            "type": "attraction",
+            "classifications": [{"primary": True, "segment": {"name": "Music"}, "genre": {"name": "Pop"}}],
+        }
+        return JSONResponse({"_embedded": {"attractions": [attraction]}, "page": {"size": 20, "totalElements": 1}},
+                            headers=rate_limit_headers())
+
+    async def events(request: Request):
+        calls["ticketmaster:events"] += 1
+        await asyncio.sleep(latency.sample())
+        size = int(request.query_params.get("size", "20"))
+        attraction_ids = request.query_params.get("attractionId")
+        if attraction_ids:
+            found = [event for attraction_id in attraction_ids.split(",")
+                     for event in _events(attraction_id, events_per_search, attraction_id)]
+        else:
+            key = request.query_params.get("keyword") or request.query_params.get("classificationName", "")
+            found = list(_events(key, events_per_search))
+        found = found[:size]
+        return JSONResponse({"_embedded": {"events": found}, "page": {"size": size, "totalElements": len(found)}},
+                            headers=rate_limit_headers())
+
+    return Starlette(routes=[
+        Route("/discovery/v2/attractions", attractions),
+        Route("/discovery/v2/attractions.json", attractions),
+        Route("/discovery/v2/events", events),
+        Route("/discovery/v2/events.json", events),
+        Route("/_stats", stats),
+    ])
+
+
+async def stats(request: Request):
+    """Calls received by every stub since it started."""
+    return Response(json.dumps(dict(calls)), media_type="application/json")
+
+
+def serve(ports: Dict[str, int], latencies: Dict[str, tuple], scale: float = 1.0, seed: int = 0, events_per_search: int = 12):
+    """Run the three stubs on 127.0.0.1 until the process is stopped.
+
+    `latencies` maps gemini, spotify and ticketmaster to (median ms, sigma).
+    """
+    rng = random.Random(seed)
+    apps = {
+        "gemini": gemini_app(Latency(*latencies["gemini"], rng, scale)),
+        "spotify": spotify_app(Latency(*latencies["spotify"], rng, scale)),
+        "ticketmaster": ticketmaster_app(Latency(*latencies["ticketmaster"], rng, scale), events_per_search),
+    }
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=ports[name], log_level="warning", access_log=False))
+        for name, app in apps.items()
+    ]
+
+    async def run():
+        await asyncio.gather(*(server.serve() for server in servers))
+
+    asyncio.run(run())
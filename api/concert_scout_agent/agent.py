@@ -5,6 +5,10 @@ from google.adk.models import LlmResponse, LlmRequest
 from typing import Optional
 from google.genai import types 
 from datetime import datetime
+from .history import window_history, record_prompt_tokens
+from .llm_cache import lookup_llm_cache, store_llm_cache
+from .usage import record_token_usage
+from .cassette import replay_llm_cassette, record_llm_cassette
 
 def add_current_date(callback_context: CallbackContext, llm_request: LlmRequest) -> None:
     """Add the current date to the session state."""
@@ -69,5 +73,6 @@ Example Scenarios and Responses:
     """,
     sub_agents=[sequential_agent],
     output_key="concert_scout_agent_output",
-    before_model_callback=[add_current_date]
+    before_model_callback=[window_history, add_current_date, replay_llm_cassette, lookup_llm_cache],
+    after_model_callback=[record_prompt_tokens, record_token_usage, record_llm_cassette, store_llm_cache]
 )
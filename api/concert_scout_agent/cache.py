@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+# Shared caches only use Redis when it is configured explicitly
+REDIS_URL = os.getenv("REDIS_URL")
+
+# After a Redis error the Redis tier is skipped for this long
+REDIS_RETRY_AFTER = 30.0
+
+_redis_client: Optional[aioredis.Redis] = None
+_redis_down_until = 0.0
+
+
+def get_cache_redis() -> Optional[aioredis.Redis]:
+    """Redis client for the shared cache tier, or None if Redis is not configured or failing."""
+    global _redis_client
+    if not REDIS_URL or time.monotonic() < _redis_down_until:
+        return None
+    if _redis_client is None:
+        _redis_client = aioredis.from_url(
+            REDIS_URL,
+            encoding="utf-8",
+            decode_responses=True,
+            max_connections=20,
+            socket_timeout=1.0
+        )
+    return _redis_client
+
+
+def _mark_redis_down(e: Exception):
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+    logger.warning(f"Cache Redis tier unavailable for {REDIS_RETRY_AFTER:.0f}s: {e}")
+
+
+async def close_cache_redis():
+    """Close the shared cache Redis connection pool."""
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.close()
+        _redis_client = None
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL. All operations are O(1)."""
+
+    def __init__(self, max_items: int = 1024):
+        self.max_items = max_items
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TieredCache:
+    """String cache checked in-process first, then in Redis (shared by all workers).
+
+    Redis hits are copied into the local tier. Redis errors never fail a
+    lookup; the Redis tier is just skipped for a while.
+    """
+
+    def __init__(self, namespace: str, max_items: int = 1024, local_ttl: float = 300.0):
+        self.namespace = namespace
+        self.local = LRUCache(max_items)
+        self.local_ttl = local_ttl
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        redis = get_cache_redis()
+        if redis is not None:
+            try:
+                pipe = redis.pipeline(transaction=False)
+                pipe.get(self._key(key))
+                pipe.pttl(self._key(key))
+                value, ttl_ms = await pipe.execute()
+            except Exception as e:
+                _mark_redis_down(e)
+                value = None
+            if value is not None:
+                self.redis_hits += 1
+                if ttl_ms and ttl_ms > 0:
+                    self.local.set(key, value, min(self.local_ttl, ttl_ms / 1000))
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl: float):
+        self.local.set(key, value, min(self.local_ttl, ttl))
+        redis = get_cache_redis()
+        if redis is not None:
+            try:
+                await redis.set(self._key(key), value, px=int(ttl * 1000))
+            except Exception as e:
+                _mark_redis_down(e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.redis_hits) / lookups, 3) if lookups else 0.0,
+            "local_entries": len(self.local),
+        }
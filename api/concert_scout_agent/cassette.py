@@ -0,0 +1,254 @@
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import asyncio
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("record", "replay")
+# "record" writes every model and upstream HTTP exchange to the cassette,
+# "replay" answers them from it without touching the network
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "").lower()
+# {pid} keeps the workers' recordings apart; replay reads every file matching the glob
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes/{pid}.jsonl.gz")
+# Replayed exchanges take their recorded duration times this; 0 answers at once
+CASSETTE_TIME_SCALE = float(os.getenv("CASSETTE_TIME_SCALE", "1.0"))
+
+# Credentials are never written to a cassette
+REDACTED_PARAMS = {"apikey", "api_key", "key", "client_secret"}
+REDACTED_FIELDS = {"access_token", "refresh_token"}
+# Response headers the clients read (the content type and Ticketmaster's quota)
+KEPT_HEADERS = {"content-type", "rate-limit", "rate-limit-available", "rate-limit-reset", "retry-after"}
+
+CASSETTE_STATE_KEY = "temp:cassette_llm"
+
+# The date the callbacks add to the instructions would make every day's requests differ
+_CURRENT_DATE = re.compile(r"The current date is \d{4}-\d{2}-\d{2}")
+
+
+class CassetteMiss(Exception):
+    """Raised while replaying for an exchange the cassette does not hold."""
+
+
+class Cassette:
+    """Gzipped JSON-lines log of model and HTTP exchanges.
+
+    Each distinct body is written once and referenced by its hash, so the
+    payloads a busy service repeats take no extra space. Replay hands out the
+    exchanges recorded under a key in order, repeating the last one.
+    """
+
+    def __init__(self, path: str, mode: str, time_scale: float = CASSETTE_TIME_SCALE):
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._written = set()
+        self._entries: Dict[str, Deque[dict]] = defaultdict(deque)
+        self._bodies: Dict[str, str] = {}
+        if mode == "replay":
+            files = sorted(glob.glob(path))
+            for name in files:
+                self._load(name)
+            logger.info(f"Replaying {sum(len(queue) for queue in self._entries.values())} exchanges from {len(files)} cassette files")
+
+    def _load(self, name: str):
+        try:
+            with gzip.open(name, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry["type"] == "body":
+                        self._bodies[entry["sha"]] = entry["data"]
+                    else:
+                        self._entries[f"{entry['type']}:{entry['key']}"].append(entry)
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+            # A recording cut short by a crash keeps everything before the damage
+            logger.warning(f"Cassette {name} is truncated: {e}")
+
+    def record(self, kind: str, key: str, body: str, duration: float, **fields):
+        sha = hashlib.sha1(body.encode("utf-8")).hexdigest()
+        entry = {
+            "type": kind, "key": key, "body": sha,
+            "at": round(time.time() - duration, 3), "duration": round(duration, 4), **fields
+        }
+        with self._lock:
+            if self._file is None:
+                # Opened on first use so forked workers each get their own file
+                path = self.path.format(pid=os.getpid())
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._file = gzip.open(path, "at", encoding="utf-8")
+                logger.info(f"Recording exchanges to {path}")
+            if sha not in self._written:
+                self._written.add(sha)
+                self._file.write(json.dumps({"type": "body", "sha": sha, "data": body}) + "\n")
+            self._file.write(json.dumps(entry) + "\n")
+            # Keep the file readable up to here if the process dies
+            self._file.flush()
+            self.recorded += 1
+
+    def take(self, kind: str, key: str) -> Tuple[dict, str]:
+        """The next recorded exchange and body for a key."""
+        with self._lock:
+            queue = self._entries.get(f"{kind}:{key}")
+            if not queue:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded {kind} exchange for {key}")
+            entry = queue.popleft() if len(queue) > 1 else queue[0]
+            self.replayed += 1
+        return entry, self._bodies[entry["body"]]
+
+    def has(self, kind: str, key: str) -> bool:
+        return bool(self._entries.get(f"{kind}:{key}"))
+
+    def entries(self, kind: str) -> List[Tuple[dict, str]]:
+        """Every recorded exchange of one kind with its body, oldest first."""
+        with self._lock:
+            found = [entry for key, queue in self._entries.items() if key.startswith(f"{kind}:") for entry in queue]
+        return [(entry, self._bodies[entry["body"]]) for entry in sorted(found, key=lambda entry: entry["at"])]
+
+    def delay(self, entry: dict) -> float:
+        return entry["duration"] * self.time_scale
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "recorded": self.recorded, "replayed": self.replayed, "misses": self.misses}
+
+
+cassette: Optional[Cassette] = Cassette(CASSETTE_PATH, CASSETTE_MODE) if CASSETTE_MODE in CASSETTE_MODES else None
+
+
+def recording() -> bool:
+    return cassette is not None and cassette.mode == "record"
+
+
+def replaying() -> bool:
+    return cassette is not None and cassette.mode == "replay"
+
+
+def close_cassette():
+    """Flush and close the file being recorded."""
+    if cassette is not None:
+        cassette.close()
+
+
+# HTTP
+
+def _http_key(method: str, url: str) -> str:
+    # The host is left out so a cassette replays whatever base URLs are configured
+    parts = urlsplit(url)
+    query = [(k, "REDACTED" if k.lower() in REDACTED_PARAMS else v) for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    return f"{method.upper()} {urlunsplit(('', '', parts.path, urlencode(query), ''))}"
+
+
+def _redact_body(body: str) -> str:
+    if not any(field in body for field in REDACTED_FIELDS):
+        return body
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if isinstance(data, dict):
+        data = {k: "REDACTED" if k in REDACTED_FIELDS else v for k, v in data.items()}
+    return json.dumps(data)
+
+
+def record_http(method: str, url: str, status: int, headers, body: str, duration: float):
+    cassette.record(
+        "http", _http_key(method, url), _redact_body(body), duration,
+        status=status, headers={k.lower(): v for k, v in headers.items() if k.lower() in KEPT_HEADERS}
+    )
+
+
+def has_http(method: str, url: str) -> bool:
+    return cassette.has("http", _http_key(method, url))
+
+
+async def replay_http(method: str, url: str) -> httpx.Response:
+    """The recorded response for an httpx request, after its recorded (scaled) duration."""
+    entry, body = cassette.take("http", _http_key(method, url))
+    await asyncio.sleep(cassette.delay(entry))
+    return httpx.Response(entry["status"], headers=entry["headers"], content=body.encode("utf-8"), request=httpx.Request(method, url))
+
+
+def replay_requests(method: str, url: str) -> requests.Response:
+    """The recorded response for a requests call, blocking for its recorded (scaled) duration like the real call."""
+    entry, body = cassette.take("http", _http_key(method, url))
+    time.sleep(cassette.delay(entry))
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response._content = body.encode("utf-8")
+    response.encoding = "utf-8"
+    response.url = url
+    return response
+
+
+def record_turn(session_id: str, user_id: str, message: str, duration: float):
+    """Note a user message and how long the pipeline took to answer it, so the conversation can be replayed."""
+    cassette.record("turn", session_id, message, duration, user_id=user_id)
+
+
+# Model calls
+
+def _llm_key(callback_context: CallbackContext, llm_request: LlmRequest) -> str:
+    from .llm_cache import llm_request_key
+
+    request = llm_request
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    if isinstance(instruction, str) and _CURRENT_DATE.search(instruction):
+        request = llm_request.model_copy(deep=True)
+        request.config.system_instruction = _CURRENT_DATE.sub("The current date is <date>", instruction)
+    return f"{callback_context.agent_name}:{llm_request_key(request)}"
+
+
+async def replay_llm_cassette(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """Answer a model call from the cassette when replaying; when recording, note the request for record_llm_cassette.
+
+    Goes after the callbacks that change the request, before lookup_llm_cache.
+    """
+    if cassette is None:
+        return None
+    key = _llm_key(callback_context, llm_request)
+    if cassette.mode == "record":
+        callback_context.state[CASSETTE_STATE_KEY] = {"key": key, "start": time.time()}
+        return None
+    entry, body = cassette.take("llm", key)
+    await asyncio.sleep(cassette.delay(entry))
+    return LlmResponse.model_validate_json(body)
+
+
+async def record_llm_cassette(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    """Write a complete model response to the cassette being recorded."""
+    pending = callback_context.state.get(CASSETTE_STATE_KEY)
+    if not pending or not recording() or llm_response.partial:
+        return None
+    cassette.record(
+        "llm", pending["key"], llm_response.model_dump_json(exclude_none=True),
+        time.time() - pending["start"], agent=callback_context.agent_name
+    )
+    callback_context.state[CASSETTE_STATE_KEY] = None
+    return None
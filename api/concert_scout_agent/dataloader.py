@@ -0,0 +1,88 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every loader by name, for the metrics endpoint
+loaders: Dict[str, "DataLoader"] = {}
+
+
+class DataLoader:
+    """Collects keys requested by all in-flight requests during a short window and loads them in one batch.
+
+    Keys that are already pending or being loaded are shared, so concurrent
+    callers asking for the same key get the same result from one load. The
+    batch function receives the unique keys of a window and returns a dict
+    mapping each key to its value (missing keys resolve to None).
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+                 window: float = 0.02, max_batch: int = 50, name: str = "dataloader"):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.name = name
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._flush_handle = None
+        # Counters to compare requested keys with outbound batches
+        self.requested = 0
+        self.deduplicated = 0
+        self.batches = 0
+        loaders[name] = self
+
+    async def load(self, key: Hashable) -> Any:
+        self.requested += 1
+        future = self._pending.get(key) or self._inflight.get(key)
+        if future is not None:
+            self.deduplicated += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[key] = future
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch = self._pending
+        self._pending = {}
+        self._inflight.update(batch)
+        self.batches += 1
+        asyncio.get_running_loop().create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: Dict[Hashable, asyncio.Future]):
+        try:
+            results = await self.batch_fn(list(batch))
+        except Exception as e:
+            logger.warning(f"{self.name} batch of {len(batch)} keys failed: {e}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for key, future in batch.items():
+                if not future.done():
+                    future.set_result(results.get(key))
+        finally:
+            for key, future in batch.items():
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "requested": self.requested,
+            "deduplicated": self.deduplicated,
+            "batches": self.batches,
+        }
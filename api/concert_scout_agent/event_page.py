@@ -0,0 +1,103 @@
+from typing import List, Optional
+import json
+import logging
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+# How Ticketmaster event pages are decoded: "fast" parses the page with orjson
+# (json without it) and keeps the needed fields; "stream" walks the buffered
+# body's events array one event at a time with ijson, so the full object tree
+# of the page is never built (the raw body is still held in memory)
+TM_EVENT_DECODER = os.getenv("TM_EVENT_DECODER", "fast").lower()
+
+if TM_EVENT_DECODER == "stream" and ijson is None:
+    logger.warning("TM_EVENT_DECODER=stream needs ijson; decoding Ticketmaster event pages whole")
+    TM_EVENT_DECODER = "fast"
+
+EVENTS_PREFIX = "_embedded.events.item"
+CLASSIFICATION_LEVELS = ("segment", "genre", "subGenre")
+
+
+def select_image(images: List[dict]) -> Optional[dict]:
+    """The first 16_9 image at least 1024 wide, else the first image."""
+    for image in images:
+        if image.get('ratio') == '16_9' and image.get('width', 0) >= 1024:
+            return image
+    return images[0] if images else None
+
+
+def _project_venue(venue: dict) -> dict:
+    # Keys Ticketmaster left out stay out, so _extract_event_info falls back to its defaults
+    projected = {}
+    for key in ("name", "location"):
+        if venue.get(key) is not None:
+            projected[key] = venue[key]
+    city = (venue.get("city") or {}).get("name")
+    if city is not None:
+        projected["city"] = {"name": city}
+    return projected
+
+
+def project_event(event: dict) -> dict:
+    """The parts of a Discovery API event the agent tools and the event store read, in the same shape.
+
+    Keeps the name, id, url, start date and time, the selected image, the
+    classification names, and each venue's name, city and location and each
+    attraction's id. Drops the rest (sales, prices, notes, links, the
+    attractions' images and links), about 95% of a typical page. Null or
+    missing parts are left out rather than projected as None.
+    """
+    start = (event.get("dates") or {}).get("start") or {}
+    embedded = event.get("_embedded") or {}
+    image = select_image(event.get("images") or [])
+    return {
+        "id": event.get("id"),
+        "name": event.get("name"),
+        "url": event.get("url"),
+        "dates": {"start": {key: start[key] for key in ("localDate", "localTime", "dateTime") if key in start}},
+        "images": [{"ratio": image.get("ratio"), "width": image.get("width"), "url": image.get("url")}] if image else [],
+        "classifications": [
+            {level: {"name": classification[level].get("name")} for level in CLASSIFICATION_LEVELS if classification.get(level)}
+            for classification in event.get("classifications") or [] if classification
+        ],
+        "_embedded": {
+            "venues": [_project_venue(venue) for venue in embedded.get("venues") or [] if venue],
+            "attractions": [{"id": attraction.get("id")} for attraction in embedded.get("attractions") or [] if attraction],
+        },
+    }
+
+
+def decode_event_page(body: bytes, with_page: bool = False) -> dict:
+    """A Discovery API events response with only the projected events, {"_embedded": {"events": [...]}}, or {} without events.
+
+    with_page also keeps the paging totals ("page"), which the stream decoder
+    reads in a second pass over the body.
+    """
+    page = None
+    if TM_EVENT_DECODER == "stream":
+        try:
+            events = [project_event(event) for event in ijson.items(body, EVENTS_PREFIX, use_float=True) if event]
+            if with_page:
+                page = next(ijson.items(body, "page"), None)
+        except ijson.JSONError as e:
+            # Raised like the json parsers' errors, so the resilience layer treats it as a failed call
+            raise ValueError(f"Invalid JSON in event page: {e}") from e
+    else:
+        response = orjson.loads(body) if orjson else json.loads(body)
+        events = [project_event(event) for event in (response.get("_embedded") or {}).get("events") or [] if event]
+        page = response.get("page") if with_page else None
+    decoded = {"_embedded": {"events": events}} if events else {}
+    if page is not None:
+        decoded["page"] = page
+    return decoded
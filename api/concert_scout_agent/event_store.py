@@ -0,0 +1,425 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import get_cache_redis
+
+logger = logging.getLogger(__name__)
+
+# SQLite file of Ticketmaster music events for the active regions, filled by
+# ingest_events.py; empty turns the store off and every search goes to Ticketmaster
+EVENT_STORE_PATH = os.getenv("EVENT_STORE_PATH", "")
+# Regions ingested longer ago than this are not answered from the store
+EVENT_STORE_MAX_AGE = float(os.getenv("EVENT_STORE_MAX_AGE", "43200"))
+# The ingestion job refreshes regions ingested longer ago than this. A region
+# costs one call per INGEST_WINDOW_DAYS of EVENT_STORE_DAYS and page of 200
+# events, so the defaults (10 metros, 7 windows, ~2.4 refreshes a day) use
+# roughly 200-800 of Ticketmaster's default 5000 daily calls.
+EVENT_STORE_REFRESH = float(os.getenv("EVENT_STORE_REFRESH", "36000"))
+# Days ahead ingested for each region
+EVENT_STORE_DAYS = int(os.getenv("EVENT_STORE_DAYS", "90"))
+# Miles around a region's center that are ingested. A search is answered from
+# the store when its whole circle (100 miles) lies inside a fresh region.
+EVENT_STORE_REGION_RADIUS = float(os.getenv("EVENT_STORE_REGION_RADIUS", "125"))
+# Regions always ingested ("lat,lng;lat,lng"), besides the most searched metros
+EVENT_STORE_REGIONS = os.getenv("EVENT_STORE_REGIONS", "")
+EVENT_STORE_TOP_METROS = int(os.getenv("EVENT_STORE_TOP_METROS", "10"))
+# Ingestion stops once less than this fraction of the Ticketmaster quota is
+# left (Rate-Limit-Available), keeping the rest for live searches until it resets
+EVENT_STORE_QUOTA_RESERVE = float(os.getenv("EVENT_STORE_QUOTA_RESERVE", "0.5"))
+
+# Days per ingestion query; windows with more events than one query returns are halved
+INGEST_WINDOW_DAYS = 14
+# The Discovery API pages no deeper than this (size * page < 1000)
+TM_DEEP_PAGING_LIMIT = 1000
+# Seconds between the ingestion job's checks for regions to refresh
+INGEST_CHECK_INTERVAL = 60
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.0
+
+# Query parameters the store can answer; searches with any other (keyword) go to Ticketmaster
+STORE_QUERY_PARAMS = {"latlong", "radius", "unit", "segmentName", "size", "sort", "attractionId", "classificationName", "localStartEndDateTime"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    local_start TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    name TEXT NOT NULL,
+    venue_name TEXT,
+    city_name TEXT,
+    date TEXT,
+    time TEXT,
+    url TEXT,
+    image_url TEXT,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_local_start ON events (local_start);
+CREATE VIRTUAL TABLE IF NOT EXISTS event_geo USING rtree (id, min_lat, max_lat, min_lng, max_lng);
+CREATE TABLE IF NOT EXISTS event_attractions (
+    attraction_id TEXT NOT NULL,
+    local_start TEXT NOT NULL,
+    event INTEGER NOT NULL,
+    PRIMARY KEY (attraction_id, local_start, event)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS event_classifications (
+    name TEXT NOT NULL COLLATE NOCASE,
+    local_start TEXT NOT NULL,
+    event INTEGER NOT NULL,
+    PRIMARY KEY (name, local_start, event)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS regions (
+    name TEXT PRIMARY KEY,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    radius REAL NOT NULL,
+    end_local TEXT NOT NULL,
+    ingested_at REAL NOT NULL,
+    events INTEGER NOT NULL
+);
+"""
+
+EVENT_COLUMNS = ("venue_name", "city_name", "name", "date", "time", "url", "image_url")
+
+
+def distance_miles(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance (haversine)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _bounding_box(lat: float, lng: float, radius: float) -> Tuple[float, float, float, float]:
+    dlat = radius / MILES_PER_DEGREE
+    dlng = radius / (MILES_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def _miles(radius: str, unit: str) -> float:
+    return float(radius) * (0.621371 if unit == "km" else 1.0)
+
+
+class EventStore:
+    """Ticketmaster music events by location, date, attraction and classification, in SQLite.
+
+    Events sit in an R*Tree on their venue's coordinates, with indexes on the
+    local start time, attraction ids and classification names (segment, genre,
+    subgenre). Reads happen inline on the event loop (they take well under a
+    millisecond); the ingestion job writes a region at a time in one transaction,
+    which WAL mode lets readers in other processes work through.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.overflows = 0
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, reopened in forked workers
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            conn.create_function("distance_miles", 4, distance_miles, deterministic=True)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _covered(self, lat: float, lng: float, radius: float, end: Optional[str]) -> bool:
+        """Whether a fresh region holds every event a search around (lat, lng) up to `end` could return.
+
+        A search without an end date can return events past any region's
+        ingested days, so it is never covered.
+        """
+        if end is None:
+            return False
+        rows = self._connection().execute(
+            "SELECT lat, lng, radius, end_local FROM regions WHERE ingested_at >= ?", (time.time() - EVENT_STORE_MAX_AGE,)
+        ).fetchall()
+        return any(
+            distance_miles(row["lat"], row["lng"], lat, lng) + radius <= row["radius"] and end <= row["end_local"]
+            for row in rows
+        )
+
+    def search(self, query_string: str, limit: int) -> Optional[List[dict]]:
+        """The tool's fields for every event a Discovery API query matches, soonest first, or None
+        when the store can't answer it (unsupported parameters, no fresh region covers it, or more
+        than `limit` events match).
+
+        Ticketmaster ranks by relevance, which the store can't reproduce, so it
+        only answers when the whole result fits under the limit and nothing has
+        to be cut.
+        """
+        params = dict(parse_qsl(query_string))
+        if not set(params) <= STORE_QUERY_PARAMS or params.get("segmentName", "Music") != "Music" or "latlong" not in params:
+            return None
+        try:
+            lat, lng = (float(value) for value in params["latlong"].split(","))
+            radius = _miles(params.get("radius", "100"), params.get("unit", "miles"))
+        except ValueError:
+            return None
+        start, _, end = params.get("localStartEndDateTime", "").partition(",")
+        end = end or None
+        if not self._covered(lat, lng, radius, end):
+            self.misses += 1
+            return None
+
+        # Searches walk an index in start order, so they stop once more than `limit` events match. The
+        # attraction and classification indexes lead with the id or name, then the start time.
+        min_lat, max_lat, min_lng, max_lng = _bounding_box(lat, lng, radius)
+        if "attractionId" in params:
+            ids = params["attractionId"].split(",")
+            source = f"event_attractions x JOIN events e ON e.id = x.event WHERE x.attraction_id IN ({','.join('?' * len(ids))})"
+            args = list(ids)
+            start_column = "x.local_start"
+        elif "classificationName" in params:
+            source = "event_classifications x JOIN events e ON e.id = x.event WHERE x.name = ?"
+            args = [params["classificationName"]]
+            start_column = "x.local_start"
+        else:
+            source = "event_geo x JOIN events e ON e.id = x.id WHERE x.max_lat >= ? AND x.min_lat <= ? AND x.max_lng >= ? AND x.min_lng <= ?"
+            args = [min_lat, max_lat, min_lng, max_lng]
+            start_column = "e.local_start"
+        conditions = [
+            f"{start_column} >= ? AND {start_column} <= ?",
+            # The box is checked first so the distance is only computed for nearby events
+            "e.lat BETWEEN ? AND ? AND e.lng BETWEEN ? AND ?",
+            "distance_miles(?, ?, e.lat, e.lng) <= ?",
+        ]
+        args += [start, end or "9999", min_lat, max_lat, min_lng, max_lng, lat, lng, radius]
+        if "attractionId" in params and "classificationName" in params:
+            conditions.append("e.id IN (SELECT event FROM event_classifications WHERE name = ?)")
+            args.append(params["classificationName"])
+        rows = self._connection().execute(
+            f"SELECT {', '.join('e.' + column for column in EVENT_COLUMNS)} FROM {source} AND {' AND '.join(conditions)} "
+            f"ORDER BY {start_column} LIMIT ?",
+            args + [limit + 1]
+        ).fetchall()
+        if len(rows) > limit:
+            self.overflows += 1
+            return None
+        self.hits += 1
+        return [dict(row) for row in rows]
+
+    def regions(self) -> List[dict]:
+        return [dict(row) for row in self._connection().execute("SELECT * FROM regions ORDER BY name")]
+
+    def write_region(self, name: str, lat: float, lng: float, radius: float, end_local: str, events: List[dict], started_at: float):
+        """Replace a region's events with a fresh ingestion of them, in one transaction.
+
+        Events the region held that the ingestion no longer returned (cancelled
+        or moved) are removed, and so are events that have already started.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for event in events:
+                self._delete(conn, [row[0] for row in conn.execute("SELECT id FROM events WHERE event_id = ?", (event["event_id"],))])
+                event_rowid = conn.execute(
+                    f"INSERT INTO events (event_id, local_start, lat, lng, {', '.join(EVENT_COLUMNS)}, seen_at) "
+                    f"VALUES (?, ?, ?, ?, {', '.join('?' * len(EVENT_COLUMNS))}, ?)",
+                    (event["event_id"], event["local_start"], event["lat"], event["lng"], *(event["info"].get(column) for column in EVENT_COLUMNS), started_at)
+                ).lastrowid
+                conn.execute("INSERT INTO event_geo VALUES (?, ?, ?, ?, ?)", (event_rowid, event["lat"], event["lat"], event["lng"], event["lng"]))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO event_attractions VALUES (?, ?, ?)",
+                    [(attraction_id, event["local_start"], event_rowid) for attraction_id in event["attractions"]]
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO event_classifications VALUES (?, ?, ?)",
+                    [(classification, event["local_start"], event_rowid) for classification in event["classifications"]]
+                )
+
+            min_lat, max_lat, min_lng, max_lng = _bounding_box(lat, lng, radius)
+            gone = conn.execute(
+                "SELECT e.id FROM event_geo g JOIN events e ON e.id = g.id "
+                "WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lng >= ? AND g.min_lng <= ? "
+                "AND distance_miles(?, ?, e.lat, e.lng) <= ? AND e.local_start <= ? AND e.seen_at < ?",
+                (min_lat, max_lat, min_lng, max_lng, lat, lng, radius, end_local, started_at)
+            ).fetchall()
+            past = conn.execute("SELECT id FROM events WHERE local_start < ?", (datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),)).fetchall()
+            self._delete(conn, [row[0] for row in gone + past])
+
+            conn.execute(
+                "INSERT OR REPLACE INTO regions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, lat, lng, radius, end_local, time.time(), len(events))
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, ids: List[int]):
+        for table, column in (("events", "id"), ("event_geo", "id"), ("event_attractions", "event"), ("event_classifications", "event")):
+            conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(event_rowid,) for event_rowid in ids])
+
+    def stats(self) -> dict:
+        regions = self.regions()
+        fresh = [region for region in regions if region["ingested_at"] >= time.time() - EVENT_STORE_MAX_AGE]
+        lookups = self.hits + self.misses + self.overflows
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "overflows": self.overflows,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "regions": len(regions),
+            "fresh_regions": len(fresh),
+            "events": sum(region["events"] for region in fresh),
+        }
+
+
+event_store: Optional[EventStore] = EventStore(EVENT_STORE_PATH) if EVENT_STORE_PATH else None
+
+
+# Ingestion
+
+class IngestionStopped(Exception):
+    """Raised to end an ingestion pass once only the live searches' reserve of the quota is left."""
+
+
+def _check_quota():
+    from .quota import tm_quota
+
+    if tm_quota.quota_available is None or not tm_quota.quota_limit:
+        return
+    if tm_quota.quota_reset_at is not None and time.time() >= tm_quota.quota_reset_at:
+        # The quota has reset since the last response; the next one reports it again
+        return
+    if tm_quota.quota_available <= tm_quota.quota_limit * EVENT_STORE_QUOTA_RESERVE:
+        raise IngestionStopped(f"{tm_quota.quota_available} of {tm_quota.quota_limit} Ticketmaster calls left")
+
+
+def _event_record(event: dict) -> Optional[dict]:
+    """What the store keeps of a Discovery API event, or None for events without venue coordinates (they can't be placed)."""
+    from .ticketmaster import _extract_event_info
+
+    try:
+        venue = event["_embedded"]["venues"][0]
+        lat, lng = float(venue["location"]["latitude"]), float(venue["location"]["longitude"])
+        start = event["dates"]["start"]
+        info = _extract_event_info(event)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+    classifications = {
+        classification[level]["name"]
+        for classification in event.get("classifications", [])
+        for level in ("segment", "genre", "subGenre")
+        if classification.get(level, {}).get("name")
+    }
+    return {
+        "event_id": event["id"],
+        "local_start": f"{start['localDate']}T{start.get('localTime') or '00:00:00'}",
+        "lat": lat,
+        "lng": lng,
+        "info": info,
+        "attractions": [attraction["id"] for attraction in event["_embedded"].get("attractions", []) if attraction.get("id")],
+        "classifications": sorted(classifications),
+    }
+
+
+async def _fetch_window(lat: float, lng: float, radius: int, first: date, last: date) -> List[dict]:
+    """Every music event within `radius` miles between two dates, splitting the range when it holds more than one query returns."""
+    from .http_client import TM_BASE_URL
+    from .ticketmaster import TM_KEY, TM_PAGE_SIZE, _build_query_string, _tm_get_events
+
+    events = []
+    for page in range(TM_DEEP_PAGING_LIMIT // TM_PAGE_SIZE):
+        _check_quota()
+        query_string = _build_query_string(
+            [str(lat), str(lng)], radius=str(radius), sort="date,asc", page=str(page),
+            localStartEndDateTime=f"{first.isoformat()}T00:00:00,{last.isoformat()}T23:59:59"
+        )
+        response = await _tm_get_events(f"{TM_BASE_URL}/discovery/v2/events?apikey={TM_KEY}&{query_string}", with_page=True)
+        total = response.get("page", {}).get("totalElements", 0)
+        if page == 0 and total > TM_DEEP_PAGING_LIMIT and last > first:
+            middle = first + (last - first) // 2
+            return await _fetch_window(lat, lng, radius, first, middle) + await _fetch_window(lat, lng, radius, middle + timedelta(days=1), last)
+        page_events = response.get("_embedded", {}).get("events", [])
+        events.extend(page_events)
+        if len(page_events) < TM_PAGE_SIZE or len(events) >= total:
+            break
+    else:
+        logger.warning(f"More than {TM_DEEP_PAGING_LIMIT} events near {lat},{lng} on {first}; the rest are left to live searches")
+    return events
+
+
+async def ingest_region(name: str, lat: float, lng: float, radius: int = int(EVENT_STORE_REGION_RADIUS)) -> int:
+    """Fetch a region's music events for the next EVENT_STORE_DAYS days into the store. Returns how many were stored."""
+    started_at = time.time()
+    today = date.today()
+    last = today + timedelta(days=EVENT_STORE_DAYS)
+    events: Dict[str, dict] = {}
+    first = today
+    while first <= last:
+        window_last = min(first + timedelta(days=INGEST_WINDOW_DAYS - 1), last)
+        for event in await _fetch_window(lat, lng, radius, first, window_last):
+            record = _event_record(event)
+            if record is not None:
+                events[record["event_id"]] = record
+        first = window_last + timedelta(days=1)
+    await asyncio.to_thread(
+        event_store.write_region, name, lat, lng, radius, f"{last.isoformat()}T23:59:59", list(events.values()), started_at
+    )
+    return len(events)
+
+
+async def active_regions() -> Dict[str, Tuple[float, float]]:
+    """EVENT_STORE_REGIONS and the most searched metros (shared through Redis, or this process's own)."""
+    from .warmer import popular
+
+    regions = {}
+    for region in filter(None, EVENT_STORE_REGIONS.split(";")):
+        lat, lng = region.split(",")
+        regions[json.dumps([lat.strip(), lng.strip()])] = (float(lat), float(lng))
+    for metro, _ in await popular(get_cache_redis(), "metro", EVENT_STORE_TOP_METROS):
+        lat, lng = json.loads(metro)
+        regions.setdefault(metro, (float(lat), float(lng)))
+    return regions
+
+
+async def ingest_regions() -> dict:
+    """Re-ingest the active regions last ingested more than EVENT_STORE_REFRESH seconds ago."""
+    ingested_at = {region["name"]: region["ingested_at"] for region in event_store.regions()}
+    result = {"regions": 0, "events": 0, "failed": 0, "stopped": None}
+    for name, (lat, lng) in (await active_regions()).items():
+        if time.time() - ingested_at.get(name, 0) < EVENT_STORE_REFRESH:
+            continue
+        try:
+            result["events"] += await ingest_region(name, lat, lng)
+            result["regions"] += 1
+        except IngestionStopped as e:
+            # Regions not refreshed keep their events, and the next pass picks them up
+            result["stopped"] = str(e)
+            break
+        except Exception as e:
+            # The region keeps its previous events and is answered live once they are too old
+            result["failed"] += 1
+            logger.warning(f"Ingesting events near {lat},{lng} failed: {e}")
+    if result["regions"] or result["failed"]:
+        logger.info(f"Event ingestion: {result}")
+    return result
+
+
+async def run_event_ingestion(once: bool = False):
+    while True:
+        await ingest_regions()
+        if once:
+            return
+        await asyncio.sleep(INGEST_CHECK_INTERVAL)
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import os
+import threading
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+# History policy: keep the last N user turns verbatim and replace the earlier
+# turns with a short rolling summary kept in session state. 0 disables windowing.
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "4"))
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "2000"))
+SUMMARY_SNIPPET_CHARS = 200
+
+SUMMARY_STATE_KEY = "history_summary"
+SUMMARIZED_TURNS_STATE_KEY = "history_summarized_turns"
+TURN_STATE_KEY = "temp:history_turn"
+
+FOREIGN_EVENT_MARKER = "For context:"
+
+
+def _is_turn_start(content: types.Content) -> bool:
+    """Whether the content is a message typed by the user (not another agent's output or a tool result)."""
+    if content.role != "user" or not content.parts:
+        return False
+    if any(part.function_response for part in content.parts):
+        return False
+    return content.parts[0].text != FOREIGN_EVENT_MARKER
+
+
+def _split_turns(contents: List[types.Content]) -> List[List[types.Content]]:
+    """Group the request contents into turns, each starting with a user message."""
+    turns: List[List[types.Content]] = []
+    for content in contents:
+        if _is_turn_start(content) or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def _truncate(text: str, limit: int = SUMMARY_SNIPPET_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def _summarize_turn(turn: List[types.Content]) -> str:
+    """One line per turn: what the user asked and the last text reply they got."""
+    question = ""
+    reply = ""
+    for content in turn:
+        texts = [part.text for part in content.parts or [] if part.text]
+        if not texts:
+            continue
+        if _is_turn_start(content) and not question:
+            question = " ".join(texts)
+        elif content.role == "model":
+            reply = texts[-1]
+        elif texts[0] == FOREIGN_EVENT_MARKER and len(texts) > 1 and "said:" in texts[-1]:
+            # "[agent] said: ..." lines converted from other agents' replies
+            reply = texts[-1].split("said:", 1)[1]
+    line = f"- User: {_truncate(question)}"
+    if reply:
+        line += f" | Reply: {_truncate(reply)}"
+    return line
+
+
+def _trim_summary(lines: List[str], max_chars: int = HISTORY_SUMMARY_MAX_CHARS) -> List[str]:
+    """Drop the oldest summary lines until the summary fits in max_chars."""
+    while lines and sum(len(line) + 1 for line in lines) > max_chars:
+        lines = lines[1:]
+    return lines
+
+
+def window_history(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """Keep only the last HISTORY_MAX_TURNS turns in the request, summarizing the rest in state."""
+    turns = _split_turns(llm_request.contents)
+    callback_context.state[TURN_STATE_KEY] = len(turns)
+
+    if HISTORY_MAX_TURNS <= 0 or len(turns) <= HISTORY_MAX_TURNS:
+        return None
+
+    dropped = turns[:-HISTORY_MAX_TURNS]
+    summary: List[str] = list(callback_context.state.get(SUMMARY_STATE_KEY) or [])
+    summarized = callback_context.state.get(SUMMARIZED_TURNS_STATE_KEY) or 0
+    if summarized < len(dropped):
+        # Only the turns that left the window since the last call are summarized
+        summary = _trim_summary(summary + [_summarize_turn(turn) for turn in dropped[summarized:]])
+        callback_context.state[SUMMARY_STATE_KEY] = summary
+        callback_context.state[SUMMARIZED_TURNS_STATE_KEY] = len(dropped)
+
+    contents = [content for turn in turns[-HISTORY_MAX_TURNS:] for content in turn]
+    if summary:
+        summary_text = "Summary of the earlier conversation:\n" + "\n".join(summary)
+        contents.insert(0, types.Content(role="user", parts=[types.Part(text=summary_text)]))
+    llm_request.contents = contents
+    return None
+
+
+class PromptTokenStats:
+    """Prompt tokens per conversation turn, aggregated across sessions.
+
+    Turn n of every session lands in the same bucket, so replaying scripted
+    multi-turn sessions shows whether prompt size grows with the turn count.
+    """
+
+    MAX_TURN = 50
+    MAX_OPEN_INVOCATIONS = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns: Dict[int, Dict[str, int]] = {}
+        self._invocations: "OrderedDict[str, int]" = OrderedDict()
+
+    def record(self, invocation_id: str, turn: int, prompt_tokens: int):
+        turn = min(max(turn, 1), self.MAX_TURN)
+        with self._lock:
+            bucket = self._turns.setdefault(turn, {"invocations": 0, "llm_calls": 0, "prompt_tokens": 0})
+            if invocation_id not in self._invocations:
+                bucket["invocations"] += 1
+                self._invocations[invocation_id] = turn
+                if len(self._invocations) > self.MAX_OPEN_INVOCATIONS:
+                    self._invocations.popitem(last=False)
+            bucket["llm_calls"] += 1
+            bucket["prompt_tokens"] += prompt_tokens
+
+    def snapshot(self) -> Dict[int, Dict[str, float]]:
+        """Per-turn totals plus the mean prompt tokens per turn (summed over all agents)."""
+        with self._lock:
+            return {
+                turn: {
+                    **bucket,
+                    "mean_prompt_tokens": bucket["prompt_tokens"] / bucket["invocations"] if bucket["invocations"] else 0.0,
+                }
+                for turn, bucket in sorted(self._turns.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._turns.clear()
+            self._invocations.clear()
+
+
+prompt_token_stats = PromptTokenStats()
+
+
+def record_prompt_tokens(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    """Record the prompt tokens of every model call against the turn it belongs to."""
+    usage = llm_response.usage_metadata
+    if usage and usage.prompt_token_count and not llm_response.partial:
+        turn = callback_context.state.get(TURN_STATE_KEY) or 1
+        prompt_token_stats.record(callback_context.invocation_id, turn, usage.prompt_token_count)
+    return None
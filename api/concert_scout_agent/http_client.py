@@ -0,0 +1,115 @@
+from collections import defaultdict
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+import requests
+from opentelemetry.trace import SpanKind
+
+from . import cassette
+from .telemetry import tracer, UPSTREAM_HOST_ATTRIBUTE
+
+logger = logging.getLogger(__name__)
+
+# Overridable so the tools can be pointed at a stub server
+TM_BASE_URL = os.getenv("TM_BASE_URL", "https://app.ticketmaster.com").rstrip("/")
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+# Requests in flight to any single host
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "20"))
+# Idle connections are kept this long, so repeat calls skip DNS, TCP and TLS setup
+HTTP_KEEPALIVE_EXPIRY = 60.0
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_host_slots: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(HTTP_MAX_PER_HOST))
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled HTTP client for the agent tools, created on first use."""
+    global _client, _client_loop, _host_slots
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        # Connections belong to the loop that opened them (the CLI runs one loop per prompt)
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        _client_loop = loop
+        _host_slots = defaultdict(lambda: asyncio.Semaphore(HTTP_MAX_PER_HOST))
+        logger.info(f"HTTP client created (http2={HTTP2_AVAILABLE})")
+    return _client
+
+
+async def close_http_client():
+    """Close the shared HTTP client and its connections."""
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _client_loop = None
+
+
+def _span_attributes(method: str, url: str) -> dict:
+    # The query string is left out, it carries API keys
+    parts = urlsplit(url)
+    return {"http.request.method": method, UPSTREAM_HOST_ATTRIBUTE: parts.netloc, "url.path": parts.path}
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    """GET a url through the shared client, limited per host."""
+    client = get_http_client()
+    attributes = _span_attributes("GET", url)
+    with tracer.start_as_current_span(f"GET {attributes['url.path']}", kind=SpanKind.CLIENT, attributes=attributes) as span:
+        if cassette.replaying():
+            response = await cassette.replay_http("GET", url)
+        else:
+            async with _host_slots[attributes[UPSTREAM_HOST_ATTRIBUTE]]:
+                start = time.perf_counter()
+                response = await client.get(url, **kwargs)
+            if cassette.recording():
+                cassette.record_http("GET", url, response.status_code, response.headers, response.text, time.perf_counter() - start)
+        span.set_attribute("http.response.status_code", response.status_code)
+        return response
+
+
+async def get_json(url: str, **kwargs) -> dict:
+    """GET a url through the shared client and decode the JSON body."""
+    response = await get(url, **kwargs)
+    return response.json()
+
+
+class TracedSession(requests.Session):
+    """requests session that records a client span per request, for SDKs built on requests (spotipy).
+
+    Requests also go through the cassette when one is recording or replaying.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        attributes = _span_attributes(method, url)
+        with tracer.start_as_current_span(f"{method} {attributes['url.path']}", kind=SpanKind.CLIENT, attributes=attributes) as span:
+            if cassette.replaying():
+                response = cassette.replay_requests(method, url)
+            else:
+                start = time.perf_counter()
+                response = super().request(method, url, *args, **kwargs)
+                if cassette.recording():
+                    cassette.record_http(method, url, response.status_code, response.headers, response.text, time.perf_counter() - start)
+            span.set_attribute("http.response.status_code", response.status_code)
+            return response
@@ -0,0 +1,106 @@
+from collections import defaultdict
+from typing import Dict, Optional
+import hashlib
+import json
+import logging
+import os
+import re
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from pydantic import BaseModel
+
+from .cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a model response stays cached, per agent. 0 opts an agent out.
+LLM_CACHE_TTLS = {
+    "concert_scout_agent": 3600,
+    "spotify_agent": 3600,
+    "related_artists_agent": 86400,
+    "ticketmaster_agent": 3600,
+    "final_recommender_agent": 900,
+}
+# Off while a cassette records or replays, so every model call reaches it
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true" and os.getenv("CASSETTE_MODE", "").lower() not in ("record", "replay")
+# Comma-separated agent names that never use the cache
+LLM_CACHE_DISABLED_AGENTS = {name.strip() for name in os.getenv("LLM_CACHE_DISABLED_AGENTS", "").split(",") if name.strip()}
+
+CACHE_KEY_STATE_KEY = "temp:llm_cache_key"
+
+# The current date the callbacks add to the instructions is cut down to the day,
+# so a request differs at most once a day because of it. Other timestamps (the
+# concerts' start times in tool results) are part of the request and stay.
+_CURRENT_DATE = re.compile(r"(The current date is \d{4}-\d{2}-\d{2})T[\d:.]+(?:Z|[+-]\d{2}:?\d{2})?")
+
+llm_cache = TieredCache("llm", max_items=512, local_ttl=600.0)
+llm_cache_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0, "stores": 0})
+
+
+def _cache_ttl(agent_name: str) -> int:
+    if not LLM_CACHE_ENABLED or agent_name in LLM_CACHE_DISABLED_AGENTS:
+        return 0
+    return LLM_CACHE_TTLS.get(agent_name, 0)
+
+
+def llm_request_key(llm_request: LlmRequest) -> str:
+    """Canonical hash of the model, system instruction, contents and generation config."""
+    config = {}
+    if llm_request.config:
+        config = llm_request.config.model_dump(
+            mode="json", exclude_none=True, exclude={"http_options", "response_schema"}
+        )
+        if isinstance(config.get("system_instruction"), str):
+            config["system_instruction"] = _CURRENT_DATE.sub(r"\1", config["system_instruction"])
+        schema = llm_request.config.response_schema
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            # output_schema agents pass the pydantic class itself
+            config["response_schema"] = schema.model_json_schema()
+        elif schema is not None:
+            config["response_schema"] = schema.model_dump(mode="json", exclude_none=True) if isinstance(schema, BaseModel) else schema
+    payload = {
+        "model": llm_request.model,
+        "config": config,
+        "contents": [content.model_dump(mode="json", exclude_none=True) for content in llm_request.contents],
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+async def lookup_llm_cache(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """Return a cached model response for an identical request, skipping the model call.
+
+    Must be the last before_model_callback so the key covers the final request.
+    """
+    agent_name = callback_context.agent_name
+    if not _cache_ttl(agent_name):
+        return None
+
+    key = f"{agent_name}:{llm_request_key(llm_request)}"
+    cached = await llm_cache.get(key)
+    if cached is None:
+        llm_cache_stats[agent_name]["misses"] += 1
+        callback_context.state[CACHE_KEY_STATE_KEY] = key
+        return None
+
+    llm_cache_stats[agent_name]["hits"] += 1
+    llm_response = LlmResponse.model_validate_json(cached)
+    # No tokens were spent on this response
+    llm_response.usage_metadata = None
+    llm_response.custom_metadata = {**(llm_response.custom_metadata or {}), "llm_cache": "hit"}
+    return llm_response
+
+
+async def store_llm_cache(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    """Cache a complete, successful model response under the key computed before the call."""
+    key = callback_context.state.get(CACHE_KEY_STATE_KEY)
+    if not key or llm_response.partial or llm_response.error_code or not llm_response.content:
+        return None
+
+    ttl = _cache_ttl(callback_context.agent_name)
+    if ttl:
+        await llm_cache.set(key, llm_response.model_dump_json(exclude_none=True), ttl)
+        llm_cache_stats[callback_context.agent_name]["stores"] += 1
+    callback_context.state[CACHE_KEY_STATE_KEY] = None
+    return None
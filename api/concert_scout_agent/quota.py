@@ -0,0 +1,194 @@
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+import logging
+import os
+import random
+import time
+
+import httpx
+
+from .http_client import get
+
+logger = logging.getLogger(__name__)
+
+# Starting point and bounds for the request rate (per second) and the calls in
+# flight. Each process has its own controller; under gunicorn the workers split
+# the maximums between them (see QuotaController.share).
+TM_MAX_RPS = float(os.getenv("TM_MAX_RPS", "5"))
+TM_MIN_RPS = 0.5
+TM_MAX_CONCURRENCY = int(os.getenv("TM_MAX_CONCURRENCY", "10"))
+# Additive increase per successful call
+RATE_INCREASE = 0.05
+# 429s closer together than this come from the same burst and only back off once
+DECREASE_INTERVAL = 1.0
+# Throttled calls are retried this many times with jittered exponential backoff
+TM_MAX_RETRIES = int(os.getenv("TM_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+# Below this fraction of the quota left, the rest is spread out until the reset
+QUOTA_RESERVE_FRACTION = 0.05
+
+
+class QuotaController:
+    """AIMD control of request spacing and concurrency for one rate-limited API.
+
+    Every success raises the rate and the concurrency window additively; a 429
+    halves both. Rate-limit headers cap the rate so the remaining quota lasts
+    until it resets, and pause requests when it is used up.
+    """
+
+    def __init__(self, name: str, max_rate: float = TM_MAX_RPS, max_concurrency: int = TM_MAX_CONCURRENCY):
+        self.name = name
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.min_rate = min(TM_MIN_RPS, max_rate)
+        self.rate = max_rate
+        self.window = float(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self._next_send = 0.0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._header_rate_cap: Optional[float] = None
+        self._slot_freed: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.throttled = 0
+        self.retries = 0
+        self.quota_limit: Optional[int] = None
+        self.quota_available: Optional[int] = None
+        # Epoch seconds when quota_available resets, from Rate-Limit-Reset
+        self.quota_reset_at: Optional[float] = None
+
+    def _effective_rate(self) -> float:
+        rate = self.rate
+        if self._header_rate_cap is not None:
+            rate = min(rate, self._header_rate_cap)
+        return max(rate, self.min_rate)
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Conditions belong to one loop (the CLI runs one loop per prompt)
+            self._loop = loop
+            self._slot_freed = asyncio.Condition()
+            self.in_flight = 0
+            self.waiting = 0
+        return self._slot_freed
+
+    def share(self, processes: int):
+        """Keep to a 1/processes share of the maximum rate and concurrency, for each of `processes` workers calling the API."""
+        processes = max(processes, 1)
+        self.max_rate = TM_MAX_RPS / processes
+        self.max_concurrency = max(TM_MAX_CONCURRENCY // processes, 1)
+        self.min_rate = min(TM_MIN_RPS, self.max_rate)
+        self.rate = min(self.rate, self.max_rate)
+        self.window = min(self.window, float(self.max_concurrency))
+
+    @property
+    def saturated(self) -> bool:
+        """True while calls are queued behind the window, the spacing or a pause."""
+        return self.waiting > 0 or self._paused_until > time.monotonic()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait for a free place in the concurrency window and for the next send time."""
+        slot_freed = self._condition()
+        self.waiting += 1
+        try:
+            async with slot_freed:
+                await slot_freed.wait_for(lambda: self.in_flight < max(int(self.window), 1))
+                self.in_flight += 1
+        except BaseException:
+            self.waiting -= 1
+            raise
+        try:
+            now = time.monotonic()
+            send_at = max(now, self._next_send, self._paused_until)
+            self._next_send = send_at + 1.0 / self._effective_rate()
+            try:
+                if send_at > now:
+                    await asyncio.sleep(send_at - now)
+            finally:
+                self.waiting -= 1
+            yield
+        finally:
+            async with slot_freed:
+                self.in_flight -= 1
+                slot_freed.notify()
+
+    def observe(self, response: httpx.Response):
+        """Adjust the rate and window from one response."""
+        self._read_headers(response.headers)
+        if response.status_code == 429:
+            self.throttled += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_INTERVAL:
+                self._last_decrease = now
+                self.rate = max(self.rate / 2, self.min_rate)
+                self.window = max(self.window / 2, 1.0)
+                logger.warning(f"{self.name} throttled; rate {self.rate:.2f}/s, window {self.window:.0f}")
+        elif response.status_code < 500:
+            self.rate = min(self.rate + RATE_INCREASE, self.max_rate)
+            self.window = min(self.window + 1.0 / self.window, float(self.max_concurrency))
+
+    def _read_headers(self, headers: httpx.Headers):
+        try:
+            limit = int(headers["Rate-Limit"])
+            available = int(headers["Rate-Limit-Available"])
+        except (KeyError, ValueError):
+            return
+        self.quota_limit = limit
+        self.quota_available = available
+        try:
+            # Epoch milliseconds
+            self.quota_reset_at = int(headers["Rate-Limit-Reset"]) / 1000
+            seconds_to_reset = max(self.quota_reset_at - time.time(), 1.0)
+        except (KeyError, ValueError):
+            self.quota_reset_at = None
+            seconds_to_reset = None
+
+        if available <= 0 and seconds_to_reset:
+            self._paused_until = time.monotonic() + seconds_to_reset
+            logger.warning(f"{self.name} quota used up; pausing for {seconds_to_reset:.0f}s")
+        elif seconds_to_reset and available < limit * QUOTA_RESERVE_FRACTION:
+            self._header_rate_cap = available / seconds_to_reset
+        else:
+            self._header_rate_cap = None
+
+    def retry_delay(self, attempt: int, response: httpx.Response) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+        delay = random.uniform(0, min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY))
+        try:
+            delay = max(delay, float(response.headers["Retry-After"]))
+        except (KeyError, ValueError):
+            pass
+        return delay
+
+    async def get(self, url: str) -> httpx.Response:
+        """GET a url within the quota, retrying throttled calls. The last 429 is returned if retries run out."""
+        for attempt in range(TM_MAX_RETRIES + 1):
+            async with self.slot():
+                response = await get(url)
+            self.observe(response)
+            if response.status_code != 429 or attempt == TM_MAX_RETRIES:
+                return response
+            self.retries += 1
+            await asyncio.sleep(self.retry_delay(attempt, response))
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "rate": round(self._effective_rate(), 2),
+            "window": round(self.window, 1),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "quota_limit": self.quota_limit,
+            "quota_available": self.quota_available,
+            "paused_for": round(max(self._paused_until - time.monotonic(), 0.0), 1),
+        }
+
+
+tm_quota = QuotaController("ticketmaster")
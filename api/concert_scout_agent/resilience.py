@@ -0,0 +1,246 @@
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+from urllib.parse import urlsplit
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+import httpx
+
+from .cache import TieredCache
+from .http_client import get
+from .quota import QuotaController
+
+logger = logging.getLogger(__name__)
+
+# A duplicate request is sent once the first has run longer than the endpoint's
+# p95, within these bounds
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "2.0"))
+# Hedges may add at most this fraction of extra requests, to stay inside the rate budget
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+# Latencies needed before the p95 is trusted
+LATENCY_MIN_SAMPLES = 20
+
+# Consecutive failures that open an endpoint's circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Successful responses are kept this long to answer while an endpoint is failing
+FALLBACK_CACHE_TTL = int(os.getenv("UPSTREAM_FALLBACK_TTL", "21600"))
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an endpoint is failing and no cached response is available."""
+
+
+class LatencyTracker:
+    """Recent latencies of one endpoint."""
+
+    def __init__(self, window: int = 500):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def hedge_delay(self) -> float:
+        p95 = self.percentile(0.95)
+        if p95 is None:
+            return HEDGE_MAX_DELAY
+        return min(max(p95, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+
+class HedgeBudget:
+    """Token bucket that earns a fraction of a hedge for every request sent."""
+
+    def __init__(self, ratio: float = HEDGE_BUDGET_RATIO, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+
+    def earn(self):
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def take(self) -> bool:
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single probe through after reset_timeout."""
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == CIRCUIT_CLOSED:
+            return True
+        if self.state == CIRCUIT_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = CIRCUIT_HALF_OPEN
+            self._probing = False
+        if self.state == CIRCUIT_HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == CIRCUIT_HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != CIRCUIT_OPEN:
+                logger.warning(f"Circuit opened after {self.failures} failures")
+            self.state = CIRCUIT_OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        """Give up a call that never finished without judging the endpoint; a half-open circuit lets the next probe through."""
+        self._probing = False
+
+
+class Endpoint:
+    """Latency, hedging and circuit state of one upstream endpoint."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = LatencyTracker()
+        self.budget = HedgeBudget()
+        self.breaker = CircuitBreaker()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+        self.fallbacks = 0
+
+    def stats(self) -> dict:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(0.95)
+        return {
+            "circuit": self.breaker.state,
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+endpoints: Dict[str, Endpoint] = {}
+fallback_cache = TieredCache("upstream", max_items=2048, local_ttl=FALLBACK_CACHE_TTL)
+
+
+def _endpoint(url: str) -> Endpoint:
+    parts = urlsplit(url)
+    name = f"{parts.netloc}{parts.path}"
+    if name not in endpoints:
+        endpoints[name] = Endpoint(name)
+    return endpoints[name]
+
+
+def _fallback_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+async def _attempt(endpoint: Endpoint, url: str, quota: Optional[QuotaController], decode: Callable[[bytes], dict]) -> dict:
+    start = time.perf_counter()
+    endpoint.requests += 1
+    endpoint.budget.earn()
+    response = await quota.get(url) if quota else await get(url)
+    if response.status_code >= 500 or response.status_code == 429:
+        raise httpx.HTTPStatusError(f"{response.status_code} from {endpoint.name}", request=response.request, response=response)
+    endpoint.latency.record(time.perf_counter() - start)
+    return decode(response.content)
+
+
+async def _hedged(endpoint: Endpoint, url: str, quota: Optional[QuotaController], decode: Callable[[bytes], dict]) -> dict:
+    """Run the request, adding one duplicate if it outlives the hedge delay; the first success wins."""
+    primary = asyncio.create_task(_attempt(endpoint, url, quota, decode))
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=endpoint.latency.hedge_delay())
+        # A call waiting on the quota is slow because of us, and a duplicate would only queue behind it
+        if not done and not (quota and quota.saturated) and endpoint.budget.take():
+            endpoint.hedges += 1
+            tasks.add(asyncio.create_task(_attempt(endpoint, url, quota, decode)))
+
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        endpoint.hedge_wins += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def resilient_get_json(url: str, quota: Optional[QuotaController] = None, decode: Callable[[bytes], dict] = json.loads) -> dict:
+    """GET a JSON url with hedging and circuit breaking, answering from the last good response when the endpoint is failing.
+
+    Calls go through `quota` when given, so throttled calls are retried there.
+    `decode` turns the body into the result (and what is kept for the fallback).
+    Raises UpstreamUnavailable when the endpoint fails and nothing is cached.
+    """
+    endpoint = _endpoint(url)
+    key = _fallback_key(url)
+    if endpoint.breaker.allow():
+        try:
+            data = await _hedged(endpoint, url, quota, decode)
+        except (httpx.HTTPError, ValueError) as e:
+            endpoint.failures += 1
+            endpoint.breaker.record_failure()
+            logger.warning(f"Request to {endpoint.name} failed: {e!r}")
+        except asyncio.CancelledError:
+            # A pipeline timeout or a client that went away says nothing about the
+            # endpoint, but a half-open probe must not stay outstanding
+            endpoint.breaker.release()
+            raise
+        except Exception:
+            endpoint.failures += 1
+            endpoint.breaker.record_failure()
+            raise
+        else:
+            endpoint.breaker.record_success()
+            if data.get("_embedded"):
+                await fallback_cache.set(key, json.dumps(data), FALLBACK_CACHE_TTL)
+            return data
+
+    cached = await fallback_cache.get(key)
+    if cached is None:
+        raise UpstreamUnavailable(f"{endpoint.name} is unavailable ({endpoint.breaker.state} circuit)")
+    endpoint.fallbacks += 1
+    return json.loads(cached)
+
+
+def upstream_stats() -> dict:
+    return {name: endpoint.stats() for name, endpoint in endpoints.items()}
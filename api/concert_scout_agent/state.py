@@ -0,0 +1,90 @@
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+# Maximum number of items kept per list-valued state key. Older entries are
+# evicted first, so follow-up turns keep the state (and prompts) flat. The
+# current turn's items are never evicted, so one large turn can exceed it.
+STATE_LIMITS = {
+    "ticketmaster_concerts": 60,
+    "top_artists": 20,
+    "genres": 20,
+}
+
+# Suffix for the key holding only the items produced during the current turn
+TURN_SUFFIX = "_turn"
+
+
+def concert_key(concert: dict) -> Optional[Hashable]:
+    """Dedupe key for a concert: its Ticketmaster URL, falling back to name, date, time and venue."""
+    if not isinstance(concert, dict):
+        return None
+    if concert.get("url"):
+        return concert["url"]
+    fallback = tuple(concert.get(field) for field in ("name", "date", "time", "venue_name"))
+    return fallback if any(fallback) else None
+
+
+def text_key(value: Any) -> Optional[Hashable]:
+    """Dedupe key for artist and genre names (case and whitespace insensitive)."""
+    if not isinstance(value, str):
+        return None
+    return value.strip().lower() or None
+
+
+STATE_KEYS: Dict[str, Callable[[Any], Optional[Hashable]]] = {
+    "ticketmaster_concerts": concert_key,
+    "top_artists": text_key,
+    "genres": text_key,
+}
+
+
+def merge_recent(current: Optional[Iterable], new: Optional[Iterable], key: Callable[[Any], Optional[Hashable]], limit: int) -> List:
+    """Merge new items into current, deduplicating by key and keeping the most recent limit items.
+
+    A duplicate is moved to the most recent position, so items seen again in a
+    later turn survive eviction. Items without a key are dropped.
+    """
+    merged: Dict[Hashable, Any] = {}
+    for item in list(current or []) + list(new or []):
+        item_key = key(item)
+        if item_key is None:
+            continue
+        merged.pop(item_key, None)
+        merged[item_key] = item
+    items = list(merged.values())
+    return items[-limit:] if limit else items
+
+
+def dedupe(items: Optional[Iterable], key: Callable[[Any], Optional[Hashable]]) -> List:
+    """Remove duplicates from items, keeping the first occurrence."""
+    seen = set()
+    unique = []
+    for item in items or []:
+        item_key = key(item)
+        if item_key is None or item_key in seen:
+            continue
+        seen.add(item_key)
+        unique.append(item)
+    return unique
+
+
+def update_bounded_state(state, name: str, new_items: Optional[Iterable], replace: bool = False) -> List:
+    """Merge new_items into the bounded state list `name` and record this turn's view.
+
+    Writes the merged list to state[name] and the deduplicated new items to
+    state[name + TURN_SUFFIX]. Items from earlier turns are evicted (oldest
+    first) to make room; this turn's items never are, in their original order,
+    since the tools return the most relevant first. With replace=True the
+    earlier items are discarded instead of merged. Returns the new value of
+    state[name].
+    """
+    key = STATE_KEYS[name]
+    limit = STATE_LIMITS[name]
+    turn_items = dedupe(new_items, key)
+    turn_keys = {key(item) for item in turn_items}
+    current = [] if replace else state.get(name) or []
+    earlier = [item for item in merge_recent(current, [], key, 0) if key(item) not in turn_keys]
+    room = max(limit - len(turn_items), 0)
+    merged = (earlier[-room:] if room else []) + turn_items
+    state[name] = merged
+    state[name + TURN_SUFFIX] = turn_items
+    return merged
@@ -1,6 +1,10 @@
 from google.adk.agents import Agent
 from google.genai import types
 from pydantic import BaseModel, Field
+from concert_scout_agent.history import window_history, record_prompt_tokens
+from concert_scout_agent.llm_cache import lookup_llm_cache, store_llm_cache
+from concert_scout_agent.usage import record_token_usage
+from concert_scout_agent.cassette import replay_llm_cassette, record_llm_cassette
 
 class Concert(BaseModel):
     name: str = Field(description="The name of the concert")
@@ -39,5 +43,7 @@ final_recommender_agent = Agent(
     Include a detailed description of 1-2 sentences why you think it's a good fit for the user. Don't include the date in the description. 
     Make it sound like a recommendation of why the user would like it beyond its genre or it being a related artist.
     """,
-    output_schema=ConcertRecommendations
+    output_schema=ConcertRecommendations,
+    before_model_callback=[window_history, replay_llm_cassette, lookup_llm_cache],
+    after_model_callback=[record_prompt_tokens, record_token_usage, record_llm_cassette, store_llm_cache]
 )
\ No newline at end of file
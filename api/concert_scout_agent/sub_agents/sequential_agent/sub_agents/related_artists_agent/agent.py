@@ -1,5 +1,9 @@
 from google.adk.agents import Agent
 from google.adk.tools import google_search
+from concert_scout_agent.history import window_history, record_prompt_tokens
+from concert_scout_agent.llm_cache import lookup_llm_cache, store_llm_cache
+from concert_scout_agent.usage import record_token_usage
+from concert_scout_agent.cassette import replay_llm_cassette, record_llm_cassette
 
 related_artists_agent = Agent(
     name="related_artists_agent",
@@ -18,5 +22,7 @@ related_artists_agent = Agent(
     **MANDATORY:** You MUST call the google_search tool first. Do not respond with any data until you have called the tool.
     """,
     tools=[google_search],
-    output_key="related_artists"
+    output_key="related_artists",
+    before_model_callback=[window_history, replay_llm_cassette, lookup_llm_cache],
+    after_model_callback=[record_prompt_tokens, record_token_usage, record_llm_cassette, store_llm_cache]
 )
\ No newline at end of file
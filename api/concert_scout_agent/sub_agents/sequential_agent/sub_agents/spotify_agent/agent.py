@@ -4,6 +4,7 @@ from collections import Counter
 from typing import Dict, List, Tuple
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
+from spotipy.cache_handler import MemoryCacheHandler
 import os
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
@@ -11,6 +12,12 @@ from google.genai.types import GenerateContentConfig
 from typing import Optional
 import json
 from dotenv import load_dotenv
+from concert_scout_agent.history import window_history, record_prompt_tokens
+from concert_scout_agent.llm_cache import lookup_llm_cache, store_llm_cache
+from concert_scout_agent.state import update_bounded_state
+from concert_scout_agent.http_client import TracedSession
+from concert_scout_agent.usage import record_token_usage
+from concert_scout_agent.cassette import replay_llm_cassette, record_llm_cassette
 
 # Load environment variables
 load_dotenv()
@@ -20,26 +27,44 @@ load_dotenv()
 # Environment variables
 CLIENT_ID = os.getenv("SPOTIFY_CLIENT")
 CLIENT_SECRET = os.getenv("SPOTIFY_SECRET")
+# Overridable to point the client at another host (e.g. the benchmark stubs)
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1/")
+SPOTIFY_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL", SpotifyClientCredentials.OAUTH_TOKEN_URL)
 
 # Constants
 TOP_ARTISTS_LIMIT = 5
 
 
+# Shared so its pooled session and cached access token are reused across calls
+_spotify_client: Optional[spotipy.Spotify] = None
+
+
 class SpotifyError(Exception):
     """Custom exception for Spotify API errors"""
     pass
 
 def _get_spotify_client() -> spotipy.Spotify:
     """Get or create Spotify client with proper error handling"""
+    global _spotify_client
     if not CLIENT_ID or not CLIENT_SECRET:
         raise SpotifyError("Spotify credentials not found in environment variables")
+    if _spotify_client is not None:
+        return _spotify_client
     
     try:
+        # One session for the token and API calls, so both are traced (and recorded by cassettes)
+        session = TracedSession()
         auth_manager = SpotifyClientCredentials(
             client_id=CLIENT_ID, 
-            client_secret=CLIENT_SECRET
+            client_secret=CLIENT_SECRET,
+            requests_session=session,
+            # Keep the token in memory rather than in a .cache file shared by every process in the directory
+            cache_handler=MemoryCacheHandler()
         )
-        return spotipy.Spotify(auth_manager=auth_manager)
+        auth_manager.OAUTH_TOKEN_URL = SPOTIFY_TOKEN_URL
+        _spotify_client = spotipy.Spotify(auth_manager=auth_manager, requests_session=session)
+        _spotify_client.prefix = SPOTIFY_API_URL
+        return _spotify_client
     except Exception as e:
         raise SpotifyError(f"Failed to authenticate with Spotify: {str(e)}")
 
@@ -86,7 +111,8 @@ def _get_artist_genres(sp: spotipy.Spotify, artist_ids: List[str]) -> List[str]:
             if artist and artist.get('genres'):
                 genres.update(artist['genres'])
         
-        return list(genres)
+        # Sorted so the same artists always give the same tool result (and LLM cache key)
+        return sorted(genres)
     except Exception as e:
         raise SpotifyError(f"Failed to fetch artist genres: {str(e)}")
 
@@ -123,18 +149,9 @@ def spotify_api(tool_context: ToolContext, playlist_id: str) -> Dict:
         # Get genres for top artists
         genres = _get_artist_genres(sp, top_artist_ids)
 
-        # Saves the top artists and genres to the state
-        current_top_artists = tool_context.state.get("top_artists", [])
-        current_genres = tool_context.state.get("genres", [])
-
-        # Ensure we have lists, not None values
-        if current_top_artists is None:
-            current_top_artists = []
-        if current_genres is None:
-            current_genres = []
-
-        new_top_artists = current_top_artists + top_artist_names
-        new_genres = current_genres + genres
+        # Saves the top artists and genres to the state (deduplicated and capped)
+        new_top_artists = update_bounded_state(tool_context.state, "top_artists", top_artist_names)
+        new_genres = update_bounded_state(tool_context.state, "genres", genres)
         
         return {
             "status": "success",
@@ -173,16 +190,14 @@ def data_retrieval_tool(tool_context: ToolContext,location: str, artists: Option
     """
     if playlist_id:
         spotify_data = spotify_api(tool_context, playlist_id)
-        # Update the state
-        tool_context.state["top_artists"] = spotify_data["top_artists"]
-        tool_context.state["genres"] = spotify_data["genres"]
+        # Update the state (spotify_api already saved the top artists and genres)
         tool_context.state["location"] = location
         tool_context.state["date"] = date if date else ''
         return spotify_data
     else:
         # Ensure we store lists, not None values
-        tool_context.state["top_artists"] = artists if artists is not None else []
-        tool_context.state["genres"] = [genre] if genre is not None else []
+        update_bounded_state(tool_context.state, "top_artists", artists, replace=True)
+        update_bounded_state(tool_context.state, "genres", [genre] if genre is not None else [], replace=True)
         tool_context.state["location"] = location
         tool_context.state["date"] = date if date else ''
         return {
@@ -221,5 +236,7 @@ spotify_agent = Agent(
 
     **MANDATORY:** You MUST call the data_retrieval_tool first. Do not respond until you have called the tool.
     """,
-    tools=[data_retrieval_tool]
+    tools=[data_retrieval_tool],
+    before_model_callback=[window_history, replay_llm_cassette, lookup_llm_cache],
+    after_model_callback=[record_prompt_tokens, record_token_usage, record_llm_cassette, store_llm_cache]
 )
\ No newline at end of file
@@ -1,15 +1,17 @@
 from google.adk.agents import Agent
 from typing import Dict, List
-import os
-import requests
 from typing import Optional
 from google.adk.tools import ToolContext
 from google.genai import types
 from google.adk.agents.callback_context import CallbackContext
 from google.adk.models import LlmRequest
 from datetime import datetime
-
-TM_KEY = os.getenv("TM_KEY")
+from concert_scout_agent.history import window_history, record_prompt_tokens
+from concert_scout_agent.llm_cache import lookup_llm_cache, store_llm_cache
+from concert_scout_agent.usage import record_token_usage
+from concert_scout_agent.cassette import replay_llm_cassette, record_llm_cassette
+from concert_scout_agent.state import update_bounded_state
+from concert_scout_agent.ticketmaster import search_concerts
 
 def add_current_date(callback_context: CallbackContext, llm_request: LlmRequest) -> None:
     """Add the current date to the session state."""
@@ -17,106 +19,7 @@ def add_current_date(callback_context: CallbackContext, llm_request: LlmRequest)
     modified_text = original_instruction + f"\n The current date is {datetime.now().isoformat()[:10]}." 
     llm_request.config.system_instruction = modified_text
 
-def _get_artist_info(artist_name: str) -> Optional[dict]:
-    """Get the artist id from the artist name."""
-    try:
-        attraction_url = f"https://app.ticketmaster.com/discovery/v2/attractions?apikey={TM_KEY}&keyword={artist_name}&sort=relevance,desc"
-        response = requests.get(attraction_url).json()
-        attractions = response.get("_embedded", {}).get("attractions", [])
-        if attractions:
-            attraction = attractions[0]
-            return {
-                "id": attraction.get("id"),
-                "genre": attraction.get("classifications", [{}])[0].get("genre", {}).get("name")
-            }
-        return None
-    except Exception as e:
-        print(f"Error getting artist info for {artist_name}: {e}")
-        return None
-
-def _extract_event_info(event: dict) -> dict:
-    """Extract relevant event information from Ticketmaster API response."""
-    venue = event['_embedded']['venues'][0]
-    images = event.get('images', [])
-    # Find 16_9 image with width >= 1024
-    selected_image = None
-    for img in images:
-        if img.get('ratio') == '16_9' and img.get('width', 0) >= 1024:
-            selected_image = img['url']
-            break
-    if not selected_image and images:
-        selected_image = images[0].get('url')
-    return {
-        'venue_name': venue.get('name', 'Venue information not available'),
-        'city_name': venue.get('city', {}).get('name', 'City information not available'),
-        'name': event['name'],
-        'date': event['dates']['start']['localDate'],
-        'time': event['dates']['start'].get('localTime', # some events don't have localTime, use fallbacks
-                                            event['dates']['start'].get('dateTime', 'Time information not available')),
-        'url': event['url'],
-        'image_url': selected_image
-    }
-
-def _build_date_params(date: Optional[List[str]]) -> dict:
-    """Build date parameters for Ticketmaster API calls."""
-    if not date or len(date) < 2:
-        return {}
-
-    params = {}
-    params['localStartEndDateTime'] = f'{date[0]},{date[1]}'
-    return params
-
-def _build_query_string(latlong: List[str], **kwargs) -> str:
-    """Build query string for Ticketmaster API with common parameters."""
-    base_params = {
-        'latlong': f"{latlong[0]},{latlong[1]}",
-        'radius': '100',
-        'unit': 'miles',
-        'segmentName': 'Music',
-        'size': '200',
-        'sort': 'relevance,desc'
-    }
-    base_params.update(kwargs)
-    
-    # Filter out None values to avoid API issues
-    filtered_params = {k: v for k, v in base_params.items() if v is not None}
-    
-    return '&'.join([f"{k}={v}" for k, v in filtered_params.items()])
-
-def _build_artist_query_string(latlong: List[str], artist_id: str, **kwargs) -> str:
-    """Build query string for Ticketmaster API with artist ID parameter."""
-    base_params = {
-        'latlong': f"{latlong[0]},{latlong[1]}",
-        'radius': '100',
-        'unit': 'miles',
-        'segmentName': 'Music',
-        'size': '200',
-        'sort': 'relevance,desc',
-        'attractionId': artist_id
-    }
-    base_params.update(kwargs)
-    
-    # Filter out None values to avoid API issues
-    filtered_params = {k: v for k, v in base_params.items() if v is not None}
-    
-    return '&'.join([f"{k}={v}" for k, v in filtered_params.items()])
-
-def _fetch_concerts(query_string: str, extra_info: dict, limit: int = None) -> List[dict]:
-    """Fetch concerts from Ticketmaster API and extract event information."""
-    try:
-        url = f'https://app.ticketmaster.com/discovery/v2/events?apikey={TM_KEY}&{query_string}'
-        response = requests.get(url).json()
-        
-        events = response.get("_embedded", {}).get("events", [])
-        if limit:
-            events = events[:limit]
-            
-        return [{**_extract_event_info(event), 'genre': extra_info.get('genre')} for event in events]
-    except Exception as e:
-        print(f"Error fetching concerts: {e}")
-        return []
-
-def ticketmaster_api(tool_context: ToolContext, artists: List[str], latlong: List[str], related_artists: List[str], ticketmaster_genre: str, date: Optional[List[str]] = None) -> Dict:
+async def ticketmaster_api(tool_context: ToolContext, artists: List[str], latlong: List[str], related_artists: List[str], ticketmaster_genre: str, date: Optional[List[str]] = None) -> Dict:
     """
     Retrieve concerts for artists in a given location using the Ticketmaster API.
 
@@ -133,57 +36,13 @@ def ticketmaster_api(tool_context: ToolContext, artists: List[str], latlong: Lis
             - error_message (str): Error description if status is "error"
     """
     try:
-        # Get concerts for user's top artists (top 15)
-        concerts_artists = []
-        for artist in artists:
-            artist_info = _get_artist_info(artist)
-            if artist_info:
-                query_string = _build_artist_query_string(latlong, artist_info["id"], **_build_date_params(date))
-                artist_concerts = _fetch_concerts(query_string, artist_info, limit=15)
-                concerts_artists.extend(artist_concerts)
-            else:
-                # Fallback to keyword search if artist ID not found
-                print(f"Artist ID not found for {artist}, falling back to keyword search")
-                query_string = _build_query_string(latlong, keyword=artist, **_build_date_params(date))
-                artist_concerts = _fetch_concerts(query_string, artist_info, limit=15)
-                concerts_artists.extend(artist_concerts)
-
-        # Create a set of URLs from top artists concerts to avoid duplicates
-        top_artist_urls = {concert['url'] for concert in concerts_artists}
-
-        # Get concerts for user's preferred genre (top 6), excluding duplicates from top artists
-        query_string_genre = _build_query_string(latlong, classificationName=ticketmaster_genre, **_build_date_params(date))
-        all_genre_concerts = _fetch_concerts(query_string_genre, extra_info={'genre': ticketmaster_genre}, limit=20)  # Fetch more to account for filtering
-        concerts_genre = []
-        for concert in all_genre_concerts:
-            if concert['url'] not in top_artist_urls:
-                concerts_genre.append(concert)
-                if len(concerts_genre) >= 6:  # Stop when we have 6 unique concerts
-                    break
-
-        # Get concerts for related artists (top 15), excluding duplicates from top artists
-        concerts_related = []
-        for artist in related_artists:
-            artist_info = _get_artist_info(artist)
-            if artist_info:
-                query_string_related = _build_artist_query_string(latlong, artist_info["id"], **_build_date_params(date))
-                all_related_concerts = _fetch_concerts(query_string_related, artist_info, limit=30)  # Fetch more to account for filtering
-                for concert in all_related_concerts:
-                    if concert['url'] not in top_artist_urls and len(concerts_related) < 15:
-                        concerts_related.append(concert)
-            else:
-                # Fallback to keyword search if artist ID not found
-                print(f"Artist ID not found for related artist {artist}, falling back to keyword search")
-                query_string_related = _build_query_string(latlong, keyword=artist, **_build_date_params(date))
-                all_related_concerts = _fetch_concerts(query_string_related, artist_info, limit=30)  # Fetch more to account for filtering
-                for concert in all_related_concerts:
-                    if concert['url'] not in top_artist_urls and len(concerts_related) < 15:
-                        concerts_related.append(concert)
+        results = await search_concerts(artists, latlong, related_artists, ticketmaster_genre, date)
+        concerts_artists = results["concerts_artists"]
+        concerts_genre = results["concerts_genre"]
+        concerts_related = results["concerts_related"]
 
-        #Save to state
-        current_ticketmaster_concerts = tool_context.state.get("ticketmaster_concerts", [])
-        new_ticketmaster_concerts = current_ticketmaster_concerts + concerts_artists + concerts_genre + concerts_related
-        tool_context.state["ticketmaster_concerts"] = new_ticketmaster_concerts
+        #Save to state (deduplicated by event, capped with the oldest concerts evicted first)
+        update_bounded_state(tool_context.state, "ticketmaster_concerts", concerts_artists + concerts_genre + concerts_related)
         
         return {
             "status": "success",
@@ -262,5 +121,6 @@ ticketmaster_agent = Agent(
     generate_content_config=types.GenerateContentConfig(
         temperature=0.0
     ),
-    before_model_callback=[add_current_date]
+    before_model_callback=[window_history, add_current_date, replay_llm_cassette, lookup_llm_cache],
+    after_model_callback=[record_prompt_tokens, record_token_usage, record_llm_cassette, store_llm_cache]
 )
\ No newline at end of file
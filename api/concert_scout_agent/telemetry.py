@@ -0,0 +1,234 @@
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import os
+
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor, TracerProvider
+from opentelemetry.sdk.resources import Resource
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+except ImportError:
+    Counter = Histogram = None
+
+try:
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+except ImportError:
+    OTLPSpanExporter = None
+
+logger = logging.getLogger(__name__)
+
+# Spans are exported when an OTLP endpoint is configured (and the exporter installed)
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+
+tracer = trace.get_tracer("concert_scout")
+
+AGENT_SPAN_PREFIX = "agent_run ["
+TOOL_SPAN_PREFIX = "execute_tool "
+UPSTREAM_HOST_ATTRIBUTE = "server.address"
+
+if Histogram is not None:
+    STAGE_SECONDS = Histogram(
+        "concert_scout_stage_seconds",
+        "Duration of pipeline stages: the whole pipeline, each agent, LLM call, tool call and upstream HTTP request",
+        ["stage", "name"],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120, 180)
+    )
+    LLM_TOKENS = Counter("concert_scout_llm_tokens", "Tokens used by model calls", ["agent", "kind"])
+    TM_SEARCHES = Counter(
+        "concert_scout_tm_searches",
+        "Concert searches by how much of them the Ticketmaster caches answered: warm (all), partial or cold (none)",
+        ["cache"]
+    )
+else:
+    STAGE_SECONDS = LLM_TOKENS = TM_SEARCHES = None
+
+_provider: Optional[TracerProvider] = None
+
+
+class StageMetricsProcessor(SpanProcessor):
+    """Turns the spans ADK and the HTTP client emit into stage latency histograms.
+
+    LLM and tool spans are labelled with the agent whose agent_run span they run under.
+    """
+
+    def __init__(self):
+        self._agents: Dict[int, str] = {}
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None):
+        if span.name.startswith(AGENT_SPAN_PREFIX):
+            agent = span.name[len(AGENT_SPAN_PREFIX):-1]
+        else:
+            agent = self._agents.get(span.parent.span_id) if span.parent else None
+        if agent:
+            self._agents[span.context.span_id] = agent
+
+    def on_end(self, span: ReadableSpan):
+        agent = self._agents.pop(span.context.span_id, None)
+        if STAGE_SECONDS is None or span.end_time is None:
+            return
+        seconds = (span.end_time - span.start_time) / 1e9
+        if span.name == "invocation":
+            STAGE_SECONDS.labels("pipeline", "pipeline").observe(seconds)
+        elif span.name.startswith(AGENT_SPAN_PREFIX):
+            STAGE_SECONDS.labels("agent", agent).observe(seconds)
+        elif span.name == "call_llm":
+            STAGE_SECONDS.labels("llm", agent or "unknown").observe(seconds)
+        elif span.name.startswith(TOOL_SPAN_PREFIX):
+            STAGE_SECONDS.labels("tool", span.name[len(TOOL_SPAN_PREFIX):]).observe(seconds)
+        elif span.attributes and UPSTREAM_HOST_ATTRIBUTE in span.attributes:
+            STAGE_SECONDS.labels("upstream", span.attributes[UPSTREAM_HOST_ATTRIBUTE]).observe(seconds)
+
+
+# Counters kept in process by the caches, batching loaders and upstream endpoints,
+# exposed at scrape time: name -> (help, label names)
+STATS_COUNTERS = {
+    "concert_scout_cache_lookups": ("Cache lookups by result", ("cache", "result")),
+    "concert_scout_llm_cache_lookups": ("LLM response cache lookups per agent", ("agent", "result")),
+    "concert_scout_batched_keys": ("Keys requested from the batching loaders", ("loader", "kind")),
+    "concert_scout_upstream_requests": ("Upstream requests by outcome", ("endpoint", "kind")),
+}
+CIRCUIT_GAUGE = "concert_scout_upstream_circuit_open"
+CIRCUIT_HELP = "1 while an endpoint's circuit is not closed"
+
+# Seconds between copies of the in-process counters to the multiprocess files
+STATS_SYNC_INTERVAL = 10.0
+
+
+def multiprocess_enabled() -> bool:
+    """Whether metrics are shared between workers through PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py)."""
+    return Histogram is not None and bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def _stats() -> Tuple[Dict[str, Dict[tuple, float]], Dict[str, int]]:
+    """This process's STATS_COUNTERS values by label values, and 1 or 0 per endpoint for its circuit."""
+    from .dataloader import loaders
+    from .llm_cache import llm_cache, llm_cache_stats
+    from .resilience import endpoints
+    from .ticketmaster import search_cache
+
+    counters: Dict[str, Dict[tuple, float]] = {name: {} for name in STATS_COUNTERS}
+    lookups = counters["concert_scout_cache_lookups"]
+    for name, cache in (("llm", llm_cache), ("concert_search", search_cache)):
+        stats = cache.stats()
+        lookups[(name, "local_hit")] = stats["local_hits"]
+        lookups[(name, "redis_hit")] = stats["redis_hits"]
+        lookups[(name, "miss")] = stats["misses"]
+
+    llm_lookups = counters["concert_scout_llm_cache_lookups"]
+    for agent, stats in list(llm_cache_stats.items()):
+        llm_lookups[(agent, "hit")] = stats["hits"]
+        llm_lookups[(agent, "miss")] = stats["misses"]
+
+    batching = counters["concert_scout_batched_keys"]
+    for name, loader in list(loaders.items()):
+        stats = loader.stats()
+        batching[(name, "requested")] = stats["requested"]
+        batching[(name, "deduplicated")] = stats["deduplicated"]
+        batching[(name, "batches")] = stats["batches"]
+
+    upstream = counters["concert_scout_upstream_requests"]
+    circuits = {}
+    for name, endpoint in list(endpoints.items()):
+        upstream[(name, "sent")] = endpoint.requests
+        upstream[(name, "hedge")] = endpoint.hedges
+        upstream[(name, "failure")] = endpoint.failures
+        upstream[(name, "fallback")] = endpoint.fallbacks
+        circuits[name] = 0 if endpoint.breaker.state == "closed" else 1
+    return counters, circuits
+
+
+class StatsCollector:
+    """Exposes the in-process cache, batching and upstream counters at scrape time (single process)."""
+
+    def collect(self):
+        counters, circuits = _stats()
+        for name, (documentation, labels) in STATS_COUNTERS.items():
+            family = CounterMetricFamily(name, documentation, labels=labels)
+            for values, value in counters[name].items():
+                family.add_metric(list(values), value)
+            yield family
+        circuit = GaugeMetricFamily(CIRCUIT_GAUGE, CIRCUIT_HELP, labels=["endpoint"])
+        for name, state in circuits.items():
+            circuit.add_metric([name], state)
+        yield circuit
+
+
+class StatsSync:
+    """Copies the in-process counters into prometheus_client metrics (multiprocess).
+
+    Under gunicorn each worker writes its metrics to files that the scraped
+    worker sums, so the counters are added to real Counters by how much they
+    grew since the last sync. The circuit gauge takes the max over live workers.
+    """
+
+    def __init__(self):
+        self.counters = {name: Counter(name, documentation, labels) for name, (documentation, labels) in STATS_COUNTERS.items()}
+        self.circuit = Gauge(CIRCUIT_GAUGE, CIRCUIT_HELP, ["endpoint"], multiprocess_mode="livemax")
+        self._synced: Dict[Tuple[str, tuple], float] = {}
+
+    def sync(self):
+        counters, circuits = _stats()
+        for name, samples in counters.items():
+            for values, value in samples.items():
+                grown = value - self._synced.get((name, values), 0)
+                if grown > 0:
+                    self.counters[name].labels(*values).inc(grown)
+                self._synced[(name, values)] = value
+        for name, state in circuits.items():
+            self.circuit.labels(name).set(state)
+
+
+_stats_sync: Optional[StatsSync] = None
+
+
+def metrics_registry():
+    """The registry /metrics renders: every worker's metrics in multiprocess mode, else this process's."""
+    if _stats_sync is None:
+        return REGISTRY
+    _stats_sync.sync()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+async def run_stats_sync():
+    """Copy the in-process counters to the multiprocess files every STATS_SYNC_INTERVAL seconds."""
+    if _stats_sync is None:
+        return
+    while True:
+        await asyncio.sleep(STATS_SYNC_INTERVAL)
+        try:
+            _stats_sync.sync()
+        except Exception as e:
+            logger.warning(f"Metrics sync failed: {e}")
+
+
+def setup_telemetry(service_name: str = "concert-scout-api"):
+    """Install the tracer provider once per process: stage metrics always, OTLP export when configured."""
+    global _provider, _stats_sync
+    if _provider is not None:
+        return
+    _provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    _provider.add_span_processor(StageMetricsProcessor())
+    if OTLP_ENDPOINT:
+        if OTLPSpanExporter is None:
+            logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-exporter-otlp-proto-http is not installed")
+        else:
+            _provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            logger.info(f"Exporting traces to {OTLP_ENDPOINT}")
+    trace.set_tracer_provider(_provider)
+    if multiprocess_enabled():
+        _stats_sync = StatsSync()
+    elif Histogram is not None:
+        REGISTRY.register(StatsCollector())
+
+
+def shutdown_telemetry():
+    """Flush spans that are still buffered."""
+    if _provider is not None:
+        _provider.shutdown()
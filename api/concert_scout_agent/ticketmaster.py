@@ -0,0 +1,440 @@
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from .cache import TieredCache
+from . import cassette as cassettes
+from .cassette import cassette
+from .dataloader import DataLoader
+from .event_store import event_store
+from .event_page import decode_event_page, select_image
+from .http_client import TM_BASE_URL
+from .resilience import resilient_get_json
+from .quota import tm_quota
+from .telemetry import TM_SEARCHES
+from .warmer import popularity
+
+TM_KEY = os.getenv("TM_KEY")
+# Must match the 'size' the query strings ask for
+TM_PAGE_SIZE = 200
+# Seconds lookups wait to be batched with lookups from other requests
+TM_BATCH_WINDOW = float(os.getenv("TM_BATCH_WINDOW", "0.05"))
+# Attraction ids combined into one events call
+TM_MAX_ATTRACTIONS_PER_CALL = 10
+
+async def _tm_get(url: str) -> dict:
+    """GET a Ticketmaster Discovery API url within the quota, hedging slow calls and falling back to the last good response."""
+    return await resilient_get_json(url, quota=tm_quota)
+
+async def _tm_get_events(url: str, with_page: bool = False) -> dict:
+    """Like _tm_get for an events search, keeping only the event fields the tools read (and the paging totals with with_page)."""
+    decode = (lambda body: decode_event_page(body, with_page=True)) if with_page else decode_event_page
+    return await resilient_get_json(url, quota=tm_quota, decode=decode)
+
+def _artist_key(artist_name: str) -> str:
+    return artist_name.strip().lower()
+
+async def _lookup_artist_info(artist_name: str) -> Optional[dict]:
+    """Get the artist id from the artist name."""
+    try:
+        attraction_url = f"{TM_BASE_URL}/discovery/v2/attractions?apikey={TM_KEY}&keyword={artist_name}&sort=relevance,desc"
+        response = await _tm_get(attraction_url)
+        attractions = response.get("_embedded", {}).get("attractions", [])
+        if attractions:
+            attraction = attractions[0]
+            return {
+                "id": attraction.get("id"),
+                "genre": attraction.get("classifications", [{}])[0].get("genre", {}).get("name")
+            }
+        # Not on Ticketmaster (empty, so it can be cached, unlike a failed lookup)
+        return {}
+    except Exception as e:
+        print(f"Error getting artist info for {artist_name}: {e}")
+        return None
+
+async def _load_artist_infos(artist_names: List[str]) -> Dict[str, Optional[dict]]:
+    # The attractions endpoint takes one keyword, so a batch is just its unique names fetched concurrently
+    infos = await asyncio.gather(*(_lookup_artist_info(name) for name in artist_names))
+    return dict(zip(artist_names, infos))
+
+async def _load_artist_events(keys: List[tuple]) -> Dict[tuple, List[dict]]:
+    """Fetch events for (latlong, date, attraction id) keys, combining ids that share a location and date range."""
+    groups: Dict[tuple, List[str]] = {}
+    for latlong, date, attraction_id in keys:
+        groups.setdefault((latlong, date), []).append(attraction_id)
+
+    async def fetch_group(latlong: tuple, date: Optional[tuple], attraction_ids: List[str]) -> Dict[str, List[dict]]:
+        query_string = _build_artist_query_string(list(latlong), ",".join(attraction_ids), **_build_date_params(date))
+        url = f'{TM_BASE_URL}/discovery/v2/events?apikey={TM_KEY}&{query_string}'
+        if cassettes.replaying() and not cassettes.has_http("GET", url):
+            return await _replay_artist_events(latlong, date, attraction_ids)
+        start = time.perf_counter()
+        response = await _tm_get_events(url)
+        events = response.get("_embedded", {}).get("events", [])
+        if len(attraction_ids) > 1 and len(events) >= TM_PAGE_SIZE:
+            # A full page may have cut off some artists' events; ask for each artist on its own
+            results = await asyncio.gather(*(fetch_group(latlong, date, [attraction_id]) for attraction_id in attraction_ids))
+            return {attraction_id: result[attraction_id] for attraction_id, result in zip(attraction_ids, results)}
+
+        # Hand each artist the events it performs at, keeping the relevance order
+        by_attraction = {attraction_id: [] for attraction_id in attraction_ids}
+        for event in events:
+            for attraction in event.get("_embedded", {}).get("attractions", []):
+                if attraction.get("id") in by_attraction:
+                    by_attraction[attraction["id"]].append(event)
+        if cassettes.recording():
+            for attraction_id, attraction_events in by_attraction.items():
+                cassette.record(
+                    "tm_artist_events", _artist_events_cassette_key(latlong, date, attraction_id),
+                    json.dumps(attraction_events), time.perf_counter() - start
+                )
+        return by_attraction
+
+    calls = []
+    for (latlong, date), attraction_ids in groups.items():
+        for i in range(0, len(attraction_ids), TM_MAX_ATTRACTIONS_PER_CALL):
+            calls.append((latlong, date, attraction_ids[i:i + TM_MAX_ATTRACTIONS_PER_CALL]))
+    results = await asyncio.gather(*(fetch_group(*call) for call in calls), return_exceptions=True)
+
+    # A failed call leaves its keys out, so only the artists in it come back empty
+    events_by_key = {}
+    for (latlong, date, attraction_ids), result in zip(calls, results):
+        if isinstance(result, Exception):
+            print(f"Error fetching concerts for attractions {attraction_ids}: {result}")
+            continue
+        for attraction_id, events in result.items():
+            events_by_key[(latlong, date, attraction_id)] = events
+    return events_by_key
+
+def _artist_events_cassette_key(latlong: tuple, date: Optional[tuple], attraction_id: str) -> str:
+    return json.dumps([list(latlong), list(date) if date else None, attraction_id])
+
+async def _replay_artist_events(latlong: tuple, date: Optional[tuple], attraction_ids: List[str]) -> Dict[str, List[dict]]:
+    """Each artist's recorded events, for a replay whose requests overlap differently than the recording's.
+
+    Which ids share a call depends on the requests in flight at the time, so a
+    combined call may not be in the cassette even though every artist in it is.
+    """
+    recorded = [cassette.take("tm_artist_events", _artist_events_cassette_key(latlong, date, attraction_id)) for attraction_id in attraction_ids]
+    await asyncio.sleep(max(cassette.delay(entry) for entry, _ in recorded))
+    return {attraction_id: json.loads(body) for attraction_id, (_, body) in zip(attraction_ids, recorded)}
+
+async def _load_events(query_strings: List[str]) -> Dict[str, List[dict]]:
+    # Keyword and genre searches can't be combined; the batch only removes duplicate queries
+    responses = await asyncio.gather(*(
+        _tm_get_events(f'{TM_BASE_URL}/discovery/v2/events?apikey={TM_KEY}&{query_string}')
+        for query_string in query_strings
+    ), return_exceptions=True)
+    events_by_query = {}
+    for query_string, response in zip(query_strings, responses):
+        if isinstance(response, Exception):
+            print(f"Error fetching concerts: {response}")
+            continue
+        events_by_query[query_string] = response.get("_embedded", {}).get("events", [])
+    return events_by_query
+
+# Lookups from every concurrent pipeline are collected for TM_BATCH_WINDOW seconds and sent together
+artist_info_loader = DataLoader(_load_artist_infos, window=TM_BATCH_WINDOW, name="tm_attractions")
+artist_events_loader = DataLoader(_load_artist_events, window=TM_BATCH_WINDOW, name="tm_artist_events")
+events_loader = DataLoader(_load_events, window=TM_BATCH_WINDOW, name="tm_events")
+
+# Per-lookup caches shared by live searches and the cache warmer. Attraction ids
+# rarely change; event listings are kept as long as aggregated search results,
+# or TM_WARM_TTL when the warmer fetched them. Off while a cassette is active.
+TM_ATTRACTION_CACHE_TTL = 0 if cassette else int(os.getenv("TM_ATTRACTION_CACHE_TTL", "86400"))
+TM_EVENTS_CACHE_TTL = 0 if cassette else int(os.getenv("TM_EVENTS_CACHE_TTL", "900"))
+TM_WARM_TTL = int(os.getenv("TM_WARM_TTL", "21600"))
+# The most events any search takes from one lookup; only these are cached
+TM_MAX_CACHED_EVENTS = 30
+attraction_cache = TieredCache("tm_attraction", max_items=4096, local_ttl=TM_ATTRACTION_CACHE_TTL)
+events_cache = TieredCache("tm_events", max_items=2048, local_ttl=max(TM_EVENTS_CACHE_TTL, TM_WARM_TTL))
+
+class LookupTally:
+    """Ticketmaster lookups answered by the caches and sent upstream, for one search or warm run."""
+
+    def __init__(self):
+        self.cached = 0
+        self.fetched = 0
+
+# Set by search_concerts and the warmer; the lookups they start count into it
+_lookup_tally: ContextVar[Optional[LookupTally]] = ContextVar("tm_lookup_tally", default=None)
+
+def _count_lookup(cached: bool):
+    tally = _lookup_tally.get()
+    if tally is not None:
+        if cached:
+            tally.cached += 1
+        else:
+            tally.fetched += 1
+
+async def _get_artist_info(artist_name: str, refresh: bool = False) -> Optional[dict]:
+    """Get the artist id from the artist name ({} if Ticketmaster has no such artist, None if the lookup failed)."""
+    key = _artist_key(artist_name)
+    if TM_ATTRACTION_CACHE_TTL and not refresh:
+        cached = await attraction_cache.get(key)
+        if cached is not None:
+            _count_lookup(cached=True)
+            return json.loads(cached)
+    _count_lookup(cached=False)
+    artist_info = await artist_info_loader.load(key)
+    if artist_info is not None and TM_ATTRACTION_CACHE_TTL:
+        await attraction_cache.set(key, json.dumps(artist_info), TM_ATTRACTION_CACHE_TTL)
+    return artist_info
+
+async def _cached_events(key: str, load: Callable[[], Awaitable[Optional[List[dict]]]], ttl: Optional[float], refresh: bool) -> List[dict]:
+    """The extracted events of one lookup, from events_cache unless refreshing. Failed loads (None) are not cached."""
+    if TM_EVENTS_CACHE_TTL and not refresh:
+        cached = await events_cache.get(key)
+        if cached is not None:
+            _count_lookup(cached=True)
+            return json.loads(cached)
+    _count_lookup(cached=False)
+    events = await load()
+    if events is None:
+        return []
+    extracted = [_extract_event_info(event) for event in events[:TM_MAX_CACHED_EVENTS]]
+    if TM_EVENTS_CACHE_TTL:
+        await events_cache.set(key, json.dumps(extracted), ttl or TM_EVENTS_CACHE_TTL)
+    return extracted
+
+def _extract_event_info(event: dict) -> dict:
+    """Extract relevant event information from Ticketmaster API response."""
+    venue = event['_embedded']['venues'][0]
+    image = select_image(event.get('images', []))
+    return {
+        'venue_name': venue.get('name', 'Venue information not available'),
+        'city_name': venue.get('city', {}).get('name', 'City information not available'),
+        'name': event['name'],
+        'date': event['dates']['start']['localDate'],
+        'time': event['dates']['start'].get('localTime', # some events don't have localTime, use fallbacks
+                                            event['dates']['start'].get('dateTime', 'Time information not available')),
+        'url': event['url'],
+        'image_url': image.get('url') if image else None
+    }
+
+def _build_date_params(date: Optional[List[str]]) -> dict:
+    """Build date parameters for Ticketmaster API calls."""
+    if not date or len(date) < 2:
+        return {}
+
+    params = {}
+    params['localStartEndDateTime'] = f'{date[0]},{date[1]}'
+    return params
+
+def _build_query_string(latlong: List[str], **kwargs) -> str:
+    """Build query string for Ticketmaster API with common parameters."""
+    base_params = {
+        'latlong': f"{latlong[0]},{latlong[1]}",
+        'radius': '100',
+        'unit': 'miles',
+        'segmentName': 'Music',
+        'size': '200',
+        'sort': 'relevance,desc'
+    }
+    base_params.update(kwargs)
+    
+    # Filter out None values to avoid API issues
+    filtered_params = {k: v for k, v in base_params.items() if v is not None}
+    
+    return '&'.join([f"{k}={v}" for k, v in filtered_params.items()])
+
+def _build_artist_query_string(latlong: List[str], artist_id: str, **kwargs) -> str:
+    """Build query string for Ticketmaster API with artist ID parameter."""
+    base_params = {
+        'latlong': f"{latlong[0]},{latlong[1]}",
+        'radius': '100',
+        'unit': 'miles',
+        'segmentName': 'Music',
+        'size': '200',
+        'sort': 'relevance,desc',
+        'attractionId': artist_id
+    }
+    base_params.update(kwargs)
+    
+    # Filter out None values to avoid API issues
+    filtered_params = {k: v for k, v in base_params.items() if v is not None}
+    
+    return '&'.join([f"{k}={v}" for k, v in filtered_params.items()])
+
+def _stored_events(query_string: str, limit: Optional[int], refresh: bool) -> Optional[List[dict]]:
+    """Every event a query matches, from the local event store, or None when the store is off,
+    doesn't cover it, or holds more than `limit` matches (it can't rank them by relevance)."""
+    if event_store is None or refresh:
+        return None
+    events = event_store.search(query_string, limit or TM_MAX_CACHED_EVENTS)
+    if events is not None:
+        _count_lookup(cached=True)
+    return events
+
+async def _fetch_concerts(query_string: str, extra_info: Optional[dict], limit: int = None, ttl: Optional[float] = None, refresh: bool = False, use_store: bool = True) -> List[dict]:
+    """Fetch concerts from Ticketmaster API and extract event information."""
+    try:
+        events = _stored_events(query_string, limit, refresh) if use_store else None
+        if events is None:
+            events = await _cached_events(f"query:{query_string}", lambda: events_loader.load(query_string), ttl, refresh)
+        if limit:
+            events = events[:limit]
+
+        genre = (extra_info or {}).get('genre')
+        return [{**event, 'genre': genre} for event in events]
+    except Exception as e:
+        print(f"Error fetching concerts: {e}")
+        return []
+
+async def _fetch_artist_concerts(latlong: List[str], artist_info: dict, date: Optional[List[str]], limit: int = None, ttl: Optional[float] = None, refresh: bool = False, use_store: bool = True) -> List[dict]:
+    """Fetch concerts for a known Ticketmaster attraction, batched with other lookups for the same location and dates."""
+    try:
+        date_key = tuple(date[:2]) if date and len(date) >= 2 else None
+        events = None
+        if use_store:
+            events = _stored_events(_build_artist_query_string(latlong, artist_info["id"], **_build_date_params(date)), limit, refresh)
+        if events is None:
+            loader_key = (tuple(latlong), date_key, artist_info["id"])
+            events = await _cached_events(
+                f"artist:{json.dumps([list(latlong), date_key, artist_info['id']])}", lambda: artist_events_loader.load(loader_key), ttl, refresh
+            )
+        if limit:
+            events = events[:limit]
+
+        return [{**event, 'genre': artist_info.get('genre')} for event in events]
+    except Exception as e:
+        print(f"Error fetching concerts: {e}")
+        return []
+
+async def _fetch_concerts_for_artist(artist: str, latlong: List[str], date: Optional[List[str]], limit: int, label: str = "artist", ttl: Optional[float] = None, refresh: bool = False, use_store: bool = True) -> List[dict]:
+    artist_info = await _get_artist_info(artist)
+    if artist_info:
+        return await _fetch_artist_concerts(latlong, artist_info, date, limit=limit, ttl=ttl, refresh=refresh, use_store=use_store)
+    # Fallback to keyword search if artist ID not found
+    print(f"Artist ID not found for {label} {artist}, falling back to keyword search")
+    query_string = _build_query_string(latlong, keyword=artist, **_build_date_params(date))
+    return await _fetch_concerts(query_string, artist_info, limit=limit, ttl=ttl, refresh=refresh, use_store=use_store)
+
+# Aggregated search results are reused for identical searches for this long.
+# Off while a cassette records or replays, so every call reaches it.
+TM_SEARCH_CACHE_TTL = 0 if cassette else int(os.getenv("TM_SEARCH_CACHE_TTL", "900"))
+search_cache = TieredCache("concert_search", max_items=1024, local_ttl=TM_SEARCH_CACHE_TTL)
+
+async def _no_concerts() -> List[dict]:
+    return []
+
+class SearchStats:
+    """Live searches in flight, and how many were answered warm (all from cache), partly or cold."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.counts = {"warm": 0, "partial": 0, "cold": 0}
+
+    def record(self, tally: LookupTally):
+        if not tally.fetched:
+            kind = "warm"
+        elif tally.cached:
+            kind = "partial"
+        else:
+            kind = "cold"
+        self.counts[kind] += 1
+        if TM_SEARCHES is not None:
+            TM_SEARCHES.labels(kind).inc()
+
+    def stats(self) -> dict:
+        searches = sum(self.counts.values())
+        return {
+            **self.counts,
+            "in_flight": self.in_flight,
+            "warm_fraction": round(self.counts["warm"] / searches, 3) if searches else 0.0,
+        }
+
+search_stats = SearchStats()
+
+def _exclude_concerts(concert_lists: Iterable[List[dict]], exclude_urls: Set[str], limit: int) -> List[dict]:
+    """The first `limit` concerts across the lists, in order, whose URL is not in exclude_urls."""
+    concerts = []
+    for concert_list in concert_lists:
+        for concert in concert_list:
+            if concert['url'] not in exclude_urls:
+                concerts.append(concert)
+                if len(concerts) >= limit:
+                    return concerts
+    return concerts
+
+def _cut_list(concert_lists: List[List[dict]], exclude_urls: Set[str], limit: int) -> Optional[int]:
+    """The index of the list _exclude_concerts would keep only part of, which makes that list's order matter."""
+    kept = 0
+    for index, concert_list in enumerate(concert_lists):
+        if kept >= limit:
+            return None
+        remaining = sum(1 for concert in concert_list if concert['url'] not in exclude_urls)
+        if kept + remaining > limit:
+            return index
+        kept += remaining
+    return None
+
+async def search_concerts(artists: List[str], latlong: List[str], related_artists: List[str], genre: Optional[str] = None, date: Optional[List[str]] = None) -> Dict[str, List[dict]]:
+    """Concerts near latlong for the artists, the genre and the related artists, without duplicates of the artists' concerts.
+
+    Returns concerts_artists (up to 15 per artist), concerts_genre (up to 6)
+    and concerts_related (up to 15).
+    """
+    # What users search for is what the cache warmer fetches ahead of time
+    popularity.record(latlong, [_artist_key(artist) for artist in artists + related_artists], genre)
+    tally = LookupTally()
+    key = hashlib.sha256(json.dumps([artists, latlong, related_artists, genre, date]).encode("utf-8")).hexdigest()
+    cached = await search_cache.get(key) if TM_SEARCH_CACHE_TTL else None
+    if cached is not None:
+        search_stats.record(tally)
+        return json.loads(cached)
+
+    # All lookups run concurrently so they can share batches with each other and with other requests
+    token = _lookup_tally.set(tally)
+    search_stats.in_flight += 1
+    try:
+        if genre:
+            query_string_genre = _build_query_string(latlong, classificationName=genre, **_build_date_params(date))
+            genre_lookup = _fetch_concerts(query_string_genre, extra_info={'genre': genre}, limit=20)
+        else:
+            genre_lookup = _no_concerts()
+        artist_results, all_genre_concerts, related_results = await asyncio.gather(
+            # Concerts for user's top artists (top 15 each)
+            asyncio.gather(*(_fetch_concerts_for_artist(artist, latlong, date, limit=15) for artist in artists)),
+            # Concerts for user's preferred genre, fetching more to account for filtering
+            genre_lookup,
+            # Concerts for related artists, fetching more to account for filtering
+            asyncio.gather(*(_fetch_concerts_for_artist(artist, latlong, date, limit=30, label="related artist") for artist in related_artists)),
+        )
+        concerts_artists = [concert for artist_concerts in artist_results for concert in artist_concerts]
+
+        # Create a set of URLs from top artists concerts to avoid duplicates
+        top_artist_urls = {concert['url'] for concert in concerts_artists}
+
+        if event_store is not None:
+            # The event store answers with every match, soonest first. Where only part of a
+            # list is kept below, the relevance order decides which part, so that list is
+            # taken from Ticketmaster (usually a cache hit when it came from there already).
+            if genre and _cut_list([all_genre_concerts], top_artist_urls, 6) is not None:
+                all_genre_concerts = await _fetch_concerts(query_string_genre, extra_info={'genre': genre}, limit=20, use_store=False)
+            cut = _cut_list(related_results, top_artist_urls, 15)
+            if cut is not None:
+                related_results[cut] = await _fetch_concerts_for_artist(
+                    related_artists[cut], latlong, date, limit=30, label="related artist", use_store=False
+                )
+    finally:
+        search_stats.in_flight -= 1
+        _lookup_tally.reset(token)
+    search_stats.record(tally)
+
+    # Keep the top 6 genre concerts and the top 15 related artist concerts, excluding duplicates from top artists
+    concerts_genre = _exclude_concerts([all_genre_concerts], top_artist_urls, limit=6)
+    concerts_related = _exclude_concerts(related_results, top_artist_urls, limit=15)
+
+    results = {
+        "concerts_artists": concerts_artists,
+        "concerts_genre": concerts_genre,
+        "concerts_related": concerts_related
+    }
+    if TM_SEARCH_CACHE_TTL and (concerts_artists or concerts_genre or concerts_related):
+        await search_cache.set(key, json.dumps(results), TM_SEARCH_CACHE_TTL)
+    return results
@@ -0,0 +1,170 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import threading
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmResponse
+
+from .telemetry import LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens: (prompt, completion)
+MODEL_PRICES = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+USAGE_SCOPES = ("agent", "session", "user")
+USAGE_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cost_usd")
+
+# Session and user totals in Redis expire this long after their last update
+USAGE_TTL = 30 * 86400
+USAGE_FLUSH_INTERVAL = 10.0
+# Entries kept in each ranking, by tokens used
+USAGE_MAX_RANKED = 10000
+# While Redis is unreachable, per-session increments beyond this many keys are dropped
+USAGE_MAX_PENDING = 50000
+
+
+def _usage_key(scope: str, name: str) -> str:
+    return f"usage:{scope}:{name}"
+
+
+def _ranking_key(scope: str) -> str:
+    return f"usage:top:{scope}"
+
+
+def model_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+class UsageCounters:
+    """Token and cost totals per agent, session and user.
+
+    Recording only adds to dicts; the increments since the last flush are kept
+    apart so they can be added to the shared Redis totals in one round-trip.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: dict.fromkeys(USAGE_FIELDS, 0))
+
+    def record(self, agent: str, session_id: str, user_id: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        with self._lock:
+            for key in (("agent", agent), ("session", session_id), ("user", user_id)):
+                totals = self._pending[key]
+                totals["calls"] += 1
+                totals["prompt_tokens"] += prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+                totals["cost_usd"] += cost
+
+    def take_pending(self) -> Dict[Tuple[str, str], Dict[str, float]]:
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: dict.fromkeys(USAGE_FIELDS, 0))
+        return pending
+
+    def restore_pending(self, pending: Dict[Tuple[str, str], Dict[str, float]]):
+        """Put back increments that could not be flushed."""
+        with self._lock:
+            for key, increments in pending.items():
+                if key[0] == "session" and key not in self._pending and len(self._pending) >= USAGE_MAX_PENDING:
+                    continue
+                totals = self._pending[key]
+                for field, value in increments.items():
+                    totals[field] += value
+
+
+usage_counters = UsageCounters()
+
+
+def record_token_usage(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    """Count the tokens and cost of every model call against its agent, session and user."""
+    usage = llm_response.usage_metadata
+    if not usage or llm_response.partial:
+        return None
+    agent = callback_context.agent_name
+    prompt_tokens = usage.prompt_token_count or 0
+    completion_tokens = usage.candidates_token_count or 0
+    if LLM_TOKENS is not None:
+        LLM_TOKENS.labels(agent, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(agent, "completion").inc(completion_tokens)
+
+    invocation = callback_context._invocation_context
+    model = getattr(invocation.agent, "model", "")
+    if not isinstance(model, str):
+        model = getattr(model, "model", "")
+    usage_counters.record(
+        agent, invocation.session.id, invocation.user_id,
+        prompt_tokens, completion_tokens, model_cost(model, prompt_tokens, completion_tokens)
+    )
+    return None
+
+
+async def flush_usage(redis):
+    """Add the increments recorded since the last flush to the Redis totals and rankings."""
+    pending = usage_counters.take_pending()
+    if not pending:
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for (scope, name), increments in pending.items():
+                key = _usage_key(scope, name)
+                for field in ("calls", "prompt_tokens", "completion_tokens"):
+                    pipe.hincrby(key, field, int(increments[field]))
+                pipe.hincrbyfloat(key, "cost_usd", increments["cost_usd"])
+                pipe.zincrby(_ranking_key(scope), increments["prompt_tokens"] + increments["completion_tokens"], name)
+                if scope != "agent":
+                    pipe.expire(key, USAGE_TTL)
+            for scope in ("session", "user"):
+                pipe.zremrangebyrank(_ranking_key(scope), 0, -(USAGE_MAX_RANKED + 1))
+            await pipe.execute()
+    except Exception:
+        usage_counters.restore_pending(pending)
+        raise
+
+
+async def run_usage_flusher(get_redis):
+    """Flush token usage to Redis every USAGE_FLUSH_INTERVAL seconds, and once more on cancel."""
+    try:
+        while True:
+            await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+            try:
+                await flush_usage(await get_redis())
+            except Exception as e:
+                logger.warning(f"Token usage flush failed, will retry: {e}")
+    except asyncio.CancelledError:
+        try:
+            await flush_usage(await get_redis())
+        except Exception as e:
+            logger.warning(f"Final token usage flush failed: {e}")
+        raise
+
+
+def _parse_usage(fields: Dict[str, str]) -> Dict[str, float]:
+    return {
+        "calls": int(fields.get("calls", 0)),
+        "prompt_tokens": int(fields.get("prompt_tokens", 0)),
+        "completion_tokens": int(fields.get("completion_tokens", 0)),
+        "cost_usd": round(float(fields.get("cost_usd", 0)), 6),
+    }
+
+
+async def get_usage(redis, scope: str, name: Optional[str] = None, limit: int = 50) -> List[dict]:
+    """Totals for one agent, session or user, or the top `limit` by tokens used."""
+    if name is not None:
+        names = [name]
+    else:
+        names = await redis.zrevrange(_ranking_key(scope), 0, limit - 1)
+    if not names:
+        return []
+    async with redis.pipeline(transaction=False) as pipe:
+        for item in names:
+            pipe.hgetall(_usage_key(scope, item))
+        results = await pipe.execute()
+    return [{scope: item, **_parse_usage(fields)} for item, fields in zip(names, results) if fields]
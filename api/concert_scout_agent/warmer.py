@@ -0,0 +1,297 @@
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from .cache import get_cache_redis
+from .quota import tm_quota
+
+logger = logging.getLogger(__name__)
+
+CACHE_WARM_ENABLED = os.getenv("CACHE_WARM_ENABLED", "false").lower() == "true"
+# Local hours the warmer may run in, START-END (may wrap past midnight; 0-24 is any time)
+CACHE_WARM_HOURS = os.getenv("CACHE_WARM_HOURS", "2-6")
+# A warm run starts at most this often, across all workers sharing Redis
+CACHE_WARM_INTERVAL = float(os.getenv("CACHE_WARM_INTERVAL", "3600"))
+# Share of the Ticketmaster request rate, and of the quota left, one run may use
+CACHE_WARM_RATE_SHARE = float(os.getenv("CACHE_WARM_RATE_SHARE", "0.2"))
+# How many of the most searched artists (attraction ids) and metros are warmed,
+# and how many metro/artist and metro/genre event searches in those metros
+CACHE_WARM_TOP_ARTISTS = int(os.getenv("CACHE_WARM_TOP_ARTISTS", "200"))
+CACHE_WARM_TOP_METROS = int(os.getenv("CACHE_WARM_TOP_METROS", "20"))
+CACHE_WARM_TOP_SEARCHES = int(os.getenv("CACHE_WARM_TOP_SEARCHES", "300"))
+
+POPULARITY_KINDS = ("artist", "metro", "metro_artist", "metro_genre")
+# Scores are multiplied by this after every run, so the rankings follow recent demand
+POPULARITY_DECAY = 0.5
+# Members kept per ranking
+POPULARITY_MAX_TRACKED = 5000
+POPULARITY_FLUSH_INTERVAL = 10.0
+# Seconds between checks while live searches or queued Ticketmaster calls hold the warmer back
+WARM_IDLE_WAIT = 1.0
+WARM_LOCK_KEY = "warm:lock"
+
+_start_hour, _, _end_hour = CACHE_WARM_HOURS.partition("-")
+WARM_START_HOUR, WARM_END_HOUR = int(_start_hour), int(_end_hour)
+
+
+def _popularity_key(kind: str) -> str:
+    return f"warm:top:{kind}"
+
+
+def off_peak(now: Optional[datetime] = None) -> bool:
+    hour = (now or datetime.now()).hour
+    if WARM_START_HOUR <= WARM_END_HOUR:
+        return WARM_START_HOUR <= hour < WARM_END_HOUR
+    return hour >= WARM_START_HOUR or hour < WARM_END_HOUR
+
+
+class PopularityTracker:
+    """How often each artist, metro and metro/artist or metro/genre pair is searched.
+
+    Counts go to this worker's totals, which rank them when Redis is not
+    configured, and to increments flushed to sorted sets shared by every
+    worker (like token usage).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Counter] = {kind: Counter() for kind in POPULARITY_KINDS}
+        self.totals: Dict[str, Counter] = {kind: Counter() for kind in POPULARITY_KINDS}
+
+    def record(self, latlong: List[str], artist_keys: List[str], genre: Optional[str]):
+        """Count one search. Members keep the coordinates as the agent gave them, so warmed lookups match its searches."""
+        if not latlong or len(latlong) < 2:
+            return
+        lat, lng = str(latlong[0]), str(latlong[1])
+        members = [("metro", json.dumps([lat, lng]))]
+        for artist in artist_keys:
+            members.append(("artist", artist))
+            members.append(("metro_artist", json.dumps([lat, lng, artist])))
+        if genre:
+            members.append(("metro_genre", json.dumps([lat, lng, genre])))
+        with self._lock:
+            for kind, member in members:
+                self._pending[kind][member] += 1
+                self.totals[kind][member] += 1
+                if len(self.totals[kind]) > 2 * POPULARITY_MAX_TRACKED:
+                    self.totals[kind] = Counter(dict(self.totals[kind].most_common(POPULARITY_MAX_TRACKED)))
+
+    def take_pending(self) -> Dict[str, Counter]:
+        with self._lock:
+            pending, self._pending = self._pending, {kind: Counter() for kind in POPULARITY_KINDS}
+        return pending
+
+    def restore_pending(self, pending: Dict[str, Counter]):
+        """Put back counts that could not be flushed, dropping new members beyond POPULARITY_MAX_TRACKED."""
+        with self._lock:
+            for kind, counts in pending.items():
+                current = self._pending[kind]
+                for member, count in counts.items():
+                    if member in current or len(current) < POPULARITY_MAX_TRACKED:
+                        current[member] += count
+
+    def decay(self):
+        with self._lock:
+            for kind, counts in self.totals.items():
+                self.totals[kind] = Counter({member: count * POPULARITY_DECAY for member, count in counts.most_common(POPULARITY_MAX_TRACKED)})
+
+    def top(self, kind: str, limit: int) -> List[Tuple[str, float]]:
+        with self._lock:
+            return self.totals[kind].most_common(limit)
+
+
+popularity = PopularityTracker()
+
+
+async def flush_popularity(redis):
+    """Add the searches counted since the last flush to the shared rankings."""
+    pending = popularity.take_pending()
+    if not any(pending.values()):
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for kind, counts in pending.items():
+                for member, count in counts.items():
+                    pipe.zincrby(_popularity_key(kind), count, member)
+            await pipe.execute()
+    except Exception:
+        popularity.restore_pending(pending)
+        raise
+
+
+async def popular(redis, kind: str, limit: int) -> List[Tuple[str, float]]:
+    """The most searched members of a kind with their scores, from Redis when it is available."""
+    if redis is not None:
+        try:
+            return await redis.zrevrange(_popularity_key(kind), 0, limit - 1, withscores=True)
+        except Exception as e:
+            logger.warning(f"Reading search popularity from Redis failed, using this worker's: {e}")
+    return popularity.top(kind, limit)
+
+
+async def decay_popularity(redis):
+    popularity.decay()
+    if redis is None:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        for kind in POPULARITY_KINDS:
+            key = _popularity_key(kind)
+            pipe.zunionstore(key, {key: POPULARITY_DECAY})
+            pipe.zremrangebyrank(key, 0, -(POPULARITY_MAX_TRACKED + 1))
+        await pipe.execute()
+
+
+class WarmStopped(Exception):
+    """Raised to end a warm run early: off-peak hours ended or its share of the quota is used."""
+
+
+class CacheWarmer:
+    """Fetches what users search most into the Ticketmaster caches ahead of time.
+
+    A run refreshes the attraction ids of the most searched artists, then the
+    event listings of the most searched artists and genres in the most searched
+    metros, through the same lookups live searches use. It only runs off-peak,
+    waits while this worker has live searches or queued Ticketmaster calls, and
+    spaces its calls to CACHE_WARM_RATE_SHARE of the request rate.
+    """
+
+    def __init__(self):
+        self.running = False
+        self.runs = 0
+        self.last_run: Optional[dict] = None
+        self._next_call = 0.0
+
+    async def _wait_for_turn(self, tally, budget: Optional[int]):
+        """Wait until live traffic is idle and the warmer's share of the rate allows another call."""
+        from .ticketmaster import search_stats
+
+        while True:
+            if budget is not None and tally.fetched >= budget:
+                raise WarmStopped("quota share used")
+            if not off_peak():
+                raise WarmStopped("off-peak hours ended")
+            wait = self._next_call - time.monotonic()
+            if search_stats.in_flight or tm_quota.saturated:
+                wait = max(wait, WARM_IDLE_WAIT)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def _lookup(self, tally, budget: Optional[int], lookup: Callable[[], Awaitable]):
+        await self._wait_for_turn(tally, budget)
+        fetched = tally.fetched
+        await lookup()
+        # Lookups answered from the caches cost nothing; calls are spaced to the warmer's share
+        share = CACHE_WARM_RATE_SHARE * tm_quota.stats()["rate"]
+        self._next_call = time.monotonic() + (tally.fetched - fetched) / max(share, 0.01)
+
+    async def run(self, redis) -> dict:
+        from . import ticketmaster as tm
+
+        result = {"started_at": datetime.now().isoformat(), "artists": 0, "searches": 0, "calls": 0, "stopped": None}
+        if not (tm.TM_ATTRACTION_CACHE_TTL or tm.TM_EVENTS_CACHE_TTL):
+            result["stopped"] = "Ticketmaster caches are off"
+            return result
+        # The rest of whatever quota is left stays with users
+        budget = int(tm_quota.quota_available * CACHE_WARM_RATE_SHARE) if tm_quota.quota_available is not None else None
+        started = time.monotonic()
+        tally = tm.LookupTally()
+        token = tm._lookup_tally.set(tally)
+        self.running = True
+        try:
+            for artist, _ in await popular(redis, "artist", CACHE_WARM_TOP_ARTISTS):
+                await self._lookup(tally, budget, lambda: tm._get_artist_info(artist, refresh=True))
+                result["artists"] += 1
+
+            metros = {metro for metro, _ in await popular(redis, "metro", CACHE_WARM_TOP_METROS)}
+            searches = []
+            for kind in ("metro_artist", "metro_genre"):
+                for member, score in await popular(redis, kind, CACHE_WARM_TOP_SEARCHES):
+                    lat, lng, name = json.loads(member)
+                    if json.dumps([lat, lng]) in metros:
+                        searches.append((score, kind, [lat, lng], name))
+            # Artist and genre searches compete for the same slots, most searched first
+            searches.sort(key=lambda search: search[0], reverse=True)
+            for _, kind, latlong, name in searches[:CACHE_WARM_TOP_SEARCHES]:
+                if kind == "metro_artist":
+                    lookup = lambda: tm._fetch_concerts_for_artist(name, latlong, None, limit=None, ttl=tm.TM_WARM_TTL, refresh=True)
+                else:
+                    query_string = tm._build_query_string(latlong, classificationName=name)
+                    lookup = lambda: tm._fetch_concerts(query_string, {"genre": name}, ttl=tm.TM_WARM_TTL, refresh=True)
+                await self._lookup(tally, budget, lookup)
+                result["searches"] += 1
+        except WarmStopped as e:
+            result["stopped"] = str(e)
+        finally:
+            tm._lookup_tally.reset(token)
+            self.running = False
+            result["calls"] = tally.fetched
+            result["seconds"] = round(time.monotonic() - started, 1)
+            self.runs += 1
+            self.last_run = result
+
+        logger.info(f"Cache warm run: {result}")
+        try:
+            await decay_popularity(redis)
+        except Exception as e:
+            logger.warning(f"Decaying search popularity failed: {e}")
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "enabled": CACHE_WARM_ENABLED,
+            "hours": CACHE_WARM_HOURS,
+            "off_peak": off_peak(),
+            "running": self.running,
+            "runs": self.runs,
+            "last_run": self.last_run,
+        }
+
+
+cache_warmer = CacheWarmer()
+
+
+async def _claim_run(redis) -> bool:
+    """Whether this worker runs the warmer this interval. Without Redis every worker warms its own caches."""
+    if redis is None:
+        return True
+    try:
+        return bool(await redis.set(WARM_LOCK_KEY, os.getpid(), nx=True, ex=max(int(CACHE_WARM_INTERVAL), 1)))
+    except Exception as e:
+        logger.warning(f"Could not claim the cache warm run, warming this worker: {e}")
+        return True
+
+
+async def run_cache_warmer():
+    """Flush search popularity to Redis every POPULARITY_FLUSH_INTERVAL seconds and, when enabled, warm the caches off-peak."""
+    next_run = 0.0
+    try:
+        while True:
+            await asyncio.sleep(POPULARITY_FLUSH_INTERVAL)
+            redis = get_cache_redis()
+            if redis is not None:
+                try:
+                    await flush_popularity(redis)
+                except Exception as e:
+                    logger.warning(f"Search popularity flush failed, will retry: {e}")
+            if CACHE_WARM_ENABLED and off_peak() and time.monotonic() >= next_run:
+                next_run = time.monotonic() + CACHE_WARM_INTERVAL
+                if await _claim_run(redis):
+                    try:
+                        await cache_warmer.run(redis)
+                    except Exception as e:
+                        logger.warning(f"Cache warm run failed: {e}")
+    except asyncio.CancelledError:
+        redis = get_cache_redis()
+        if redis is not None:
+            try:
+                await flush_popularity(redis)
+            except Exception as e:
+                logger.warning(f"Final search popularity flush failed: {e}")
+        raise
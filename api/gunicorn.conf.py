@@ -1,3 +1,4 @@
+import glob
 import multiprocessing
 import os
 
@@ -33,4 +34,28 @@ limit_request_fields = 100
 limit_request_field_size = 8190
 
 # Performance
-worker_tmp_dir = "/dev/shm"  # Use RAM for temporary files 
\ No newline at end of file
+worker_tmp_dir = "/dev/shm"  # Use RAM for temporary files 
+
+# Prometheus metrics: each worker writes its own to files in this directory and
+# /metrics sums them, so every scrape sees all workers. Files from an earlier
+# run are removed so their counts are not added in.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/dev/shm/concert-scout-metrics")
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+    os.remove(path)
+
+
+def post_fork(server, worker):
+    """Split the Ticketmaster rate budget (TM_MAX_RPS, TM_MAX_CONCURRENCY) between the workers."""
+    from concert_scout_agent.quota import tm_quota
+
+    tm_quota.share(server.cfg.workers)
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's live gauges (its counters and histograms still count)."""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Ingestion job for the local Ticketmaster event store (EVENT_STORE_PATH)
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Get the directory where ingest_events.py is located
+current_dir = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(current_dir, '.env'))
+
+from concert_scout_agent.cache import close_cache_redis
+from concert_scout_agent.event_store import event_store, run_event_ingestion
+from concert_scout_agent.http_client import close_http_client
+from concert_scout_agent.telemetry import setup_telemetry, shutdown_telemetry
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def main(once: bool):
+    setup_telemetry("concert-scout-event-ingestion")
+    try:
+        await run_event_ingestion(once=once)
+    finally:
+        await close_http_client()
+        await close_cache_redis()
+        shutdown_telemetry()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the local Ticketmaster event store filled for the active regions")
+    parser.add_argument("--once", action="store_true", help="Refresh the stale regions once and exit")
+    args = parser.parse_args()
+    if event_store is None:
+        sys.exit("EVENT_STORE_PATH is not set")
+    asyncio.run(main(args.once))
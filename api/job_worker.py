@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Pipeline worker for the Concert Scout AI job queue (POST /jobs)
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+
+# Get the directory where job_worker.py is located
+current_dir = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(current_dir, '.env'))
+
+from jobs import run_job_worker
+from session_store import get_redis_client, close_redis_client
+from concert_scout_agent.http_client import close_http_client
+from concert_scout_agent.telemetry import setup_telemetry, shutdown_telemetry
+from concert_scout_agent.usage import run_usage_flusher
+from concert_scout_agent.cassette import close_cassette
+from concert_scout_agent.warmer import run_cache_warmer
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def main(concurrency: int):
+    setup_telemetry("concert-scout-job-worker")
+    usage_flusher = asyncio.create_task(run_usage_flusher(get_redis_client))
+    cache_warmer = asyncio.create_task(run_cache_warmer())
+    try:
+        await run_job_worker(concurrency=concurrency)
+    finally:
+        usage_flusher.cancel()
+        cache_warmer.cancel()
+        await asyncio.gather(usage_flusher, cache_warmer, return_exceptions=True)
+        await close_redis_client()
+        await close_http_client()
+        close_cassette()
+        shutdown_telemetry()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Concert Scout AI pipeline jobs from the Redis job stream")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("JOB_WORKER_CONCURRENCY", "4")),
+        help="Number of pipelines to run at once"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
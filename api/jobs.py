@@ -0,0 +1,211 @@
+from datetime import datetime
+from typing import Dict, Optional, Set
+import asyncio
+import json
+import logging
+import os
+import socket
+from uuid import uuid4
+
+from redis.exceptions import RedisError, ResponseError
+
+from session_store import get_redis_client, update_session, DEFAULT_USER_ID
+from pipeline import run_prompt, get_or_create_session, extract_text_response, extract_recommendations, PIPELINE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Redis stream the web tier appends jobs to and the consumer group the
+# pipeline workers read it with
+JOBS_STREAM = "jobs:stream"
+JOBS_GROUP = "pipeline-workers"
+JOBS_STREAM_MAXLEN = 10000
+
+# How long job status and results are kept
+JOB_TTL = int(os.getenv("JOB_TTL", "86400"))
+
+# Jobs claimed by a worker that died are handed to another worker after this long
+JOB_RECLAIM_IDLE_MS = int((PIPELINE_TIMEOUT + 60) * 1000)
+
+# Seconds the worker waits after a Redis error, doubling up to the maximum
+JOB_WORKER_RETRY_DELAY = 1.0
+JOB_WORKER_RETRY_MAX_DELAY = 30.0
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+TERMINAL_STATUSES = {JOB_SUCCEEDED, JOB_FAILED}
+
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+async def enqueue_job(message: str, user_id: Optional[str], session_id: Optional[str], response_format: str = "text") -> str:
+    """Record a queued job and append it to the jobs stream, in one round-trip.
+
+    response_format is the /chat one: "structured" results carry the concerts
+    as `recommendations` instead of the raw events.
+    """
+    job_id = str(uuid4())
+    now = datetime.now().isoformat()
+    redis = await get_redis_client()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(_job_key(job_id), mapping={
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "message": message,
+            "user_id": user_id or DEFAULT_USER_ID,
+            "session_id": session_id or "",
+            "response_format": response_format,
+            "created_at": now,
+            "updated_at": now
+        })
+        pipe.expire(_job_key(job_id), JOB_TTL)
+        pipe.xadd(JOBS_STREAM, {"job_id": job_id}, maxlen=JOBS_STREAM_MAXLEN, approximate=True)
+        await pipe.execute()
+    return job_id
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """Return the job status, with the parsed result once it has finished."""
+    redis = await get_redis_client()
+    job = await redis.hgetall(_job_key(job_id))
+    if not job:
+        return None
+    job.pop("message", None)
+    job["result"] = json.loads(job["result"]) if job.get("result") else None
+    return job
+
+
+async def _update_job(job_id: str, **fields):
+    redis = await get_redis_client()
+    fields["updated_at"] = datetime.now().isoformat()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(_job_key(job_id), mapping=fields)
+        pipe.expire(_job_key(job_id), JOB_TTL)
+        await pipe.execute()
+
+
+async def run_job(job_id: str):
+    """Run the agent pipeline for one job and store its result."""
+    redis = await get_redis_client()
+    job = await redis.hgetall(_job_key(job_id))
+    if not job:
+        logger.warning(f"Job {job_id} expired before it could run")
+        return
+    if job["status"] in TERMINAL_STATUSES:
+        return
+
+    await _update_job(job_id, status=JOB_RUNNING)
+    try:
+        user_id = job["user_id"]
+        session = await get_or_create_session(job["session_id"] or None, user_id)
+        updated_session, events = await asyncio.wait_for(
+            run_prompt(session, job["message"], user_id),
+            timeout=PIPELINE_TIMEOUT
+        )
+        await update_session(updated_session.id, updated_at=datetime.now().isoformat())
+        text_response = extract_text_response(events)
+        if job.get("response_format") == "structured":
+            # Same shape as a structured /chat response
+            recommendations = extract_recommendations(events)
+            result = {
+                "response": "" if recommendations else text_response,
+                "session_id": session.id,
+                "user_id": user_id,
+                "events": [],
+                "recommendations": recommendations.model_dump() if recommendations else None
+            }
+        else:
+            result = {
+                "response": text_response,
+                "session_id": session.id,
+                "user_id": user_id,
+                "events": events
+            }
+        await _update_job(job_id, status=JOB_SUCCEEDED, session_id=session.id, result=json.dumps(result))
+        logger.info(f"Job {job_id} completed for session: {session.id}")
+    except asyncio.TimeoutError:
+        logger.error(f"Job {job_id} timed out")
+        await _update_job(job_id, status=JOB_FAILED, error="Request timeout - AI processing took too long. Please try with a simpler query.")
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        await _update_job(job_id, status=JOB_FAILED, error=f"Error processing chat: {str(e)}")
+
+
+async def ensure_consumer_group():
+    """Create the jobs stream and its consumer group if they do not exist yet."""
+    redis = await get_redis_client()
+    try:
+        await redis.xgroup_create(JOBS_STREAM, JOBS_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def run_job_worker(concurrency: int = 4, consumer: Optional[str] = None):
+    """Consume jobs from the stream, running up to `concurrency` pipelines at once.
+
+    Each job is acknowledged once its result is stored. Jobs left pending by a
+    worker that died are reclaimed after JOB_RECLAIM_IDLE_MS. Redis errors are
+    logged and retried with backoff, recreating the consumer group in case
+    Redis lost it.
+    """
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    redis = await get_redis_client()
+    running: Set[asyncio.Task] = set()
+    logger.info(f"Job worker {consumer} consuming {JOBS_STREAM} with concurrency {concurrency}")
+
+    async def process(message_id: str, fields: Dict[str, str]):
+        try:
+            await run_job(fields["job_id"])
+        finally:
+            await redis.xack(JOBS_STREAM, JOBS_GROUP, message_id)
+
+    def start(messages):
+        for message_id, fields in messages:
+            if not fields:
+                continue
+            task = asyncio.create_task(process(message_id, fields), name=f"job {fields.get('job_id')}")
+            running.add(task)
+            task.add_done_callback(finished)
+
+    def finished(task: asyncio.Task):
+        running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Processing {task.get_name()} failed", exc_info=task.exception())
+
+    group_ready = False
+    retry_delay = JOB_WORKER_RETRY_DELAY
+    while True:
+        free_slots = concurrency - len(running)
+        if free_slots <= 0:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+
+        try:
+            if not group_ready:
+                await ensure_consumer_group()
+                group_ready = True
+
+            claimed = (await redis.xautoclaim(
+                JOBS_STREAM, JOBS_GROUP, consumer, min_idle_time=JOB_RECLAIM_IDLE_MS, count=free_slots
+            ))[1]
+            if claimed:
+                logger.info(f"Reclaimed {len(claimed)} stalled jobs")
+                start(claimed)
+                continue
+
+            response = await redis.xreadgroup(
+                JOBS_GROUP, consumer, {JOBS_STREAM: ">"}, count=free_slots, block=5000
+            )
+        except RedisError as e:
+            logger.warning(f"Job worker {consumer} Redis error, retrying in {retry_delay:.0f}s: {e}")
+            group_ready = False
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, JOB_WORKER_RETRY_MAX_DELAY)
+            continue
+        retry_delay = JOB_WORKER_RETRY_DELAY
+        for _, messages in response or []:
+            start(messages)
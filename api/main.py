@@ -1,15 +1,23 @@
+import argparse
 import asyncio
+import json
+import sys
+import time
 from datetime import datetime
 from datetime import timedelta
-from typing import cast
+from typing import cast, Dict, Iterator, List, Set
 import os
 
 from concert_scout_agent.agent import root_agent
+from concert_scout_agent.cassette import close_cassette
+from concert_scout_agent.http_client import close_http_client
+from concert_scout_agent.sub_agents.sequential_agent.sub_agents.final_recommender_agent.agent import ConcertRecommendations
 from dotenv import load_dotenv
 from google.adk.cli.utils import logs
 from google.adk.runners import InMemoryRunner
 from google.adk.sessions import Session
 from google.genai import types
+from pydantic import ValidationError
 
 # Get the directory where main2.py is located
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -68,5 +76,165 @@ async def main():
             break
         session = await run_prompt(session, user_input)
 
+# Batch mode: queries from a JSONL file, each in its own session
+
+# Same limit as one /chat request
+BATCH_QUERY_TIMEOUT = 180.0
+# Agents whose final text is the answer to the user
+ANSWERING_AGENTS = {"final_recommender_agent", "concert_scout_agent"}
+
+
+def read_queries(path: str) -> List[Dict]:
+    """Queries from JSONL lines: {"id", "query", "user_id"} objects ("message" or "prompt" also work) or bare strings."""
+    queries = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            query = item.get("query") or item.get("message") or item.get("prompt")
+            if not query:
+                raise ValueError(f"Line {line_number} of {path} has no query")
+            queries.append({"id": str(item.get("id", line_number)), "query": query, "user_id": item.get("user_id", "batch")})
+    ids = [query["id"] for query in queries]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Query ids in {path} are not unique")
+    return queries
+
+
+def finished_ids(path: str) -> Set[str]:
+    """Ids of the queries that already succeeded in an earlier run writing to path.
+
+    A line cut short when that run was killed is removed, so appending continues cleanly.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            data = data[:data.rfind(b"\n") + 1]
+    finished = set()
+    for line in data.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        # Later lines for an id replace earlier ones, so a retried failure counts once it succeeds
+        if result.get("status") == "ok":
+            finished.add(result["id"])
+        else:
+            finished.discard(result["id"])
+    return finished
+
+
+async def run_batch_query(runner: InMemoryRunner, app_name: str, query: Dict, timeout: float) -> Dict:
+    """Run one query in a new session and describe the outcome as a result line."""
+    session = await runner.session_service.create_session(app_name=app_name, user_id=query["user_id"])
+    content = types.Content(role='user', parts=[types.Part.from_text(text=query["query"])])
+    answers = []
+    tool_calls = []
+
+    async def run():
+        async for event in runner.run_async(user_id=query["user_id"], session_id=session.id, new_message=content):
+            if not event.content or not event.content.parts:
+                continue
+            part = event.content.parts[0]
+            if part.function_call:
+                tool_calls.append(part.function_call.name)
+            elif part.text and event.is_final_response() and event.author in ANSWERING_AGENTS:
+                answers.append((event.author, part.text))
+
+    result = {"id": query["id"], "query": query["query"], "session_id": session.id}
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(run(), timeout=timeout)
+        result["status"] = "ok"
+    except asyncio.TimeoutError:
+        result["status"] = "timeout"
+        result["error"] = f"No answer within {timeout:g}s"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    finally:
+        # Thousands of finished sessions would otherwise stay in memory until the run ends
+        await runner.session_service.delete_session(app_name=app_name, user_id=query["user_id"], session_id=session.id)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    result["finished_at"] = datetime.now().isoformat()
+    result["tool_calls"] = tool_calls
+    result["recommendations"] = None
+    for author, text in reversed(answers):
+        if author == "final_recommender_agent":
+            try:
+                result["recommendations"] = ConcertRecommendations.model_validate_json(text).model_dump()
+            except ValidationError:
+                pass
+            break
+    # As in a structured /chat response, the concerts are kept once and the text only when the agents replied in prose
+    result["response"] = "" if result["recommendations"] else "".join(text for _, text in answers)
+    return result
+
+
+async def batch(input_path: str, output_path: str, concurrency: int, timeout: float, restart: bool):
+    """Run every query not yet finished in output_path, `concurrency` at a time, appending each result as it completes."""
+    app_name = 'Concert Scout'
+    runner = InMemoryRunner(
+      app_name=app_name,
+      agent=root_agent,
+    )
+    queries = read_queries(input_path)
+    if restart and os.path.exists(output_path):
+        os.remove(output_path)
+    finished = finished_ids(output_path)
+    pending: Iterator[Dict] = (query for query in queries if query["id"] not in finished)
+    remaining = len(queries) - len(finished & {query["id"] for query in queries})
+    print(f"{len(queries)} queries, {len(queries) - remaining} already finished, {remaining} to run", file=sys.stderr)
+
+    counts = {"ok": 0, "timeout": 0, "error": 0}
+    seconds = []
+    start = time.perf_counter()
+
+    async def worker(output):
+        # Workers share the generator, so only `concurrency` queries are in flight
+        for query in pending:
+            result = await run_batch_query(runner, app_name, query, timeout)
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            counts[result["status"]] += 1
+            seconds.append(result["seconds"])
+            print(f"[{sum(counts.values())}/{remaining}] {result['id']}: {result['status']} in {result['seconds']:.1f}s", file=sys.stderr)
+
+    try:
+        with open(output_path, "a") as output:
+            await asyncio.gather(*(worker(output) for _ in range(concurrency)))
+    finally:
+        await close_http_client()
+        close_cassette()
+
+    if seconds:
+        seconds.sort()
+        wall = time.perf_counter() - start
+        print(
+            f"{counts['ok']} ok, {counts['timeout']} timed out, {counts['error']} failed in {wall:.1f}s "
+            f"({len(seconds) / wall:.2f} queries/s); p50 {seconds[len(seconds) // 2]:.1f}s, "
+            f"p95 {seconds[min(int(len(seconds) * 0.95), len(seconds) - 1)]:.1f}s",
+            file=sys.stderr
+        )
+    if counts["timeout"] or counts["error"]:
+        print(f"Run again with the same --output to retry the {counts['timeout'] + counts['error']} unfinished queries", file=sys.stderr)
+
+
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Chat with the Concert Scout AI, or run a file of queries")
+    parser.add_argument("--batch", metavar="QUERIES_JSONL", help="Run the queries in this JSONL file instead of chatting")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file the batch results are appended to; "
+                                                                          "queries that already succeeded in it are skipped")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batch queries run at once")
+    parser.add_argument("--timeout", type=float, default=BATCH_QUERY_TIMEOUT, help="Seconds before a batch query is abandoned")
+    parser.add_argument("--restart", action="store_true", help="Discard the results already in --output")
+    args = parser.parse_args()
+    if args.batch:
+        asyncio.run(batch(args.batch, args.output, args.concurrency, args.timeout, args.restart))
+    else:
+        asyncio.run(main())
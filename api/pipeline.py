@@ -0,0 +1,121 @@
+from datetime import datetime
+from typing import cast, Dict, List, Optional
+import logging
+import time
+
+from concert_scout_agent.agent import root_agent
+from concert_scout_agent.telemetry import tracer
+from concert_scout_agent import cassette
+from concert_scout_agent.sub_agents.sequential_agent.sub_agents.final_recommender_agent.agent import ConcertRecommendations
+from google.adk.runners import InMemoryRunner
+from google.adk.sessions import Session
+from google.genai import types
+from pydantic import ValidationError
+
+from session_store import store_session, touch_session
+
+logger = logging.getLogger(__name__)
+
+# Shared by the /chat route and the job workers
+app_name = 'Concert Scout'
+runner = InMemoryRunner(
+    app_name=app_name,
+    agent=root_agent,
+)
+
+# Timeout for one run of the agent pipeline
+PIPELINE_TIMEOUT = 180.0
+
+
+async def get_or_create_session(session_id: Optional[str], user_id: str) -> Session:
+    """Load a stored session (refreshing its TTL) or create and store a new one."""
+    if session_id:
+        session_data = await touch_session(session_id)
+        if session_data:
+            session = await runner.session_service.get_session(
+                app_name=app_name, user_id=session_data["user_id"], session_id=session_id
+            )
+            if session is None:
+                # The conversation history lives in the process that created the
+                # session; recreate it here so the turn can still run
+                session = await runner.session_service.create_session(
+                    app_name=app_name, user_id=session_data["user_id"], session_id=session_id
+                )
+            logger.info(f"Using existing session: {session_id}")
+            return session
+
+    session = await runner.session_service.create_session(
+        app_name=app_name,
+        user_id=user_id,
+    )
+    logger.info(f"Created new session: {session.id}")
+
+    # Store session data
+    session_data = {
+        "id": session.id,
+        "user_id": session.user_id,
+        "app_name": session.app_name,
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat()
+    }
+    await store_session(session.id, session_data)
+    return session
+
+
+async def run_prompt(session: Session, new_message: str, user_id: str) -> tuple[Session, List[Dict]]:
+    """Run a prompt through the agent and return the session and events."""
+    content = types.Content(
+        role='user', parts=[types.Part.from_text(text=new_message)]
+    )
+
+    events = []
+    start = time.perf_counter()
+    # Parent of the spans ADK records for the agents, LLM calls and tools of this run
+    with tracer.start_as_current_span("run_prompt", attributes={"session.id": session.id, "user.id": user_id}):
+        async for event in runner.run_async(user_id=user_id, session_id=session.id, new_message=content):
+            if not event.content or not event.content.parts:
+                continue
+
+            event_data = {
+                "author": event.author,
+                "timestamp": datetime.now().isoformat()
+            }
+
+            if event.content.parts[0].text:
+                if event.is_final_response():
+                    event_data["type"] = "text"
+                    event_data["content"] = event.content.parts[0].text
+                    if event.author == "final_recommender_agent" or event.author == "concert_scout_agent":
+                        events.append(event_data)
+
+    if cassette.recording():
+        cassette.record_turn(session.id, user_id, new_message, time.perf_counter() - start)
+
+    updated_session = cast(
+        Session,
+        await runner.session_service.get_session(
+            app_name=app_name, user_id=user_id, session_id=session.id
+        ),
+    )
+
+    return updated_session, events
+
+
+def extract_text_response(events: List[Dict]) -> str:
+    """Extract the text response from events."""
+    text_response = ""
+    for event in events:
+        if event.get("type") == "text" and event.get("author") != "user":
+            text_response += event.get("content", "")
+    return text_response
+
+
+def extract_recommendations(events: List[Dict]) -> Optional[ConcertRecommendations]:
+    """The final recommender's concerts from this turn, or None when the agents replied in prose (e.g. a follow-up question)."""
+    for event in reversed(events):
+        if event.get("type") == "text" and event.get("author") == "final_recommender_agent":
+            try:
+                return ConcertRecommendations.model_validate_json(event.get("content", ""))
+            except ValidationError:
+                return None
+    return None
@@ -0,0 +1,191 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import logging
+import math
+import time
+from uuid import uuid4
+
+from fastapi import HTTPException, Request, Response
+from redis.exceptions import RedisError
+
+from session_store import get_redis_client
+import session_store
+
+logger = logging.getLogger(__name__)
+
+# Sliding-window log over every key in KEYS, checked and recorded atomically in
+# one round-trip. ARGV: member, then (limit, window_ms) per key. The request is
+# admitted only if every key is under its limit. Returns {allowed, remaining,
+# reset_ms}: the lowest remaining quota and when the oldest request leaves a window.
+SLIDING_WINDOW_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local member = ARGV[1]
+local allowed = 1
+local remaining = -1
+local reset = 0
+local counts = {}
+for i, key in ipairs(KEYS) do
+  local limit = tonumber(ARGV[i * 2])
+  local window = tonumber(ARGV[i * 2 + 1])
+  redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+  local count = redis.call('ZCARD', key)
+  counts[i] = count
+  if count >= limit then
+    allowed = 0
+  end
+end
+for i, key in ipairs(KEYS) do
+  local limit = tonumber(ARGV[i * 2])
+  local window = tonumber(ARGV[i * 2 + 1])
+  local count = counts[i]
+  if allowed == 1 then
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, window)
+    count = count + 1
+  end
+  local key_remaining = math.max(limit - count, 0)
+  if remaining < 0 or key_remaining < remaining then
+    remaining = key_remaining
+  end
+  local key_reset = window
+  local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+  if oldest[2] then
+    key_reset = tonumber(oldest[2]) + window - now
+  end
+  if key_reset > reset then
+    reset = key_reset
+  end
+end
+return {allowed, remaining, reset}
+"""
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Users that did not identify themselves are only limited per IP
+ANONYMOUS_USERS = {"", "default_user"}
+
+
+def parse_limit(limit: str) -> Tuple[int, int]:
+    """Parse a limit such as "10/minute" into (requests, window in milliseconds)."""
+    count, period = limit.split("/")
+    return int(count), PERIODS[period.strip().rstrip("s")] * 1000
+
+
+class LocalSlidingWindow:
+    """Per-worker sliding-window log, used only while Redis is unreachable."""
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._hits: Dict[str, Deque[float]] = {}
+
+    def hit(self, checks: List[Tuple[str, int, int]]) -> Tuple[bool, int, int]:
+        now = time.monotonic() * 1000
+        windows = []
+        for key, limit, window in checks:
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            windows.append((hits, limit, window))
+        allowed = all(len(hits) < limit for hits, limit, _ in windows)
+        remaining = None
+        reset = 0
+        for hits, limit, window in windows:
+            if allowed:
+                hits.append(now)
+            remaining = min(remaining, limit - len(hits)) if remaining is not None else limit - len(hits)
+            if hits:
+                reset = max(reset, int(hits[0] + window - now))
+        if len(self._hits) > self.MAX_KEYS:
+            oldest = now - PERIODS["day"] * 1000
+            self._hits = {key: hits for key, hits in self._hits.items() if hits and hits[-1] > oldest}
+        return allowed, max(remaining or 0, 0), reset
+
+
+class SlidingWindowLimiter:
+    """Redis-backed sliding-window rate limiter shared by all workers."""
+
+    def __init__(self, prefix: str = "ratelimit"):
+        self.prefix = prefix
+        self._script = None
+        self._local = LocalSlidingWindow()
+
+    async def hit(self, checks: List[Tuple[str, int, int]]) -> Tuple[bool, int, int]:
+        """Record a request against (key, limit, window_ms) checks.
+
+        Returns (allowed, remaining, reset_ms) for the most constrained key.
+        """
+        checks = [(f"{self.prefix}:{key}", limit, window) for key, limit, window in checks]
+        if session_store.use_redis:
+            try:
+                redis = await get_redis_client()
+                if self._script is None:
+                    self._script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+                args = [uuid4().hex]
+                for _, limit, window in checks:
+                    args.extend([limit, window])
+                allowed, remaining, reset = await self._script(keys=[key for key, _, _ in checks], args=args)
+                return bool(allowed), int(remaining), int(reset)
+            except RedisError as e:
+                logger.warning(f"Redis rate limiting failed, falling back to per-worker limits: {e}")
+        return self._local.hit(checks)
+
+
+limiter = SlidingWindowLimiter()
+
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def _user_id(request: Request) -> Optional[str]:
+    """The user id from the query string or the JSON body, if the caller gave one."""
+    user_id = request.query_params.get("user_id")
+    if user_id is None and request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = await request.json()
+            if isinstance(body, dict):
+                user_id = body.get("user_id")
+        except ValueError:
+            pass
+    if not isinstance(user_id, str) or user_id in ANONYMOUS_USERS:
+        return None
+    return user_id
+
+
+class RateLimit:
+    """FastAPI dependency enforcing a sliding-window limit per IP and per user.
+
+    The per-user limit applies when the request names a user_id, on top of the
+    per-IP limit. Quota headers are added to every response and a 429 with
+    Retry-After is raised once either limit is exhausted.
+    """
+
+    def __init__(self, scope: str, limit: str, user_limit: Optional[str] = None):
+        self.scope = scope
+        self.limit = limit
+        self.ip_limit = parse_limit(limit)
+        self.user_limit = parse_limit(user_limit) if user_limit else None
+
+    async def __call__(self, request: Request, response: Response):
+        checks = [(f"{self.scope}:ip:{_client_ip(request)}", *self.ip_limit)]
+        if self.user_limit:
+            user_id = await _user_id(request)
+            if user_id:
+                checks.append((f"{self.scope}:user:{user_id}", *self.user_limit))
+
+        allowed, remaining, reset_ms = await limiter.hit(checks)
+        headers = {
+            "X-RateLimit-Limit": str(min(limit for _, limit, _ in checks)),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(math.ceil(reset_ms / 1000)),
+        }
+        if not allowed:
+            headers["Retry-After"] = headers["X-RateLimit-Reset"]
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded, retry in {headers['Retry-After']} seconds",
+                headers=headers
+            )
+        response.headers.update(headers)
@@ -0,0 +1,386 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+import asyncio
+import os
+import logging
+import json
+import math
+import time
+
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+# Global variables - these will be initialized per worker
+redis_client: Optional[aioredis.Redis] = None
+
+use_redis = True
+
+# Session expiry and the sorted set indexing live sessions by expiry time,
+# so counting them never needs a KEYS scan
+SESSION_TTL = 3600
+ACTIVE_SESSIONS_KEY = "sessions:active"
+
+# User id for requests that don't name one
+DEFAULT_USER_ID = "default_user"
+
+# Memory budget for the in-memory fallback and how often writes made during a
+# Redis outage are retried
+FALLBACK_MAX_BYTES = int(os.getenv("FALLBACK_SESSIONS_MAX_BYTES", str(8 * 1024 * 1024)))
+RECONCILE_INTERVAL = float(os.getenv("FALLBACK_RECONCILE_INTERVAL", "10"))
+
+
+class FallbackSessionStore:
+    """In-memory session store used when Redis is not available.
+
+    Entries expire after SESSION_TTL like the Redis keys, and the least recently
+    used ones are evicted once the estimated size exceeds max_bytes. Reads and
+    writes refresh the recency; only writes refresh the TTL, so a second dict
+    kept in write order is also ordered by expiry, and every operation is O(1)
+    (amortized for expiry). Writes and deletes made because Redis failed are
+    remembered so they can be replayed once it is back.
+    """
+
+    # Rough per-entry cost of the dict, tuple and key bookkeeping
+    ENTRY_OVERHEAD = 256
+
+    def __init__(self, ttl: int = SESSION_TTL, max_bytes: int = FALLBACK_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        # Ordered by last use, for eviction
+        self._entries: "OrderedDict[str, Tuple[float, int, dict]]" = OrderedDict()
+        # Ordered by last write, which is expiry order
+        self._expiry: "OrderedDict[str, None]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+
+    @classmethod
+    def _estimate_size(cls, session_id: str, session_data: dict) -> int:
+        return cls.ENTRY_OVERHEAD + len(session_id) + sum(len(str(k)) + len(str(v)) for k, v in session_data.items())
+
+    def _remove(self, session_id: str) -> Optional[dict]:
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+        del self._expiry[session_id]
+        self.bytes -= entry[1]
+        return entry[2]
+
+    def _expire(self):
+        now = time.time()
+        while self._expiry:
+            session_id = next(iter(self._expiry))
+            if self._entries[session_id][0] > now:
+                break
+            self._remove(session_id)
+            self._dirty.discard(session_id)
+
+    def set(self, session_id: str, session_data: dict, dirty: bool = False):
+        """Store a session, refreshing its TTL. dirty marks it for replay to Redis."""
+        self._remove(session_id)
+        size = self._estimate_size(session_id, session_data)
+        self._entries[session_id] = (time.time() + self.ttl, size, session_data)
+        self._expiry[session_id] = None
+        self.bytes += size
+        if dirty:
+            self._dirty.add(session_id)
+            self._deleted.discard(session_id)
+        self._expire()
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            evicted_id, _ = next(iter(self._entries.items()))
+            self._remove(evicted_id)
+            self._dirty.discard(evicted_id)
+
+    def get(self, session_id: str) -> Optional[dict]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._remove(session_id)
+            self._dirty.discard(session_id)
+            return None
+        self._entries.move_to_end(session_id)
+        return entry[2]
+
+    def touch(self, session_id: str, dirty: bool = False) -> Optional[dict]:
+        """Return a session and refresh its TTL."""
+        session_data = self.get(session_id)
+        if session_data is not None:
+            self.set(session_id, session_data, dirty=dirty)
+        return session_data
+
+    def update(self, session_id: str, fields: dict, dirty: bool = False):
+        session_data = self.get(session_id)
+        if session_data is not None:
+            self.set(session_id, {**session_data, **fields}, dirty=dirty)
+
+    def pop(self, session_id: str, dirty: bool = False) -> Optional[dict]:
+        self._dirty.discard(session_id)
+        if dirty:
+            self._deleted.add(session_id)
+        return self._remove(session_id)
+
+    def __len__(self) -> int:
+        self._expire()
+        return len(self._entries)
+
+    @property
+    def pending(self) -> bool:
+        """Whether there are writes or deletes that still have to reach Redis."""
+        return bool(self._dirty or self._deleted)
+
+    def take_pending(self) -> Tuple[Dict[str, Tuple[dict, int]], Set[str]]:
+        """Hand over the pending writes (with their remaining TTL) and deletes, clearing them."""
+        now = time.time()
+        writes = {}
+        for session_id in self._dirty:
+            entry = self._entries.get(session_id)
+            if entry and entry[0] > now:
+                writes[session_id] = (entry[2], math.ceil(entry[0] - now))
+        deleted = self._deleted
+        self._dirty = set()
+        self._deleted = set()
+        return writes, deleted
+
+    def discard_clean(self, session_id: str):
+        """Drop a session that has been written back to Redis, unless it changed again since."""
+        if session_id not in self._dirty:
+            self._remove(session_id)
+
+    def restore_pending(self, writes: Dict[str, Tuple[dict, int]], deleted: Set[str]):
+        """Put back pending changes that could not be written to Redis."""
+        self._dirty.update(session_id for session_id in writes if session_id in self._entries)
+        self._deleted.update(deleted - self._dirty)
+
+
+# Fallback in-memory storage for when Redis is not available
+fallback_sessions = FallbackSessionStore()
+
+
+# Updates a session hash only if it still exists, so a session deleted or
+# expired mid-request is not recreated with just the updated fields.
+# KEYS: session hash, expiry index. ARGV: ttl, session id, expiry score, then field/value pairs.
+UPDATE_EXISTING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], 'XX', ARGV[3], ARGV[2])
+return 1
+"""
+_update_script = None
+
+
+def _session_key(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+def _hash_fields(fields: dict) -> dict:
+    """Fields as Redis hash values; None (e.g. an anonymous user_id) is stored as an empty string."""
+    return {key: "" if value is None else value for key, value in fields.items()}
+
+
+async def get_redis_client() -> aioredis.Redis:
+    """Get Redis client with connection pooling."""
+    global redis_client
+    if redis_client is None:
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        redis_client = aioredis.from_url(
+            redis_url,
+            encoding="utf-8",
+            decode_responses=True,
+            max_connections=20  # Connection pool size
+        )
+    return redis_client
+
+
+async def close_redis_client():
+    """Close the Redis connection pool."""
+    global redis_client, _update_script
+    if redis_client:
+        await redis_client.close()
+        redis_client = None
+        _update_script = None
+
+
+def _queue_refresh(pipe, session_id: str, only_existing: bool = False):
+    """Queue the TTL refresh for a session hash and its entry in the expiry index."""
+    pipe.expire(_session_key(session_id), SESSION_TTL)
+    pipe.zadd(ACTIVE_SESSIONS_KEY, {session_id: time.time() + SESSION_TTL}, xx=only_existing)
+
+
+async def store_session(session_id: str, session_data: dict):
+    """Store session data as a Redis hash with expiration, in a single round-trip.
+
+    The hash is replaced in a MULTI/EXEC transaction, so readers in other
+    workers never see it between the DEL and the HSET.
+    """
+    if use_redis:
+        try:
+            redis = await get_redis_client()
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.delete(_session_key(session_id))
+                pipe.hset(_session_key(session_id), mapping=_hash_fields(session_data))
+                _queue_refresh(pipe, session_id)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis storage failed, falling back to in-memory: {e}")
+            fallback_sessions.set(session_id, session_data, dirty=True)
+    else:
+        fallback_sessions.set(session_id, session_data)
+
+
+async def update_session(session_id: str, **fields):
+    """Update some fields of a stored session and refresh its TTL, in a single round-trip.
+
+    Sessions that no longer exist in Redis are left alone (deleted or expired
+    meanwhile), apart from ones held by the fallback since an outage.
+    """
+    global _update_script
+    if use_redis:
+        try:
+            redis = await get_redis_client()
+            if _update_script is None:
+                _update_script = redis.register_script(UPDATE_EXISTING_SCRIPT)
+            args = [SESSION_TTL, session_id, time.time() + SESSION_TTL]
+            for field, value in _hash_fields(fields).items():
+                args.extend([field, value])
+            updated = await _update_script(keys=[_session_key(session_id), ACTIVE_SESSIONS_KEY], args=args, client=redis)
+            if not updated:
+                fallback_sessions.update(session_id, fields, dirty=True)
+        except Exception as e:
+            logger.warning(f"Redis update failed, falling back to in-memory: {e}")
+            fallback_sessions.update(session_id, fields, dirty=True)
+    else:
+        fallback_sessions.update(session_id, fields)
+
+
+async def _get_legacy_session(redis: aioredis.Redis, session_id: str) -> Optional[dict]:
+    """Read a session written as a JSON string by earlier versions of the API."""
+    session_json = await redis.get(_session_key(session_id))
+    return json.loads(session_json) if session_json else None
+
+
+async def get_session(session_id: str) -> Optional[dict]:
+    """Retrieve session data from Redis, or from the fallback if it was written during an outage."""
+    if use_redis:
+        try:
+            redis = await get_redis_client()
+            try:
+                session_data = await redis.hgetall(_session_key(session_id))
+            except ResponseError:
+                return await _get_legacy_session(redis, session_id)
+            return session_data or fallback_sessions.get(session_id)
+        except Exception as e:
+            logger.warning(f"Redis retrieval failed, falling back to in-memory: {e}")
+    return fallback_sessions.get(session_id)
+
+
+async def touch_session(session_id: str) -> Optional[dict]:
+    """Retrieve session data and refresh its TTL in one pipelined round-trip.
+
+    Returns None if the session does not exist; the TTL refresh is then a no-op.
+    """
+    if use_redis:
+        try:
+            redis = await get_redis_client()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.hgetall(_session_key(session_id))
+                _queue_refresh(pipe, session_id, only_existing=True)
+                results = await pipe.execute(raise_on_error=False)
+            if isinstance(results[0], ResponseError):
+                return await _get_legacy_session(redis, session_id)
+            return results[0] or fallback_sessions.touch(session_id)
+        except Exception as e:
+            logger.warning(f"Redis retrieval failed, falling back to in-memory: {e}")
+            return fallback_sessions.touch(session_id, dirty=True)
+    return fallback_sessions.touch(session_id)
+
+
+async def delete_session(session_id: str):
+    """Delete session data from Redis."""
+    if use_redis:
+        try:
+            redis = await get_redis_client()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.delete(_session_key(session_id))
+                pipe.zrem(ACTIVE_SESSIONS_KEY, session_id)
+                await pipe.execute()
+            fallback_sessions.pop(session_id)
+        except Exception as e:
+            logger.warning(f"Redis deletion failed, falling back to in-memory: {e}")
+            fallback_sessions.pop(session_id, dirty=True)
+    else:
+        fallback_sessions.pop(session_id)
+
+
+async def count_active_sessions() -> int:
+    """Count live sessions from the expiry index, pruning entries that have expired."""
+    if use_redis:
+        try:
+            redis = await get_redis_client()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.zremrangebyscore(ACTIVE_SESSIONS_KEY, "-inf", time.time())
+                pipe.zcard(ACTIVE_SESSIONS_KEY)
+                _, active_sessions = await pipe.execute()
+            return active_sessions
+        except Exception:
+            return len(fallback_sessions)
+    return len(fallback_sessions)
+
+
+async def reconcile_fallback_sessions() -> int:
+    """Replay writes and deletes made during a Redis outage in one pipeline.
+
+    Returns the number of sessions written back. Pending changes are kept if
+    Redis is still unreachable.
+    """
+    if not use_redis or not fallback_sessions.pending:
+        return 0
+    writes, deleted = fallback_sessions.take_pending()
+    try:
+        redis = await get_redis_client()
+        async with redis.pipeline(transaction=False) as pipe:
+            for session_id, (session_data, ttl) in writes.items():
+                pipe.hset(_session_key(session_id), mapping=_hash_fields(session_data))
+                pipe.expire(_session_key(session_id), ttl)
+                pipe.zadd(ACTIVE_SESSIONS_KEY, {session_id: time.time() + ttl})
+            for session_id in deleted:
+                pipe.delete(_session_key(session_id))
+                pipe.zrem(ACTIVE_SESSIONS_KEY, session_id)
+            await pipe.execute()
+    except Exception as e:
+        fallback_sessions.restore_pending(writes, deleted)
+        logger.debug(f"Redis still unavailable, keeping {len(writes)} fallback sessions pending: {e}")
+        return 0
+    for session_id in writes:
+        fallback_sessions.discard_clean(session_id)
+    if writes or deleted:
+        logger.info(f"Reconciled {len(writes)} sessions and {len(deleted)} deletions back to Redis")
+    return len(writes)
+
+
+async def run_fallback_reconciler(interval: float = RECONCILE_INTERVAL):
+    """Background loop writing fallback sessions back to Redis once it is reachable."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_fallback_sessions()
+        except Exception as e:
+            logger.warning(f"Fallback session reconciliation failed: {e}")
+
+
+def redis_pool_usage() -> Optional[dict]:
+    """Connections in use versus the Redis pool size, or None if Redis is not initialized."""
+    if redis_client is None:
+        return None
+    pool = redis_client.connection_pool
+    in_use = len(pool._in_use_connections)
+    return {
+        "in_use": in_use,
+        "max_connections": pool.max_connections,
+        "saturation": round(in_use / pool.max_connections, 3) if pool.max_connections else 0.0
+    }
@@ -0,0 +1,19 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+import session_store
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """A fakeredis client (with Lua) standing in for the session store's Redis."""
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(session_store, "redis_client", client)
+    monkeypatch.setattr(session_store, "use_redis", True)
+    monkeypatch.setattr(session_store, "_update_script", None)
+    monkeypatch.setattr(session_store, "fallback_sessions", session_store.FallbackSessionStore())
+    yield client
+    asyncio.run(client.aclose())
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_requests_past_the_queue_are_rejected_at_once():
+    admission = AdmissionController(max_concurrency=1, max_queue=1, max_wait=5.0)
+
+    async def hold(release: asyncio.Event):
+        async with admission.admit():
+            await release.wait()
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(release))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(hold(release))
+        await asyncio.sleep(0.01)
+        assert (admission.in_flight, admission.waiting) == (1, 1)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with admission.admit():
+                pass
+        release.set()
+        await asyncio.gather(running, queued)
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.retry_after >= 1
+    snapshot = admission.snapshot()
+    assert (snapshot["admitted"], snapshot["rejected"], snapshot["in_flight"], snapshot["queue_depth"]) == (2, 1, 0, 0)
+
+
+def test_queued_request_gives_up_after_max_wait():
+    admission = AdmissionController(max_concurrency=1, max_queue=4, max_wait=0.05)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.admit():
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected, match="Timed out"):
+            async with admission.admit():
+                pass
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+    assert admission.waiting == 0
+    assert admission.rejected == 1
+
+
+def test_slot_is_released_when_the_pipeline_fails():
+    admission = AdmissionController(max_concurrency=1, max_queue=0, max_wait=0.05)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            async with admission.admit():
+                raise RuntimeError("pipeline failed")
+        async with admission.admit():
+            return admission.in_flight
+
+    assert asyncio.run(scenario()) == 1
+    assert admission.in_flight == 0
+
+
+def test_cancelled_requests_give_their_slots_back():
+    admission = AdmissionController(max_concurrency=1, max_queue=1, max_wait=5.0)
+
+    async def hold(release: asyncio.Event):
+        async with admission.admit():
+            await release.wait()
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(release))
+        queued = asyncio.create_task(hold(release))
+        # Cancelled while the first is still being granted its slot
+        await asyncio.sleep(0)
+        running.cancel()
+        queued.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+        async with admission.admit():
+            return admission.in_flight
+
+    assert asyncio.run(asyncio.wait_for(scenario(), timeout=1.0)) == 1
+    assert (admission.in_flight, admission.waiting) == (0, 0)
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from concert_scout_agent.dataloader import DataLoader
+
+
+def test_concurrent_loads_share_one_batch():
+    batches = []
+
+    async def batch_fn(keys):
+        batches.append(sorted(keys))
+        return {key: key.upper() for key in keys if key != "missing"}
+
+    async def scenario():
+        loader = DataLoader(batch_fn, window=0.01, name="test")
+        results = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"), loader.load("missing"))
+        return loader, results
+
+    loader, results = asyncio.run(scenario())
+    assert results == ["A", "B", "A", None]
+    assert batches == [["a", "b", "missing"]]
+    assert loader.stats() == {"requested": 4, "deduplicated": 1, "batches": 1}
+
+
+def test_full_batch_is_sent_without_waiting_for_the_window():
+    batches = []
+
+    async def batch_fn(keys):
+        batches.append(list(keys))
+        return {key: key for key in keys}
+
+    async def scenario():
+        loader = DataLoader(batch_fn, window=60.0, max_batch=2, name="test")
+        return await asyncio.wait_for(loader.load_many(["a", "b"]), timeout=1.0)
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+    assert batches == [["a", "b"]]
+
+
+def test_failed_batch_fails_every_caller_and_is_not_cached():
+    calls = 0
+
+    async def batch_fn(keys):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("upstream down")
+        return {key: key for key in keys}
+
+    async def scenario():
+        loader = DataLoader(batch_fn, window=0.01, name="test")
+        results = await asyncio.gather(loader.load("a"), loader.load("a"), return_exceptions=True)
+        return results, await loader.load("a")
+
+    failed, retried = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in failed)
+    assert retried == "a"
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_load():
+    async def batch_fn(keys):
+        await asyncio.sleep(0.02)
+        return {key: key for key in keys}
+
+    async def scenario():
+        loader = DataLoader(batch_fn, window=0.0, name="test")
+        first = asyncio.create_task(loader.load("a"))
+        second = asyncio.create_task(loader.load("a"))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "a"
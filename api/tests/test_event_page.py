@@ -0,0 +1,52 @@
+import json
+
+from concert_scout_agent.event_page import decode_event_page, project_event
+from concert_scout_agent.ticketmaster import _extract_event_info
+
+
+def _event(**overrides) -> dict:
+    event = {
+        "id": "vvG1zZ0001",
+        "name": "Event",
+        "url": "https://www.ticketmaster.com/event/1",
+        "dates": {"start": {"localDate": "2025-07-01", "localTime": "20:00:00"}},
+        "images": [{"ratio": "16_9", "width": 1024, "url": "https://s1.ticketm.net/1.jpg"}],
+        "classifications": [{"segment": {"name": "Music"}, "genre": {"name": "Rock"}, "subGenre": {"name": "Pop"}}],
+        "_embedded": {
+            "venues": [{"name": "Venue", "city": {"name": "Los Angeles"}, "location": {"latitude": "34.04", "longitude": "-118.26"}}],
+            "attractions": [{"id": "K8vZ9000001"}],
+        },
+    }
+    event.update(overrides)
+    return event
+
+
+def test_projection_extracts_like_the_full_event():
+    event = _event()
+    assert _extract_event_info(project_event(event)) == _extract_event_info(event)
+
+
+def test_missing_venue_fields_keep_the_fallback_text():
+    event = _event(_embedded={"venues": [{"location": {"latitude": "34.04", "longitude": "-118.26"}}]})
+    info = _extract_event_info(project_event(event))
+    assert info["venue_name"] == "Venue information not available"
+    assert info["city_name"] == "City information not available"
+    assert info == _extract_event_info(event)
+
+
+def test_null_classification_levels_and_city_are_skipped():
+    event = _event(
+        classifications=[{"segment": None, "genre": {"name": "Rock"}, "subGenre": None}, None],
+        _embedded={"venues": [{"name": "Venue", "city": None}], "attractions": None},
+    )
+    projected = project_event(event)
+    assert projected["classifications"] == [{"genre": {"name": "Rock"}}]
+    assert projected["_embedded"] == {"venues": [{"name": "Venue"}], "attractions": []}
+    assert _extract_event_info(projected)["city_name"] == "City information not available"
+
+
+def test_decoded_page_survives_a_malformed_event():
+    body = json.dumps({"_embedded": {"events": [_event(dates=None, images=None), None, _event()]}}).encode("utf-8")
+    events = decode_event_page(body)["_embedded"]["events"]
+    assert len(events) == 2
+    assert events[0]["dates"] == {"start": {}}
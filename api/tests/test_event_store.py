@@ -0,0 +1,58 @@
+import time
+from urllib.parse import urlencode
+
+from concert_scout_agent.event_store import EventStore
+
+LAT, LNG = 40.7128, -74.0060
+
+
+def _event(event_id, local_start):
+    return {
+        "event_id": event_id,
+        "local_start": local_start,
+        "lat": LAT,
+        "lng": LNG,
+        "info": {"name": event_id, "date": local_start[:10], "url": f"https://tickets.test/{event_id}"},
+        "attractions": [],
+        "classifications": ["Music", "Rock"],
+    }
+
+
+def _store(tmp_path) -> EventStore:
+    store = EventStore(str(tmp_path / "events.db"))
+    store.write_region(
+        "nyc", LAT, LNG, 125, "2099-03-31T23:59:59",
+        [_event("spring", "2099-03-01T20:00:00"), _event("summer", "2099-03-20T20:00:00")],
+        time.time(),
+    )
+    return store
+
+
+def _query(**params) -> str:
+    return urlencode({"latlong": f"{LAT},{LNG}", "radius": "100", "unit": "miles", "segmentName": "Music", **params})
+
+
+def test_search_inside_the_ingested_days_is_answered(tmp_path):
+    store = _store(tmp_path)
+    events = store.search(_query(localStartEndDateTime="2099-03-01T00:00:00,2099-03-31T23:59:59"), limit=10)
+    assert [event["name"] for event in events] == ["spring", "summer"]
+    assert store.hits == 1
+
+
+def test_search_without_an_end_date_goes_to_ticketmaster(tmp_path):
+    # Ticketmaster would also return events past the region's ingested days
+    store = _store(tmp_path)
+    assert store.search(_query(), limit=10) is None
+    assert store.search(_query(localStartEndDateTime="2099-03-01T00:00:00"), limit=10) is None
+    assert store.misses == 2
+
+
+def test_search_past_the_ingested_days_goes_to_ticketmaster(tmp_path):
+    store = _store(tmp_path)
+    assert store.search(_query(localStartEndDateTime="2099-03-01T00:00:00,2099-06-30T23:59:59"), limit=10) is None
+
+
+def test_search_with_more_events_than_the_limit_is_not_cut(tmp_path):
+    store = _store(tmp_path)
+    assert store.search(_query(localStartEndDateTime="2099-03-01T00:00:00,2099-03-31T23:59:59"), limit=1) is None
+    assert store.overflows == 1
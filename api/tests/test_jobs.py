@@ -0,0 +1,107 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import jobs
+from jobs import JOB_SUCCEEDED
+from session_store import DEFAULT_USER_ID
+
+RECOMMENDATIONS = {"concerts_for_top_artists": [], "concerts_for_top_genre": [], "concerts_for_related_artists": []}
+
+
+def _stub_pipeline(monkeypatch, events):
+    async def get_or_create_session(session_id, user_id):
+        return SimpleNamespace(id=session_id or "s1", user_id=user_id)
+
+    async def run_prompt(session, message, user_id):
+        return session, events
+
+    async def update_session(session_id, **fields):
+        pass
+
+    monkeypatch.setattr(jobs, "get_or_create_session", get_or_create_session)
+    monkeypatch.setattr(jobs, "run_prompt", run_prompt)
+    monkeypatch.setattr(jobs, "update_session", update_session)
+
+
+def test_job_without_user_id_is_queued_for_the_default_user(fake_redis):
+    async def scenario():
+        job_id = await jobs.enqueue_job("hi", None, None)
+        return await jobs.get_job(job_id), await fake_redis.xlen(jobs.JOBS_STREAM)
+
+    job, queued = asyncio.run(scenario())
+    assert job["user_id"] == DEFAULT_USER_ID
+    assert queued == 1
+
+
+def test_structured_job_returns_recommendations(fake_redis, monkeypatch):
+    events = [{"type": "text", "author": "final_recommender_agent", "content": json.dumps(RECOMMENDATIONS)}]
+    _stub_pipeline(monkeypatch, events)
+
+    async def scenario():
+        job_id = await jobs.enqueue_job("concerts please", "u1", None, response_format="structured")
+        await jobs.run_job(job_id)
+        return await jobs.get_job(job_id)
+
+    job = asyncio.run(scenario())
+    assert job["status"] == JOB_SUCCEEDED
+    assert job["result"]["recommendations"] == RECOMMENDATIONS
+    assert job["result"]["events"] == []
+    assert job["result"]["response"] == ""
+
+
+def test_text_job_returns_events(fake_redis, monkeypatch):
+    events = [{"type": "text", "author": "final_recommender_agent", "content": "Here you go"}]
+    _stub_pipeline(monkeypatch, events)
+
+    async def scenario():
+        job_id = await jobs.enqueue_job("concerts please", "u1", None)
+        await jobs.run_job(job_id)
+        return await jobs.get_job(job_id)
+
+    result = asyncio.run(scenario())["result"]
+    assert result["response"] == "Here you go"
+    assert result["events"] == events
+    assert "recommendations" not in result
+
+
+def test_worker_runs_queued_jobs_and_survives_redis_errors(fake_redis, monkeypatch):
+    from redis.exceptions import ConnectionError
+
+    monkeypatch.setattr(jobs, "JOB_WORKER_RETRY_DELAY", 0.01)
+    ran = []
+
+    async def run_job(job_id):
+        ran.append(job_id)
+
+    monkeypatch.setattr(jobs, "run_job", run_job)
+    failures = {"left": 2}
+    xreadgroup = fake_redis.xreadgroup
+
+    async def flaky_xreadgroup(*args, **kwargs):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise ConnectionError("Redis went away")
+        # fakeredis would block the event loop; poll instead
+        kwargs.pop("block")
+        response = await xreadgroup(*args, **kwargs)
+        if not response:
+            await asyncio.sleep(0.01)
+        return response
+
+    monkeypatch.setattr(fake_redis, "xreadgroup", flaky_xreadgroup)
+
+    async def scenario():
+        job_id = await jobs.enqueue_job("hi", "u1", None)
+        worker = asyncio.create_task(jobs.run_job_worker(consumer="test"))
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if ran:
+                break
+        pending = await fake_redis.xpending(jobs.JOBS_STREAM, jobs.JOBS_GROUP)
+        worker.cancel()
+        return job_id, pending["pending"]
+
+    job_id, pending = asyncio.run(scenario())
+    assert ran == [job_id]
+    assert pending == 0
@@ -0,0 +1,31 @@
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from concert_scout_agent.llm_cache import llm_request_key
+
+
+def _request(instruction: str, tool_result: str) -> LlmRequest:
+    return LlmRequest(
+        model="gemini-2.0-flash",
+        contents=[
+            types.Content(role="user", parts=[types.Part.from_text(text="Concerts near me?")]),
+            types.Content(role="model", parts=[types.Part.from_text(text=tool_result)]),
+        ],
+        config=types.GenerateContentConfig(system_instruction=instruction),
+    )
+
+
+def test_concert_start_times_are_part_of_the_key():
+    instruction = "Find concerts. The current date is 2026-10-19."
+    early = _request(instruction, '{"dateTime": "2026-11-01T19:00:00Z"}')
+    late = _request(instruction, '{"dateTime": "2026-11-01T23:30:00Z"}')
+    assert llm_request_key(early) != llm_request_key(late)
+
+
+def test_current_date_is_cut_to_the_day():
+    result = '{"dateTime": "2026-11-01T19:00:00Z"}'
+    morning = _request("Find concerts. The current date is 2026-10-19T08:15:02.123456.", result)
+    evening = _request("Find concerts. The current date is 2026-10-19T21:40:00.", result)
+    tomorrow = _request("Find concerts. The current date is 2026-10-20T08:15:02.", result)
+    assert llm_request_key(morning) == llm_request_key(evening)
+    assert llm_request_key(morning) != llm_request_key(tomorrow)
@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+
+from concert_scout_agent import quota
+from concert_scout_agent.quota import TM_MAX_CONCURRENCY, TM_MAX_RPS, TM_MIN_RPS, QuotaController
+
+URL = "https://upstream.test/discovery/v2/events.json"
+
+
+def _response(status_code: int, **headers) -> httpx.Response:
+    return httpx.Response(status_code, headers=headers, request=httpx.Request("GET", URL))
+
+
+def test_success_raises_and_throttling_halves_the_rate():
+    controller = QuotaController("test", max_rate=4.0, max_concurrency=8)
+    controller.observe(_response(429))
+    assert controller.rate == 2.0
+    assert controller.window == 4.0
+
+    # 429s from the same burst only back off once
+    controller.observe(_response(429))
+    assert controller.rate == 2.0
+
+    controller.observe(_response(200))
+    assert controller.rate == 2.0 + quota.RATE_INCREASE
+    assert controller.window == 4.25
+
+
+def test_rate_never_passes_its_bounds(monkeypatch):
+    monkeypatch.setattr(quota, "DECREASE_INTERVAL", 0.0)
+    controller = QuotaController("test", max_rate=4.0, max_concurrency=8)
+    for _ in range(10):
+        controller.observe(_response(429))
+    assert controller.rate == TM_MIN_RPS
+    assert controller.window == 1.0
+    for _ in range(1000):
+        controller.observe(_response(200))
+    assert controller.rate == 4.0
+    assert controller.window == 8.0
+
+
+def test_workers_share_the_limits():
+    controller = QuotaController("test")
+    controller.share(20)
+    assert controller.max_rate == TM_MAX_RPS / 20
+    assert controller.max_concurrency == max(TM_MAX_CONCURRENCY // 20, 1)
+    # The floor can't let a worker exceed its share
+    assert controller.stats()["rate"] <= round(TM_MAX_RPS / 20, 2)
+    for _ in range(1000):
+        controller.observe(_response(200))
+    assert controller.rate == TM_MAX_RPS / 20
+
+
+def test_low_quota_is_spread_until_the_reset_and_pauses_when_used_up(monkeypatch):
+    monkeypatch.setattr(quota.time, "time", lambda: 1000.0)
+    controller = QuotaController("test", max_rate=5.0)
+    controller.observe(_response(200, **{"Rate-Limit": "5000", "Rate-Limit-Available": "100", "Rate-Limit-Reset": "1200000"}))
+    assert controller.stats()["rate"] == 0.5
+    assert not controller.saturated
+
+    controller.observe(_response(429, **{"Rate-Limit": "5000", "Rate-Limit-Available": "0", "Rate-Limit-Reset": "1200000"}))
+    assert controller.saturated
+    assert 199 <= controller.stats()["paused_for"] <= 200
+
+
+def test_throttled_calls_are_retried(monkeypatch):
+    responses = [_response(429), _response(200)]
+
+    async def fake_get(url):
+        return responses.pop(0)
+
+    monkeypatch.setattr(quota, "get", fake_get)
+    controller = QuotaController("test")
+    monkeypatch.setattr(controller, "retry_delay", lambda attempt, response: 0.0)
+    response = asyncio.run(controller.get(URL))
+    assert response.status_code == 200
+    assert controller.retries == 1
+    assert controller.throttled == 1
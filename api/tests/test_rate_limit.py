@@ -0,0 +1,59 @@
+import asyncio
+
+from rate_limit import SlidingWindowLimiter, parse_limit
+
+
+def test_parse_limit():
+    assert parse_limit("10/minute") == (10, 60000)
+    assert parse_limit("20 / hours") == (20, 3600000)
+
+
+def test_redis_window_admits_up_to_the_limit(fake_redis):
+    limiter = SlidingWindowLimiter(prefix="test")
+
+    async def scenario():
+        return [await limiter.hit([("ip:1", 3, 60000)]) for _ in range(4)]
+
+    results = asyncio.run(scenario())
+    assert [allowed for allowed, _, _ in results] == [True, True, True, False]
+    assert [remaining for _, remaining, _ in results] == [2, 1, 0, 0]
+    assert 0 < results[-1][2] <= 60000
+
+
+def test_redis_window_needs_every_key_under_its_limit(fake_redis):
+    limiter = SlidingWindowLimiter(prefix="test")
+
+    async def scenario():
+        await limiter.hit([("user:a", 1, 60000)])
+        # The user is over its limit, so the IP's window is not charged either
+        rejected = await limiter.hit([("ip:1", 5, 60000), ("user:a", 1, 60000)])
+        return rejected, await fake_redis.zcard("test:ip:1")
+
+    (allowed, remaining, _), ip_hits = asyncio.run(scenario())
+    assert not allowed
+    assert remaining == 0
+    assert ip_hits == 0
+
+
+def test_redis_window_slides(fake_redis):
+    limiter = SlidingWindowLimiter(prefix="test")
+
+    async def scenario():
+        first = await limiter.hit([("ip:1", 1, 50)])
+        second = await limiter.hit([("ip:1", 1, 50)])
+        await asyncio.sleep(0.06)
+        third = await limiter.hit([("ip:1", 1, 50)])
+        return first[0], second[0], third[0]
+
+    assert asyncio.run(scenario()) == (True, False, True)
+
+
+def test_unreachable_redis_falls_back_to_the_worker_window(fake_redis):
+    fake_redis.connection_pool.connection_kwargs["server"].connected = False
+    limiter = SlidingWindowLimiter(prefix="test")
+
+    async def scenario():
+        return [(await limiter.hit([("ip:1", 2, 60000)]))[0] for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [True, True, False]
+
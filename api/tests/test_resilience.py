@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import httpx
+
+from concert_scout_agent import resilience
+from concert_scout_agent.resilience import CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, CircuitBreaker
+
+URL = "https://upstream.test/discovery/v2/events.json?keyword=probe"
+
+
+def _open_endpoint() -> resilience.Endpoint:
+    endpoint = resilience._endpoint(URL)
+    endpoint.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    endpoint.breaker.record_failure()
+    assert endpoint.breaker.state == CIRCUIT_OPEN
+    return endpoint
+
+
+def test_cancelled_half_open_probe_is_released_and_recovers(monkeypatch):
+    upstream_hangs = True
+
+    async def fake_get(url):
+        if upstream_hangs:
+            await asyncio.sleep(3600)
+        return httpx.Response(200, json={"_embedded": {"events": []}}, request=httpx.Request("GET", url))
+
+    monkeypatch.setattr(resilience, "get", fake_get)
+    endpoint = _open_endpoint()
+
+    async def scenario():
+        nonlocal upstream_hangs
+        await asyncio.sleep(0.06)
+        probe = asyncio.create_task(resilience.resilient_get_json(URL))
+        await asyncio.sleep(0.01)
+        assert endpoint.breaker.state == CIRCUIT_HALF_OPEN
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+
+        # The abandoned probe is not a failure, but it no longer holds the probe slot
+        assert endpoint.breaker.state == CIRCUIT_HALF_OPEN
+        assert not endpoint.breaker._probing
+        assert endpoint.breaker.failures == 1
+
+        upstream_hangs = False
+        return await resilience.resilient_get_json(URL)
+
+    assert asyncio.run(scenario()) == {"_embedded": {"events": []}}
+    assert endpoint.breaker.state == CIRCUIT_CLOSED
+
+
+def test_cancelled_call_is_not_a_failure(monkeypatch):
+    async def fake_get(url):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(resilience, "get", fake_get)
+    endpoint = resilience._endpoint(URL)
+    endpoint.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    endpoint.failures = 0
+
+    async def scenario():
+        call = asyncio.create_task(resilience.resilient_get_json(URL))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        try:
+            await call
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert endpoint.breaker.state == CIRCUIT_CLOSED
+    assert endpoint.breaker.failures == 0
+    assert endpoint.failures == 0
+
+
+def test_unexpected_error_in_probe_is_recorded(monkeypatch):
+    async def fake_get(url):
+        return httpx.Response(200, content=b"{}", request=httpx.Request("GET", url))
+
+    def broken_decode(body):
+        raise AttributeError("'NoneType' object has no attribute 'get'")
+
+    monkeypatch.setattr(resilience, "get", fake_get)
+    endpoint = _open_endpoint()
+    time.sleep(0.06)
+
+    async def probe():
+        try:
+            await resilience.resilient_get_json(URL, decode=broken_decode)
+        except AttributeError:
+            pass
+
+    asyncio.run(probe())
+    assert endpoint.breaker.state == CIRCUIT_OPEN
+    assert not endpoint.breaker._probing
@@ -0,0 +1,90 @@
+import asyncio
+
+import session_store
+from session_store import ACTIVE_SESSIONS_KEY, DEFAULT_USER_ID
+
+
+def _session(session_id: str, user_id=DEFAULT_USER_ID) -> dict:
+    return {"id": session_id, "user_id": user_id, "app_name": "Concert Scout", "created_at": "t0", "updated_at": "t0"}
+
+
+def test_update_does_not_recreate_a_deleted_session(fake_redis):
+    async def scenario():
+        await session_store.store_session("gone", _session("gone"))
+        await session_store.delete_session("gone")
+        await session_store.update_session("gone", updated_at="t1")
+        return await session_store.get_session("gone"), await fake_redis.zscore(ACTIVE_SESSIONS_KEY, "gone")
+
+    assert asyncio.run(scenario()) == (None, None)
+
+
+def test_update_refreshes_an_existing_session(fake_redis):
+    async def scenario():
+        await session_store.store_session("s1", _session("s1"))
+        await session_store.update_session("s1", updated_at="t1")
+        return await session_store.get_session("s1"), await fake_redis.ttl("session:s1")
+
+    session, ttl = asyncio.run(scenario())
+    assert session == {**_session("s1"), "updated_at": "t1"}
+    assert ttl > 0
+
+
+def test_update_of_a_fallback_only_session_stays_in_the_fallback(fake_redis):
+    session_store.fallback_sessions.set("outage", _session("outage"), dirty=True)
+
+    async def scenario():
+        await session_store.update_session("outage", updated_at="t1")
+        return await fake_redis.exists("session:outage"), await session_store.get_session("outage")
+
+    exists, session = asyncio.run(scenario())
+    assert not exists
+    assert session["updated_at"] == "t1"
+
+
+def test_anonymous_user_id_is_stored_in_redis(fake_redis):
+    async def scenario():
+        await session_store.store_session("anon", _session("anon", user_id=None))
+        return await fake_redis.hget("session:anon", "user_id")
+
+    assert asyncio.run(scenario()) == ""
+    assert session_store.fallback_sessions.get("anon") is None
+
+
+def test_stored_session_is_replaced_whole(fake_redis):
+    async def scenario():
+        await session_store.store_session("s2", {**_session("s2"), "extra": "x"})
+        await session_store.store_session("s2", _session("s2"))
+        return await session_store.touch_session("s2")
+
+    assert asyncio.run(scenario()) == _session("s2")
+
+
+def test_fallback_evicts_the_least_recently_used():
+    store = session_store.FallbackSessionStore(ttl=100, max_bytes=3 * 300)
+    for session_id in ("a", "b", "c"):
+        store.set(session_id, {"x": "1"})
+    store.get("a")
+    store.set("d", {"x": "1"})
+    assert store.get("b") is None
+    assert store.get("a") == {"x": "1"}
+
+
+def test_writes_during_an_outage_are_reconciled(fake_redis):
+    server = fake_redis.connection_pool.connection_kwargs["server"]
+
+    async def scenario():
+        await session_store.store_session("kept", _session("kept"))
+        server.connected = False
+        await session_store.store_session("new", _session("new"))
+        await session_store.delete_session("kept")
+        # Still down: the changes stay pending
+        assert await session_store.reconcile_fallback_sessions() == 0
+        server.connected = True
+        written = await session_store.reconcile_fallback_sessions()
+        return written, await session_store.get_session("new"), await fake_redis.exists("session:kept")
+
+    written, session, kept = asyncio.run(scenario())
+    assert written == 1
+    assert session == _session("new")
+    assert not kept
+    assert not session_store.fallback_sessions.pending
@@ -0,0 +1,42 @@
+from concert_scout_agent.state import STATE_LIMITS, TURN_SUFFIX, concert_key, update_bounded_state
+
+LIMIT = STATE_LIMITS["ticketmaster_concerts"]
+
+
+def _concerts(prefix: str, count: int) -> list:
+    # The fields _extract_event_info produces
+    return [{"name": f"{prefix} {i}", "url": f"https://www.ticketmaster.com/{prefix}/{i}", "date": "2025-07-01",
+             "time": "20:00:00", "venue_name": "Venue", "city_name": "City", "image_url": None} for i in range(count)]
+
+
+def test_a_turn_larger_than_the_limit_keeps_all_its_concerts_in_order():
+    state = {"ticketmaster_concerts": _concerts("old", 20)}
+    turn = _concerts("new", 96)
+    merged = update_bounded_state(state, "ticketmaster_concerts", turn)
+    assert merged == turn
+    assert state["ticketmaster_concerts" + TURN_SUFFIX] == turn
+
+
+def test_earlier_turns_are_evicted_oldest_first():
+    state = {"ticketmaster_concerts": _concerts("old", LIMIT)}
+    turn = _concerts("new", 10)
+    merged = update_bounded_state(state, "ticketmaster_concerts", turn)
+    assert len(merged) == LIMIT
+    assert merged[:LIMIT - 10] == _concerts("old", LIMIT)[10:]
+    assert merged[LIMIT - 10:] == turn
+
+
+def test_concerts_seen_again_move_to_the_current_turn():
+    old = _concerts("old", 5)
+    state = {"ticketmaster_concerts": old}
+    merged = update_bounded_state(state, "ticketmaster_concerts", [old[0]])
+    assert merged == old[1:] + [old[0]]
+
+
+def test_concerts_are_deduplicated_by_url():
+    concert = _concerts("a", 1)[0]
+    assert concert_key(concert) == concert["url"]
+    state = {}
+    merged = update_bounded_state(state, "ticketmaster_concerts", [concert, {**concert, "time": "21:00:00"}])
+    assert merged == [concert]
+    assert concert_key({"url": None, "name": "Show", "date": "2025-07-01"}) == ("Show", "2025-07-01", None, None)
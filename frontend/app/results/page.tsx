@@ -6,6 +6,7 @@ import { useSearchParams } from "next/navigation"
 import { Button } from "@/components/ui/button"
 import { ConcertResults } from "@/components/concert-results"
 import { ResultsSkeleton } from "@/components/results-skeleton"
+import type { AiResponseSchema } from "@/lib/parseAiResponse"
 import { ArrowLeft, Sparkles } from "lucide-react"
 
 export default function ResultsPage() {
@@ -13,6 +14,7 @@ export default function ResultsPage() {
   const [responseData, setResponseData] = useState<{
     query: string
     response: string
+    recommendations?: AiResponseSchema | null
     session_id: string
     timestamp: number
     error?: boolean
@@ -190,6 +192,7 @@ export default function ResultsPage() {
           <ConcertResults 
             query={responseData.query} 
             aiResponse={responseData.response} 
+            recommendations={responseData.recommendations}
             sessionId={responseData.session_id} 
           />
         )}
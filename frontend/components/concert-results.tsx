@@ -1,6 +1,6 @@
 import { ConcertCard } from "@/components/concert-card"
 import { AiChatBubble } from "@/components/ai-chat-bubble"
-import { parseAiResponse, type ParsedConcerts } from "@/lib/parseAiResponse"
+import { parseAiResponse, parseRecommendations, type AiResponseSchema, type ParsedConcerts } from "@/lib/parseAiResponse"
 import type { Concert as CardConcert } from "@/components/concert-card"
 import {
   Select,
@@ -47,15 +47,19 @@ function sortConcerts(concerts: CardConcert[], sortBy: string): CardConcert[] {
 export function ConcertResults({ 
   query, 
   aiResponse, 
+  recommendations,
   sessionId 
 }: { 
   query: string; 
   aiResponse: string;
+  recommendations?: AiResponseSchema | null;
   sessionId?: string;
 }) {
   const [sortBy, setSortBy] = useState("date");
-  // Parse the AI response to get actual concert data
-  const parsedData: ParsedConcerts = parseAiResponse(aiResponse);
+  // Use the structured recommendations when the API sent them, else parse the AI response text
+  const parsedData: ParsedConcerts = recommendations
+    ? parseRecommendations(recommendations)
+    : parseAiResponse(aiResponse);
     
   // Only use parsed data from the AI response, no fallback to mock data
   const concerts = {
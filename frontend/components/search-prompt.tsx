@@ -7,7 +7,7 @@ import { useRouter } from "next/navigation"
 import { Button } from "@/components/ui/button"
 import { Loader2, ArrowUp, MessageCircle, X, Clock } from "lucide-react"
 import { apiService } from "@/lib/api"
-import { parseAiResponse } from "@/lib/parseAiResponse"
+import { parseAiResponse, parseRecommendations } from "@/lib/parseAiResponse"
 import { AiChatBubble } from "@/components/ai-chat-bubble"
 
 export function SearchPrompt() {
@@ -68,12 +68,15 @@ export function SearchPrompt() {
       const response = await apiService.chat({
         message: messageToSend,
         user_id: "default_user",
-        session_id: sessionId
+        session_id: sessionId,
+        response_format: "structured"
       })
 
       setSessionId(response.session_id)
 
-      const parsedData = parseAiResponse(response.response)
+      const parsedData = response.recommendations
+        ? parseRecommendations(response.recommendations)
+        : parseAiResponse(response.response)
 
       if (parsedData.isFollowUpQuestion && parsedData.followUpMessage) {
         // Add the current prompt to conversation history
@@ -84,6 +87,7 @@ export function SearchPrompt() {
         const responseData = {
           query: messageToSend,
           response: response.response,
+          recommendations: response.recommendations,
           session_id: response.session_id,
           timestamp: Date.now()
         }
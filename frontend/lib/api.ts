@@ -1,3 +1,5 @@
+import type { AiResponseSchema } from './parseAiResponse';
+
 // API configuration for different environments
 const getApiBaseUrl = () => {
   // In production (Vercel), use relative URLs that will be proxied
@@ -15,6 +17,8 @@ export interface ChatRequest {
   message: string;
   user_id?: string;
   session_id?: string;
+  // 'structured' returns the concerts in `recommendations` instead of as JSON text in `response`
+  response_format?: 'text' | 'structured';
 }
 
 export interface ChatResponse {
@@ -30,6 +34,7 @@ export interface ChatResponse {
     function_args?: any;
     response?: any;
   }>;
+  recommendations?: AiResponseSchema | null;
 }
 
 export interface SessionResponse {
@@ -25,7 +25,7 @@ export interface ParsedConcerts {
   followUpMessage?: string;
 }
 
-interface ApiConcert {
+export interface ApiConcert {
   name: string;
   venue_name: string;
   city_name: string;
@@ -37,7 +37,7 @@ interface ApiConcert {
   description: string;
 }
 
-interface AiResponseSchema {
+export interface AiResponseSchema {
   concerts_for_top_artists: ApiConcert[];
   concerts_for_top_genre: ApiConcert[];
   concerts_for_related_artists: ApiConcert[];
@@ -67,24 +67,7 @@ export function parseAiResponse(aiResponse: string): ParsedConcerts {
     
     // Parse the JSON response
     const parsedResponse: AiResponseSchema = JSON.parse(aiResponse);
-    
-    // Convert API format to Concert format
-    result.topArtists = parsedResponse.concerts_for_top_artists.map((concert, index) => 
-      convertApiConcertToConcert(concert, index, 'artists')
-    );
-    
-    result.topGenre = parsedResponse.concerts_for_top_genre.map((concert, index) => 
-      convertApiConcertToConcert(concert, index, 'genre')
-    );
-    
-    result.relatedArtists = parsedResponse.concerts_for_related_artists.map((concert, index) => 
-      convertApiConcertToConcert(concert, index, 'related')
-    );
-    
-    // Set default AI commentary
-    result.aiSections.topArtistsText = 'Here are concerts featuring your top artists!';
-    result.aiSections.topGenreText = 'Here are concerts in your favorite genre!';
-    result.aiSections.relatedArtistsText = 'Here are concerts by artists similar to your favorites!';
+    return parseRecommendations(parsedResponse);
     
   } catch (error) {
     console.error('Error parsing AI response:', error);
@@ -93,6 +76,28 @@ export function parseAiResponse(aiResponse: string): ParsedConcerts {
   return result;
 }
 
+// Converts recommendations that are already objects (`response_format: 'structured'`)
+export function parseRecommendations(recommendations: AiResponseSchema): ParsedConcerts {
+  return {
+    // Convert API format to Concert format
+    topArtists: recommendations.concerts_for_top_artists.map((concert, index) => 
+      convertApiConcertToConcert(concert, index, 'artists')
+    ),
+    topGenre: recommendations.concerts_for_top_genre.map((concert, index) => 
+      convertApiConcertToConcert(concert, index, 'genre')
+    ),
+    relatedArtists: recommendations.concerts_for_related_artists.map((concert, index) => 
+      convertApiConcertToConcert(concert, index, 'related')
+    ),
+    // Set default AI commentary
+    aiSections: {
+      topArtistsText: 'Here are concerts featuring your top artists!',
+      topGenreText: 'Here are concerts in your favorite genre!',
+      relatedArtistsText: 'Here are concerts by artists similar to your favorites!'
+    }
+  };
+}
+
 function isFollowUpQuestion(response: string): boolean {
   // Check if it's not valid JSON and contains question indicators
   try {